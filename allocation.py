@@ -0,0 +1,181 @@
+"""
+Distribuição de vagas a partir das cédulas de preferência.
+
+Cada participante ordena as atividades da escala (a primeira é a preferida)
+e tem um número de escolhas a receber (as vezes pendentes nas rodadas).
+Dois métodos:
+- serial_dictatorship: segue a ordem das rodadas; cada participante leva a
+  atividade mais bem colocada na sua cédula que ainda tem vaga.
+- min_cost_assignment: distribuição ótima, que minimiza a soma das posições
+  das atividades recebidas nas cédulas (fluxo de custo mínimo).
+
+Nenhum participante recebe a mesma atividade duas vezes, e nenhuma
+atividade recebe mais participantes do que suas vagas.
+"""
+import heapq
+from collections import deque
+
+
+def serial_dictatorship(order, preferences, capacity, taken=None):
+    """Distribui as vagas seguindo a ordem de escolha.
+
+    order: emails na ordem das vezes (um email aparece uma vez por escolha a receber)
+    preferences: email -> lista de id_atividade, da preferida para a menos preferida
+    capacity: id_atividade -> vagas restantes
+    taken: email -> ids que o participante já tem (não recebe de novo)
+
+    Retorna [(email, id_atividade)] na ordem das vezes; vezes sem nenhuma
+    atividade da cédula disponível ficam sem atribuição.
+    """
+    remaining = dict(capacity)
+    owned = {email: set(ids) for email, ids in (taken or {}).items()}
+    # Posição de leitura na cédula de cada participante: atividades já esgotadas
+    # ou já recebidas nunca voltam a ficar disponíveis, então não são relidas
+    cursor = {}
+    assignment = []
+    for email in order:
+        ballot = preferences.get(email, [])
+        mine = owned.setdefault(email, set())
+        i = cursor.get(email, 0)
+        while i < len(ballot) and (remaining.get(ballot[i], 0) <= 0 or ballot[i] in mine):
+            i += 1
+        cursor[email] = i
+        if i < len(ballot):
+            id_atividade = ballot[i]
+            remaining[id_atividade] -= 1
+            mine.add(id_atividade)
+            assignment.append((email, id_atividade))
+    return assignment
+
+
+def min_cost_assignment(demand, preferences, capacity, taken=None):
+    """Distribuição que minimiza a soma das posições nas cédulas.
+
+    demand: email -> número de atividades a receber
+    preferences, capacity, taken: como em serial_dictatorship
+
+    Maximiza primeiro o número de vagas distribuídas a partir das cédulas e,
+    entre essas distribuições, escolhe a de menor custo total. Usa o
+    algoritmo primal-dual: um Dijkstra por fase e, em seguida, todos os
+    caminhos de custo reduzido zero que uma varredura encontrar, então o
+    número de fases não cresce com o número de vagas.
+
+    Retorna [(email, id_atividade)].
+    """
+    taken = taken or {}
+    participants = [email for email, count in demand.items() if count > 0]
+    activities = sorted({a for email in participants for a in preferences.get(email, []) if capacity.get(a, 0) > 0})
+
+    # Nós: 0 = origem, 1 = destino, depois participantes e atividades
+    source, sink = 0, 1
+    node_of_participant = {email: 2 + i for i, email in enumerate(participants)}
+    node_of_activity = {a: 2 + len(participants) + i for i, a in enumerate(activities)}
+    size = 2 + len(participants) + len(activities)
+
+    # Arestas em listas paralelas; a aresta e ^ 1 é a reversa de e
+    head, cap, cost = [], [], []
+    graph = [[] for _ in range(size)]
+
+    def add_edge(u, v, capacity_uv, cost_uv):
+        graph[u].append(len(head))
+        head.append(v)
+        cap.append(capacity_uv)
+        cost.append(cost_uv)
+        graph[v].append(len(head))
+        head.append(u)
+        cap.append(0)
+        cost.append(-cost_uv)
+
+    pair_edges = []
+    for email in participants:
+        u = node_of_participant[email]
+        add_edge(source, u, demand[email], 0)
+        owned = set(taken.get(email, ()))
+        seen = set()
+        for rank, id_atividade in enumerate(preferences.get(email, [])):
+            if id_atividade in node_of_activity and id_atividade not in owned and id_atividade not in seen:
+                seen.add(id_atividade)
+                pair_edges.append((len(head), email, id_atividade))
+                add_edge(u, node_of_activity[id_atividade], 1, rank)
+    for id_atividade, v in node_of_activity.items():
+        add_edge(v, sink, capacity[id_atividade], 0)
+
+    potential = [0] * size
+    infinity = float("inf")
+    while True:
+        # Dijkstra com custos reduzidos (não negativos graças aos potenciais),
+        # interrompido quando o destino é alcançado
+        dist = [infinity] * size
+        dist[source] = 0
+        done = [False] * size
+        queue = [(0, source)]
+        while queue:
+            d, u = heapq.heappop(queue)
+            if done[u]:
+                continue
+            done[u] = True
+            if u == sink:
+                break
+            pu = potential[u]
+            for e in graph[u]:
+                if cap[e] > 0:
+                    v = head[e]
+                    nd = d + cost[e] + pu - potential[v]
+                    if nd < dist[v]:
+                        dist[v] = nd
+                        heapq.heappush(queue, (nd, v))
+        if not done[sink]:
+            break
+        # Nós não finalizados recebem a distância do destino: os custos reduzidos continuam não negativos
+        d_sink = dist[sink]
+        for u in range(size):
+            potential[u] += dist[u] if done[u] else d_sink
+
+        # Aumenta o fluxo por caminhos de arestas admissíveis (custo reduzido zero) em uma
+        # única varredura em profundidade. Cada aresta é examinada uma vez por fase e nós
+        # sem saída não são revisitados; caminhos que a varredura não encontrar ficam para
+        # a próxima fase, que os acha com distância zero
+        it = [0] * size
+        dead = [False] * size
+        on_path = [False] * size
+        on_path[source] = True
+        path = []
+        u = source
+        while True:
+            if u == sink:
+                pushed = min(cap[e] for e in path)
+                for e in path:
+                    cap[e] -= pushed
+                    cap[e ^ 1] += pushed
+                for e in path:
+                    on_path[head[e]] = False
+                path = []
+                u = source
+                continue
+
+            edges = graph[u]
+            degree = len(edges)
+            pu = potential[u]
+            i = it[u]
+            while i < degree:
+                e = edges[i]
+                v = head[e]
+                if cap[e] > 0 and not dead[v] and not on_path[v] and cost[e] + pu == potential[v]:
+                    break
+                i += 1
+            it[u] = i
+            if i == degree:
+                # Beco sem saída: recua
+                dead[u] = True
+                if not path:
+                    break
+                e = path.pop()
+                on_path[u] = False
+                u = head[e ^ 1]
+                continue
+            e = edges[i]
+            path.append(e)
+            u = head[e]
+            on_path[u] = True
+
+    return [(email, id_atividade) for e, email, id_atividade in pair_edges if cap[e] == 0]
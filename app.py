@@ -1,9 +1,32 @@
 import streamlit as st
 import pandas as pd
 from streamlit_gsheets import GSheetsConnection
-import bcrypt
 import time
-import uuid
+
+import database
+from database import (
+    check_user_password, get_allowed_emails, add_allowed_email, extract_emails, add_allowed_emails_bulk,
+    remove_allowed_emails, read_roster, provision_users,
+    get_user_data, register_user, register_user_oauth, add_atividades_bulk,
+    get_escala_completa, get_current_round, create_new_round, get_round_order,
+    get_current_turn, get_available_activities, make_choice, get_user_choices,
+    sort_by_start, turn_sequence, archive_escala, get_archived_escalas, get_escala_arquivada,
+    get_rules, set_rules, get_turn_deadline, DEADLINE_SKIP, DEADLINE_DEFAULT_PICK,
+    ORDER_RANDOM, ORDER_SNAKE, ORDER_REVERSE, CHOICE_DRAFT, CHOICE_BALLOT, BALLOT_SERIAL, BALLOT_OPTIMAL,
+    save_preferences, get_user_preferences, count_ballots, run_ballot,
+    format_personal_schedule, get_participant_schedules, get_escalas, iter_workbook_sheets,
+    WORKBOOK_BY_ESCALA, WORKBOOK_BY_PARTICIPANT
+)
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from archive import EscalaArchive
+from diagnostics import LAYER_APP, LAYER_BACKEND, StorageStats
+from events import EventBus
+from exports import ExportCache, workbook_excel
+from passwords import DEFAULT_ROUNDS, PasswordHasher
+from scheduler import TurnScheduler
+from sessions import ADMIN_MAX_AGE, DEFAULT_MAX_AGE, SessionTokens
+from storage import CachedStorage, GSheetsStorage, InstrumentedStorage, SQLiteStorage, WriteBehindStorage, normalize_email
 
 try:
     from streamlit_oauth import OAuth2Component
@@ -50,575 +73,361 @@ def get_google_oauth_config():
     
     return None
 
-# --- Conexão com Google Sheets ---
-# Usa os segredos (Secrets) do Streamlit Cloud
-try:
-    conn = st.connection("gsheets", type=GSheetsConnection)
-    
-    # Verifica se está usando Service Account (necessário para write operations)
-    if not hasattr(st, 'secrets') or 'connections' not in st.secrets or 'gsheets' not in st.secrets['connections']:
-        st.error("⚠️ **ERRO DE CONFIGURAÇÃO**: Google Sheets não está configurado!")
-        st.error("Você precisa configurar o Service Account para usar esta aplicação.")
-        st.info("📖 **Consulte o guia completo**: [GOOGLE_SHEETS_SETUP.md](https://github.com/MiguelJanssenn/Escala/blob/main/GOOGLE_SHEETS_SETUP.md)")
-        st.stop()
-    
-    # Verifica se está usando service account
-    gsheets_config = st.secrets['connections']['gsheets']
-    if 'type' not in gsheets_config or gsheets_config['type'] != 'service_account':
-        st.error("⚠️ **ERRO DE AUTENTICAÇÃO**: Service Account não configurado!")
-        st.warning("""
-        O erro **"Public Spreadsheet cannot be written to"** ocorre porque você está tentando 
-        usar uma planilha pública (somente leitura) em vez de autenticação com Service Account.
-        
-        **Para corrigir este problema:**
-        1. Crie um Service Account no Google Cloud Console
-        2. Configure o arquivo `.streamlit/secrets.toml` com as credenciais do Service Account
-        3. Compartilhe sua planilha Google Sheets com o email do Service Account
-        """)
-        st.info("📖 **Guia completo de configuração**: [GOOGLE_SHEETS_SETUP.md](https://github.com/MiguelJanssenn/Escala/blob/main/GOOGLE_SHEETS_SETUP.md)")
-        st.stop()
-        
-except Exception as e:
-    st.error("⚠️ **ERRO ao conectar com Google Sheets**")
-    st.error(f"Detalhes do erro: {str(e)}")
-    
-    if "Public Spreadsheet cannot be written to" in str(e):
-        st.warning("""
-        **Este erro significa que você está tentando usar uma planilha pública (somente leitura).**
-        
-        Para usar esta aplicação, você precisa:
-        1. Criar um Service Account no Google Cloud
-        2. Configurar as credenciais no arquivo `.streamlit/secrets.toml`
-        3. Compartilhar sua planilha com o email do Service Account
-        """)
-    
-    st.info("📖 **Consulte o guia completo**: [GOOGLE_SHEETS_SETUP.md](https://github.com/MiguelJanssenn/Escala/blob/main/GOOGLE_SHEETS_SETUP.md)")
-    st.info("💡 **Exemplo de configuração**: Veja o arquivo `.streamlit/secrets.toml.example`")
-    st.stop()
+# --- Backend de Armazenamento ---
+# Por padrão usa Google Sheets. Para usar um banco SQLite local, adicione em .streamlit/secrets.toml:
+# STORAGE_BACKEND = "sqlite"
+# SQLITE_PATH = "escalas.db"
 
-# --- Funções de Hash de Senha ---
-def hash_password(password):
-    """Criptografa a senha."""
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+def get_storage_config():
+    """Retorna o backend configurado ("gsheets" ou "sqlite") e o caminho do SQLite."""
+    try:
+        return st.secrets.get("STORAGE_BACKEND", "gsheets"), st.secrets.get("SQLITE_PATH", "escalas.db")
+    except:
+        return "gsheets", "escalas.db"
 
-def check_password(password, hashed):
-    """Verifica a senha com o hash."""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+# Dados lidos do Google Sheets são revalidados depois deste tempo (segundos),
+# para captar edições feitas diretamente na planilha
+GSHEETS_CACHE_MAX_AGE = 300
 
-# --- Funções de Banco de Dados (Google Sheets) ---
+# Escritas no Google Sheets são enfileiradas e gravadas em lote a cada intervalo (segundos).
+# O journal guarda as escritas ainda não gravadas caso o app reinicie.
+GSHEETS_FLUSH_INTERVAL = 2
+GSHEETS_WRITE_JOURNAL = "escritas_pendentes.jsonl"
 
-def get_allowed_emails():
-    """Busca a lista de emails permitidos para cadastro."""
-    try:
-        df_emails = conn.read(worksheet="emails_permitidos", usecols=[0], ttl=5)
-        if not df_emails.empty:
-            return df_emails['email'].tolist()
-        return []
-    except Exception as e:
-        # Se a planilha não existir ainda, retorna lista vazia
-        return []
+@st.cache_resource
+def get_storage_stats():
+    """Estatísticas das chamadas ao armazenamento (menu Diagnóstico), compartilhadas pelas sessões."""
+    return StorageStats()
+
+@st.cache_resource
+def get_shared_storage(backend_name, sqlite_path, _conn=None, _stats=None):
+    """Cria o backend uma única vez por processo, com cache compartilhado entre as sessões.
 
-def add_allowed_email(email):
-    """Adiciona um email à lista de permitidos."""
+    O cache é invalidado pelas escritas do próprio app, então uma escolha ou
+    nova rodada aparece imediatamente para todos. As chamadas são medidas
+    acima do cache (acertos/faltas) e sobre o backend (chamadas reais).
+    """
+    if backend_name == "sqlite":
+        backend = CachedStorage(InstrumentedStorage(SQLiteStorage(sqlite_path), _stats, LAYER_BACKEND))
+        return InstrumentedStorage(backend, _stats, LAYER_APP)
+    gsheets = WriteBehindStorage(
+        InstrumentedStorage(GSheetsStorage(_conn), _stats, LAYER_BACKEND),
+        flush_interval=GSHEETS_FLUSH_INTERVAL,
+        journal_path=GSHEETS_WRITE_JOURNAL,
+        max_age=GSHEETS_CACHE_MAX_AGE
+    )
+    return InstrumentedStorage(CachedStorage(gsheets, max_age=GSHEETS_CACHE_MAX_AGE), _stats, LAYER_APP)
+
+# Escalas encerradas são arquivadas em arquivos Parquet neste diretório
+# (configurável com ARCHIVE_DIR em .streamlit/secrets.toml)
+def get_archive_dir():
+    """Retorna o diretório do arquivo histórico."""
     try:
-        # Verifica se o email já existe
-        allowed_emails = get_allowed_emails()
-        if email in allowed_emails:
-            return False, "Email já está na lista de permitidos."
-        
-        # Lê a planilha atual e adiciona o novo email
-        try:
-            df_emails = conn.read(worksheet="emails_permitidos")
-            # Append the new email to the existing dataframe
-            new_email_data = pd.DataFrame([{"email": email}])
-            updated_emails = pd.concat([df_emails, new_email_data], ignore_index=True)
-            conn.update(worksheet="emails_permitidos", data=updated_emails)
-        except:
-            # Se a planilha não existir, cria com o primeiro email
-            new_email_data = pd.DataFrame([{"email": email}])
-            conn.update(worksheet="emails_permitidos", data=new_email_data)
-        
-        return True, "Email adicionado à lista de permitidos!"
-    except Exception as e:
-        error_msg = str(e)
-        if "Public Spreadsheet cannot be written to" in error_msg:
-            return False, "⚠️ ERRO DE CONFIGURAÇÃO: O Google Sheets não está configurado com Service Account. Consulte GOOGLE_SHEETS_SETUP.md para instruções."
-        return False, f"Erro ao adicionar email: {error_msg}"
+        return st.secrets.get("ARCHIVE_DIR", "arquivo")
+    except:
+        return "arquivo"
+
+@st.cache_resource
+def get_archive(directory=None):
+    """Arquivo histórico compartilhado por todas as sessões."""
+    return EscalaArchive(directory or get_archive_dir())
 
-def remove_allowed_email(email):
-    """Remove um email da lista de permitidos."""
+# Custo do bcrypt para as senhas e número de cálculos simultâneos (opcional, em .streamlit/secrets.toml):
+# BCRYPT_ROUNDS = 12
+# BCRYPT_WORKERS = 4
+# Senhas gravadas com outro custo são refeitas com o custo atual no próximo login.
+def get_password_config():
+    """Retorna o custo do bcrypt e o tamanho do pool de hash (None = padrão)."""
     try:
-        df_emails = conn.read(worksheet="emails_permitidos")
-        df_emails_filtered = df_emails[df_emails['email'] != email]
-        
-        if len(df_emails_filtered) == len(df_emails):
-            return False, "Email não encontrado na lista."
-        
-        conn.update(worksheet="emails_permitidos", data=df_emails_filtered)
-        return True, "Email removido da lista de permitidos!"
-    except Exception as e:
-        error_msg = str(e)
-        if "Public Spreadsheet cannot be written to" in error_msg:
-            return False, "⚠️ ERRO DE CONFIGURAÇÃO: O Google Sheets não está configurado com Service Account. Consulte GOOGLE_SHEETS_SETUP.md para instruções."
-        return False, f"Erro ao remover email: {error_msg}"
+        return int(st.secrets.get("BCRYPT_ROUNDS", DEFAULT_ROUNDS)), st.secrets.get("BCRYPT_WORKERS")
+    except:
+        return DEFAULT_ROUNDS, None
+
+@st.cache_resource
+def get_password_hasher(rounds, max_workers=None):
+    """Pool de hash de senhas compartilhado por todas as sessões (logins simultâneos esperam na fila)."""
+    return PasswordHasher(rounds, None if max_workers is None else int(max_workers))
+
+# Sessões: depois do login, um token assinado fica em um cookie do navegador (fora da URL, para
+# não vazar no histórico nem em links copiados) e restaura o login quando a página é recarregada. Para que os tokens continuem válidos depois de reiniciar o app, defina em
+# .streamlit/secrets.toml uma chave secreta (e, opcionalmente, a validade em horas):
+# SESSION_SECRET = "uma-chave-longa-e-aleatoria"
+# SESSION_MAX_AGE_HOURS = 12
+SESSION_COOKIE = "sessao"
+# Tokens revogados (logout) até o fim da validade, guardados entre reinícios
+SESSION_REVOCATIONS = "sessoes_revogadas.json"
 
-def get_user_data(email):
-    """Busca os dados do usuário pelo email."""
+def get_session_config():
+    """Retorna a chave secreta dos tokens de sessão (None = aleatória por processo) e a validade em segundos."""
     try:
-        df_users = conn.read(worksheet="usuarios", usecols=[0, 1, 2, 3], ttl=5)
-        if not df_users.empty:
-            user_data = df_users[df_users['email'] == email]
-            if not user_data.empty:
-                return user_data.iloc[0]
-    except Exception as e:
-        # Se a planilha não existir ainda ou houver erro de autenticação, retorna None
-        # O erro será tratado no contexto de uso
-        pass
-    return None
+        return st.secrets.get("SESSION_SECRET"), float(st.secrets.get("SESSION_MAX_AGE_HOURS", DEFAULT_MAX_AGE / 3600)) * 3600
+    except:
+        return None, DEFAULT_MAX_AGE
 
-def register_user(name, matricula, email, password):
-    """Registra um novo usuário na planilha."""
-    if get_user_data(email) is not None:
-        return False, "E-mail já cadastrado."
-    
-    # Verifica se o email está na lista de permitidos
-    # O email do administrador sempre pode se registrar
-    allowed_emails = get_allowed_emails()
-    if email != ADMIN_EMAIL and email not in allowed_emails:
-        return False, "E-mail não autorizado. Entre em contato com o administrador para solicitar acesso."
-    
-    hashed_pw = hash_password(password)
-    new_user_data = pd.DataFrame([{
-        "nome": name,
-        "matricula": matricula,
-        "email": email,
-        "senha_hash": hashed_pw
-    }])
-    
+@st.cache_resource
+def get_session_tokens(secret, max_age):
+    """Emissor dos tokens de sessão, com a lista de revogados compartilhada por todas as sessões.
+
+    A chave faz parte da chave do cache: trocar SESSION_SECRET cria um novo emissor.
+    """
+    # Sem chave configurada os tokens morrem com o processo, então a lista não precisa ir para o disco
+    return SessionTokens(secret, max_age, SESSION_REVOCATIONS if secret else None)
+
+@st.cache_resource
+def get_export_cache():
+    """Arquivos exportados (PDF/Excel), compartilhados pelas sessões e guardados pelo conteúdo da escala."""
+    return ExportCache()
+
+@st.cache_resource
+def get_event_bus():
+    """Canal de eventos (mudanças de vez) compartilhado por todas as sessões do processo."""
+    return EventBus()
+
+@st.cache_resource
+def get_turn_scheduler():
+    """Fila de prazos das vezes, compartilhada por todas as sessões do processo."""
+    return TurnScheduler(on_expire=database.expire_turn)
+
+@st.cache_resource
+def start_turn_deadlines(_scheduler, _events):
+    """Liga os prazos às mudanças de vez e inicia a thread dos prazos (uma vez por processo)."""
+    _events.subscribe(None, lambda sequence, event: database.schedule_turn_deadline(event["escala_nome"]))
+    database.schedule_all_turn_deadlines()
+    _scheduler.start()
+    return True
+
+def connect_gsheets():
+    """Conecta ao Google Sheets usando os segredos (Secrets) do Streamlit Cloud."""
     try:
-        # Lê a planilha de usuários para encontrar a próxima linha vazia
-        try:
-            df_users = conn.read(worksheet="usuarios")
-            # Append the new user to the existing dataframe
-            updated_users = pd.concat([df_users, new_user_data], ignore_index=True)
-            conn.update(worksheet="usuarios", data=updated_users)
-        except:
-            # Se a planilha não existir, cria com o primeiro usuário
-            conn.update(worksheet="usuarios", data=new_user_data)
-        return True, "Usuário registrado com sucesso!"
-    except Exception as e:
-        error_msg = str(e)
-        if "Public Spreadsheet cannot be written to" in error_msg:
-            return False, "⚠️ ERRO DE CONFIGURAÇÃO: O Google Sheets não está configurado com Service Account. Consulte GOOGLE_SHEETS_SETUP.md para instruções."
-        return False, f"Erro ao registrar: {error_msg}"
-
-def register_user_oauth(name, email):
-    """Registra um novo usuário via OAuth (sem senha)."""
-    if get_user_data(email) is not None:
-        return False, "E-mail já cadastrado."
+        conn = st.connection("gsheets", type=GSheetsConnection)
     
-    # Verifica se o email está na lista de permitidos
-    # O email do administrador sempre pode se registrar
-    allowed_emails = get_allowed_emails()
-    if email != ADMIN_EMAIL and email not in allowed_emails:
-        return False, "E-mail não autorizado. Entre em contato com o administrador para solicitar acesso."
+        # Verifica se está usando Service Account (necessário para write operations)
+        if not hasattr(st, 'secrets') or 'connections' not in st.secrets or 'gsheets' not in st.secrets['connections']:
+            st.error("⚠️ **ERRO DE CONFIGURAÇÃO**: Google Sheets não está configurado!")
+            st.error("Você precisa configurar o Service Account para usar esta aplicação.")
+            st.info("📖 **Consulte o guia completo**: [GOOGLE_SHEETS_SETUP.md](https://github.com/MiguelJanssenn/Escala/blob/main/GOOGLE_SHEETS_SETUP.md)")
+            st.stop()
     
-    # Para usuários OAuth, não há senha (usa hash vazio como marcador)
-    new_user_data = pd.DataFrame([{
-        "nome": name,
-        "matricula": "OAUTH",  # Matrícula padrão para usuários OAuth
-        "email": email,
-        "senha_hash": "OAUTH_USER"  # Marcador para identificar usuários OAuth
-    }])
-    
-    try:
-        # Lê a planilha de usuários para encontrar a próxima linha vazia
-        try:
-            df_users = conn.read(worksheet="usuarios")
-            # Append the new user to the existing dataframe
-            updated_users = pd.concat([df_users, new_user_data], ignore_index=True)
-            conn.update(worksheet="usuarios", data=updated_users)
-        except:
-            # Se a planilha não existir, cria com o primeiro usuário
-            conn.update(worksheet="usuarios", data=new_user_data)
-        return True, "Usuário registrado com sucesso via Google!"
+        # Verifica se está usando service account
+        gsheets_config = st.secrets['connections']['gsheets']
+        if 'type' not in gsheets_config or gsheets_config['type'] != 'service_account':
+            st.error("⚠️ **ERRO DE AUTENTICAÇÃO**: Service Account não configurado!")
+            st.warning("""
+            O erro **"Public Spreadsheet cannot be written to"** ocorre porque você está tentando 
+            usar uma planilha pública (somente leitura) em vez de autenticação com Service Account.
+        
+            **Para corrigir este problema:**
+            1. Crie um Service Account no Google Cloud Console
+            2. Configure o arquivo `.streamlit/secrets.toml` com as credenciais do Service Account
+            3. Compartilhe sua planilha Google Sheets com o email do Service Account
+            """)
+            st.info("📖 **Guia completo de configuração**: [GOOGLE_SHEETS_SETUP.md](https://github.com/MiguelJanssenn/Escala/blob/main/GOOGLE_SHEETS_SETUP.md)")
+            st.stop()
+        
     except Exception as e:
-        error_msg = str(e)
-        if "Public Spreadsheet cannot be written to" in error_msg:
-            return False, "⚠️ ERRO DE CONFIGURAÇÃO: O Google Sheets não está configurado com Service Account. Consulte GOOGLE_SHEETS_SETUP.md para instruções."
-        return False, f"Erro ao registrar: {error_msg}"
-
-def add_atividades_bulk(escala_nome, df_new_atividades):
-    """Adiciona múltiplas atividades ao banco de dados."""
-    if df_new_atividades.empty:
-        return False, "Nenhuma atividade para adicionar."
+        st.error("⚠️ **ERRO ao conectar com Google Sheets**")
+        st.error(f"Detalhes do erro: {str(e)}")
     
-    # Adiciona IDs únicos e nome da escala
-    df_new_atividades['id_atividade'] = [str(uuid.uuid4()) for _ in range(len(df_new_atividades))]
-    df_new_atividades['escala_nome'] = escala_nome
+        if "Public Spreadsheet cannot be written to" in str(e):
+            st.warning("""
+            **Este erro significa que você está tentando usar uma planilha pública (somente leitura).**
+        
+            Para usar esta aplicação, você precisa:
+            1. Criar um Service Account no Google Cloud
+            2. Configurar as credenciais no arquivo `.streamlit/secrets.toml`
+            3. Compartilhar sua planilha com o email do Service Account
+            """)
     
-    try:
-        try:
-            df_atividades = conn.read(worksheet="atividades")
-            updated_atividades = pd.concat([df_atividades, df_new_atividades], ignore_index=True)
-            conn.update(worksheet="atividades", data=updated_atividades)
-        except:
-            # Se a planilha não existir, cria com as novas atividades
-            conn.update(worksheet="atividades", data=df_new_atividades)
-        return True, f"{len(df_new_atividades)} atividade(s) adicionada(s) com sucesso!"
-    except Exception as e:
-        return False, f"Erro ao adicionar atividades: {e}"
-
-def add_atividade(escala_nome, tipo, data, horario, vagas):
-    """Adiciona uma nova atividade ao banco de dados."""
-    atividade_id = str(uuid.uuid4()) # Gera um ID único
-    new_atividade = pd.DataFrame([{
-        "escala_nome": escala_nome,
-        "tipo": tipo,
-        "data": str(data),
-        "horario": horario,
-        "vagas": vagas,
-        "id_atividade": atividade_id
-    }])
+        st.info("📖 **Consulte o guia completo**: [GOOGLE_SHEETS_SETUP.md](https://github.com/MiguelJanssenn/Escala/blob/main/GOOGLE_SHEETS_SETUP.md)")
+        st.info("💡 **Exemplo de configuração**: Veja o arquivo `.streamlit/secrets.toml.example`")
+        st.stop()
     
-    try:
-        df_atividades = conn.read(worksheet="atividades")
-        # Append the new activity to the existing dataframe
-        updated_atividades = pd.concat([df_atividades, new_atividade], ignore_index=True)
-        conn.update(worksheet="atividades", data=updated_atividades)
-        return True
-    except Exception as e:
-        st.error(f"Erro ao adicionar atividade: {e}")
-        return False
+    return conn
 
-def get_escala_completa(escala_nome, sort_chronologically=True):
-    """Busca a escala com os nomes dos participantes."""
-    try:
-        df_atividades = conn.read(worksheet="atividades", ttl=5)
-        df_escolhas = conn.read(worksheet="escolhas", ttl=5)
-        
-        atividades_escala = df_atividades[df_atividades['escala_nome'] == escala_nome]
-        if atividades_escala.empty:
-            return pd.DataFrame(columns=['Tipo', 'Data', 'Horário', 'Vagas', 'Participantes', 'Observações'])
-        
-        # Agrupa os participantes por atividade
-        escolhas_agrupadas = df_escolhas.groupby('id_atividade')['nome_participante'].apply(lambda x: ', '.join(x)).reset_index()
-        
-        # Junta atividades com escolhas
-        df_final = pd.merge(
-            atividades_escala,
-            escolhas_agrupadas,
-            on="id_atividade",
-            how="left"
-        )
-        
-        df_final['Participantes'] = df_final['nome_participante'].fillna('')
-        
-        # Inclui observações se existir, senão cria coluna vazia
-        if 'observacoes' in df_final.columns:
-            df_final = df_final[['tipo', 'data', 'horario', 'vagas', 'Participantes', 'observacoes']]
-            df_final.columns = ['Tipo', 'Data', 'Horário', 'Vagas', 'Participantes', 'Observações']
-        else:
-            df_final = df_final[['tipo', 'data', 'horario', 'vagas', 'Participantes']]
-            df_final.columns = ['Tipo', 'Data', 'Horário', 'Vagas', 'Participantes']
-            df_final['Observações'] = ''
-        
-        # Formata a data para dd/mm/YYYY
-        try:
-            df_final['data_temp'] = pd.to_datetime(df_final['Data'], format='%d/%m/%Y', errors='coerce')
-            if df_final['data_temp'].isna().all():
-                # Se falhou, tenta formato YYYY-MM-DD
-                df_final['data_temp'] = pd.to_datetime(df_final['Data'], format='%Y-%m-%d', errors='coerce')
-            # Converte para dd/mm/YYYY
-            df_final['Data'] = df_final['data_temp'].dt.strftime('%d/%m/%Y')
-        except:
-            pass  # Mantém o formato original se falhar
-        
-        # Ordena cronologicamente se solicitado
-        if sort_chronologically:
-            try:
-                df_final['data_sort'] = pd.to_datetime(df_final['Data'], format='%d/%m/%Y', errors='coerce')
-                if df_final['data_sort'].isna().all():
-                    # Se falhou, tenta formato YYYY-MM-DD
-                    df_final['data_sort'] = pd.to_datetime(df_final['Data'], format='%Y-%m-%d', errors='coerce')
-            except:
-                df_final['data_sort'] = pd.to_datetime(df_final['Data'], errors='coerce')
-            
-            # Extrai o horário inicial para ordenação (ex: "07:00-19:00" -> "07:00")
-            df_final['horario_sort'] = df_final['Horário'].str.split('-').str[0].str.strip()
-            df_final = df_final.sort_values(['data_sort', 'horario_sort'])
-            df_final = df_final.drop(['data_sort', 'horario_sort'], axis=1)
-        
-        # Remove a coluna temporária se existir
-        if 'data_temp' in df_final.columns:
-            df_final = df_final.drop('data_temp', axis=1)
-        
-        return df_final
-    except Exception as e:
-        st.error(f"Erro ao buscar escala: {e}")
-        return pd.DataFrame(columns=['Tipo', 'Data', 'Horário', 'Vagas', 'Participantes', 'Observações'])
+def current_session_id():
+    """Identificador da sessão do Streamlit em execução."""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else None
 
+storage_stats = get_storage_stats()
+storage_stats.begin_render(current_session_id(), "Login")
 
-def get_current_round(escala_nome):
-    """Busca a rodada atual da escala."""
-    try:
-        df_rounds = conn.read(worksheet="rodadas", ttl=5)
-        rounds_escala = df_rounds[df_rounds['escala_nome'] == escala_nome]
-        if rounds_escala.empty:
-            return None
-        # Retorna a rodada com maior número (rodada atual)
-        return rounds_escala.loc[rounds_escala['numero_rodada'].idxmax()]
-    except:
-        return None
+storage_backend, sqlite_path = get_storage_config()
+if storage_backend == "sqlite":
+    db = get_shared_storage("sqlite", sqlite_path, _stats=storage_stats)
+else:
+    db = get_shared_storage("gsheets", None, _conn=connect_gsheets(), _stats=storage_stats)
+database.init(db, ADMIN_EMAIL, get_archive(), get_event_bus(), get_turn_scheduler(), get_password_hasher(*get_password_config()))
+start_turn_deadlines(get_turn_scheduler(), get_event_bus())
+# Cada planilha é lida no máximo uma vez por execução do script
+database.begin_snapshot()
 
-def create_new_round(escala_nome):
-    """Cria uma nova rodada com ordem aleatória dos participantes."""
-    try:
-        # Busca todos os usuários (exceto admin)
-        df_users = conn.read(worksheet="usuarios", ttl=5)
-        participants = df_users[df_users['email'] != ADMIN_EMAIL]['email'].tolist()
-        
-        if not participants:
-            return False, "Nenhum participante cadastrado."
-        
-        # Embaralha a ordem dos participantes
-        import random
-        random.shuffle(participants)
-        
-        # Determina o número da nova rodada
-        current_round = get_current_round(escala_nome)
-        new_round_number = 1 if current_round is None else int(current_round['numero_rodada']) + 1
-        
-        # Cria registros para a nova rodada
-        round_data = []
-        for position, email in enumerate(participants, start=1):
-            round_data.append({
-                "escala_nome": escala_nome,
-                "numero_rodada": new_round_number,
-                "posicao": position,
-                "email_participante": email,
-                "ja_escolheu": False
-            })
-        
-        new_round_df = pd.DataFrame(round_data)
-        
-        # Salva a nova rodada
-        try:
-            df_rounds = conn.read(worksheet="rodadas")
-            updated_rounds = pd.concat([df_rounds, new_round_df], ignore_index=True)
-            conn.update(worksheet="rodadas", data=updated_rounds)
-        except:
-            # Se a planilha não existir, cria com a nova rodada
-            conn.update(worksheet="rodadas", data=new_round_df)
-        
-        return True, f"Rodada {new_round_number} criada com {len(participants)} participantes!"
-    except Exception as e:
-        return False, f"Erro ao criar rodada: {e}"
+# --- Seção de Espera da Rodada ---
 
-def get_round_order(escala_nome):
-    """Retorna a ordem de escolha da rodada atual."""
-    try:
-        df_rounds = conn.read(worksheet="rodadas", ttl=5)
-        current_round = get_current_round(escala_nome)
-        
-        if current_round is None:
-            return pd.DataFrame(columns=['Posição', 'Participante', 'Email', 'Status'])
-        
-        round_number = current_round['numero_rodada']
-        round_data = df_rounds[
-            (df_rounds['escala_nome'] == escala_nome) & 
-            (df_rounds['numero_rodada'] == round_number)
-        ].sort_values('posicao')
-        
-        # Busca os nomes dos participantes
-        df_users = conn.read(worksheet="usuarios", ttl=5)
-        round_data = round_data.merge(
-            df_users[['email', 'nome']], 
-            left_on='email_participante', 
-            right_on='email', 
-            how='left'
-        )
-        
-        round_data['Status'] = round_data['ja_escolheu'].apply(lambda x: '✅ Escolheu' if x else '⏳ Aguardando')
-        
-        result = round_data[['posicao', 'nome', 'email_participante', 'Status']]
-        result.columns = ['Posição', 'Participante', 'Email', 'Status']
-        
-        return result
-    except Exception as e:
-        st.error(f"Erro ao buscar ordem da rodada: {e}")
-        return pd.DataFrame(columns=['Posição', 'Participante', 'Email', 'Status'])
+# A seção de espera confere o canal de eventos neste intervalo (segundos); a consulta
+# é feita em memória e as planilhas só são lidas quando a vez muda
+TURN_POLL_INTERVAL = 1
 
-def get_current_turn(escala_nome):
-    """Retorna o email do participante cuja vez é de escolher."""
-    try:
-        df_rounds = conn.read(worksheet="rodadas", ttl=5)
-        current_round = get_current_round(escala_nome)
-        
-        if current_round is None:
-            return None
-        
-        round_number = current_round['numero_rodada']
-        round_data = df_rounds[
-            (df_rounds['escala_nome'] == escala_nome) & 
-            (df_rounds['numero_rodada'] == round_number) &
-            (df_rounds['ja_escolheu'] == False)
-        ].sort_values('posicao')
-        
-        if round_data.empty:
-            return None  # Todos já escolheram
-        
-        return round_data.iloc[0]['email_participante']
-    except:
-        return None
+# Sem eventos (ex: edição direta na planilha), a seção é recarregada depois deste tempo (segundos)
+TURN_REFRESH_MAX_AGE = 30
 
-def mark_choice_made(escala_nome, email):
-    """Marca que um participante já fez sua escolha na rodada atual."""
-    try:
-        df_rounds = conn.read(worksheet="rodadas")
-        current_round = get_current_round(escala_nome)
-        
-        if current_round is None:
-            return False
-        
-        round_number = current_round['numero_rodada']
-        
-        # Atualiza o status de ja_escolheu para True
-        df_rounds.loc[
-            (df_rounds['escala_nome'] == escala_nome) & 
-            (df_rounds['numero_rodada'] == round_number) &
-            (df_rounds['email_participante'] == email),
-            'ja_escolheu'
-        ] = True
-        
-        conn.update(worksheet="rodadas", data=df_rounds)
-        return True
-    except Exception as e:
-        st.error(f"Erro ao marcar escolha: {e}")
-        return False
+def format_available_activities(df_available):
+    """Prepara a tabela de atividades disponíveis para exibição."""
+    df_display = df_available.copy()
+    if len(df_display.columns) == 6:
+        # Com observações
+        df_display.columns = ['ID', 'Tipo', 'Data', 'Horário', 'Vagas Disponíveis', 'Observações']
+        return df_display[['Tipo', 'Data', 'Horário', 'Vagas Disponíveis', 'Observações']]
+    # Sem observações
+    df_display.columns = ['ID', 'Tipo', 'Data', 'Horário', 'Vagas Disponíveis']
+    return df_display[['Tipo', 'Data', 'Horário', 'Vagas Disponíveis']]
 
-def get_available_activities(escala_nome):
-    """Retorna atividades disponíveis (com vagas) ordenadas cronologicamente."""
-    try:
-        df_atividades = conn.read(worksheet="atividades", ttl=5)
-        
-        # Filtra pela escala
-        atividades_escala = df_atividades[df_atividades['escala_nome'] == escala_nome].copy()
-        
-        if atividades_escala.empty:
-            return pd.DataFrame()
-        
-        # Conta quantas escolhas já foram feitas para cada atividade
-        try:
-            df_escolhas = conn.read(worksheet="escolhas", ttl=5)
-            escolhas_count = df_escolhas.groupby('id_atividade').size().reset_index(name='ocupadas')
-            atividades_escala = atividades_escala.merge(escolhas_count, on='id_atividade', how='left')
-            atividades_escala['ocupadas'] = atividades_escala['ocupadas'].fillna(0).astype(int)
-        except:
-            atividades_escala['ocupadas'] = 0
-        
-        # Calcula vagas disponíveis
-        atividades_escala['vagas_disponiveis'] = atividades_escala['vagas'].astype(int) - atividades_escala['ocupadas']
-        
-        # Filtra apenas atividades com vagas disponíveis
-        atividades_disponiveis = atividades_escala[atividades_escala['vagas_disponiveis'] > 0].copy()
-        
-        # Ordena cronologicamente
-        atividades_disponiveis['data_sort'] = pd.to_datetime(atividades_disponiveis['data'], format='%d/%m/%Y', errors='coerce')
-        if atividades_disponiveis['data_sort'].isna().all():
-            # Se falhou, tenta formato YYYY-MM-DD
-            atividades_disponiveis['data_sort'] = pd.to_datetime(atividades_disponiveis['data'], format='%Y-%m-%d', errors='coerce')
-        atividades_disponiveis['horario_sort'] = atividades_disponiveis['horario'].str.split('-').str[0].str.strip()
-        atividades_disponiveis = atividades_disponiveis.sort_values(['data_sort', 'horario_sort'])
-        
-        # Inclui observações se disponível
-        if 'observacoes' in atividades_disponiveis.columns:
-            return atividades_disponiveis[['id_atividade', 'tipo', 'data', 'horario', 'vagas_disponiveis', 'observacoes']]
-        else:
-            return atividades_disponiveis[['id_atividade', 'tipo', 'data', 'horario', 'vagas_disponiveis']]
-    except Exception as e:
-        st.error(f"Erro ao buscar atividades disponíveis: {e}")
-        return pd.DataFrame()
+def show_round_header(current_round, df_order):
+    """Mostra a rodada atual e a ordem de escolha."""
+    if current_round is None:
+        st.warning("⏳ Nenhuma rodada foi iniciada ainda para esta escala. Aguarde o administrador iniciar a primeira rodada.")
+        return
 
-def make_choice(escala_nome, email_participante, nome_participante, id_atividade):
-    """Registra a escolha de um participante."""
-    try:
-        # Cria o registro da escolha
-        new_choice = pd.DataFrame([{
-            "escala_nome": escala_nome,
-            "id_atividade": id_atividade,
-            "email_participante": email_participante,
-            "nome_participante": nome_participante
-        }])
-        
-        # Salva a escolha
+    st.info(f"📍 Rodada atual: **{int(current_round['numero_rodada'])}**")
+
+    # Mostra a ordem da rodada
+    st.subheader("Ordem de Escolha")
+    st.dataframe(df_order, use_container_width=True)
+
+@st.fragment(run_every=TURN_POLL_INTERVAL)
+def waiting_view(escala_nome, user_email):
+    """Seção de espera da rodada, refeita sozinha quando a vez muda."""
+    sequence = turn_sequence(escala_nome)
+    seen = st.session_state.get('vez_vista')
+    if seen is not None and seen[0] == escala_nome and seen[1] == sequence and time.monotonic() - seen[2] < TURN_REFRESH_MAX_AGE:
+        # Nada mudou: redesenha a seção sem ler as planilhas
+        view = seen[3]
+    else:
+        # A execução do fragmento não passa pelo início do script: usa um snapshot novo
+        storage_stats.begin_fragment(current_session_id(), "Participante: Aguardando vez")
         try:
-            df_escolhas = conn.read(worksheet="escolhas")
-            updated_escolhas = pd.concat([df_escolhas, new_choice], ignore_index=True)
-            conn.update(worksheet="escolhas", data=updated_escolhas)
-        except:
-            # Se a planilha não existir, cria com a primeira escolha
-            conn.update(worksheet="escolhas", data=new_choice)
-        
-        # Marca que o participante já escolheu nesta rodada
-        mark_choice_made(escala_nome, email_participante)
-        
-        return True, "Escolha registrada com sucesso!"
-    except Exception as e:
-        return False, f"Erro ao registrar escolha: {e}"
+            database.begin_snapshot()
+            current_turn = get_current_turn(escala_nome)
+            if current_turn == user_email:
+                # Chegou a vez do participante: recarrega a página para mostrar o formulário
+                st.session_state.pop('vez_vista', None)
+                st.rerun()
+            current_round = get_current_round(escala_nome)
+            current_user = get_user_data(current_turn) if current_turn is not None else None
+            view = {
+                "deadline": get_turn_deadline(escala_nome),
+                "round": current_round,
+                "order": get_round_order(escala_nome) if current_round is not None else None,
+                "turn": current_turn,
+                "picker": current_user['nome'] if current_user is not None else None,
+                "available": get_available_activities(escala_nome) if current_turn is not None else pd.DataFrame(),
+            }
+        finally:
+            storage_stats.end_fragment()
+        st.session_state['vez_vista'] = (escala_nome, sequence, time.monotonic(), view)
 
+    show_round_header(view["round"], view["order"])
+    if view["round"] is None:
+        return
 
-# --- Funções de Exportação (Mantidas como estavam) ---
-from fpdf import FPDF
-import io
+    if view["turn"] is None:
+        st.success("✅ Todos os participantes já escolheram nesta rodada! Aguarde o administrador iniciar a próxima rodada.")
+        return
 
-def dataframe_to_pdf(df):
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=10)
-    
-    # Cabeçalhos - ajusta larguras dinamicamente baseado no número de colunas
-    num_cols = len(df.columns)
-    if num_cols == 6:
-        # Com Observações: Tipo, Data, Horário, Vagas, Participantes, Observações
-        col_widths = [25, 20, 25, 12, 60, 38]
+    # Mostra quem está escolhendo no momento
+    if view["picker"] is not None:
+        st.info(f"⏳ Aguarde sua vez. Escolhendo agora: **{view['picker']}**")
     else:
-        # Sem Observações
-        col_widths = [30, 25, 30, 15, 80]
-    
-    for i, col in enumerate(df.columns):
-        if i < len(col_widths):
-            pdf.cell(col_widths[i], 10, col, 1, 0, 'C')
-    pdf.ln()
-    
-    # Dados
-    for index, row in df.iterrows():
-        for i, item in enumerate(row):
-            if i < len(col_widths):
-                pdf.multi_cell(col_widths[i], 10, str(item), 1, 'L')
-        pdf.ln()
-    
-    # fpdf2 returns bytearray, convert to bytes for streamlit compatibility
-    return bytes(pdf.output())
+        st.info(f"⏳ Aguarde sua vez.")
+    if view["deadline"] is not None:
+        st.caption(f"⏰ A vez atual termina às {view['deadline'].strftime('%H:%M')}.")
+
+    # Mostra atividades disponíveis (apenas visualização)
+    with st.expander("👁️ Ver Atividades Disponíveis"):
+        if not view["available"].empty:
+            st.dataframe(format_available_activities(view["available"]), use_container_width=True)
+
+def ballot_view(escala_nome, user_email):
+    """Cédula de preferências do participante (modo de escolha por cédulas)."""
+    st.info("🗳️ Nesta escala, as vagas são distribuídas de uma vez a partir das cédulas de preferência.")
+
+    df_available = get_available_activities(escala_nome)
+    if df_available.empty:
+        st.warning("Nenhuma atividade disponível no momento.")
+        return
+
+    labels = {
+        row['id_atividade']: f"{row['tipo']} - {row['data']} - {row['horario']}"
+        for _, row in df_available.iterrows()
+    }
+    current = [i for i in get_user_preferences(escala_nome, user_email) if i in labels]
 
-def dataframe_to_excel(df):
-    output = io.BytesIO()
-    writer = pd.ExcelWriter(output, engine='xlsxwriter')
-    df.to_excel(writer, index=False, sheet_name='Escala')
-    writer.close()
-    processed_data = output.getvalue()
-    return processed_data
+    st.subheader("Minha Cédula")
+    st.write("Selecione as atividades **na ordem da sua preferência** (a primeira selecionada é a preferida).")
+    with st.form("form_cedula"):
+        ranking = st.multiselect(
+            "Atividades em ordem de preferência:",
+            options=list(labels),
+            default=current,
+            format_func=lambda x: labels[x]
+        )
+        if st.form_submit_button("💾 Salvar Cédula", type="primary"):
+            success, message = save_preferences(escala_nome, user_email, ranking)
+            if success:
+                st.success(message)
+            else:
+                st.error(message)
 
 # --- Lógica de Login e Registro (Novo) ---
 
+session_tokens = get_session_tokens(*get_session_config())
+
+def set_logged_in(nome, email):
+    """Marca a sessão como logada."""
+    st.session_state['logged_in'] = True
+    st.session_state['user_name'] = nome
+    st.session_state['user_email'] = email
+    st.session_state['is_admin'] = (normalize_email(email) == normalize_email(ADMIN_EMAIL))
+
+def start_session(nome, email):
+    """Faz o login e emite o token assinado, gravado no cookie para o login sobreviver ao recarregar a página."""
+    set_logged_in(nome, email)
+    # O token do administrador vale menos tempo: o cookie não é HttpOnly (ver sessions.py)
+    max_age = min(session_tokens.max_age, ADMIN_MAX_AGE) if st.session_state['is_admin'] else session_tokens.max_age
+    st.session_state['session_token'] = session_tokens.issue(email, nome, max_age)
+    st.session_state['session_max_age'] = max_age
+    st.session_state['session_cookie_set'] = False
+
+def set_session_cookie(token, max_age):
+    """Grava o cookie do token de sessão no navegador (max_age 0 apaga o cookie)."""
+    st.html(
+        f'<script>document.cookie = "{SESSION_COOKIE}={token}; path=/; max-age={int(max_age)}; SameSite=Strict"'
+        f' + (location.protocol === "https:" ? "; Secure" : "");</script>',
+        unsafe_allow_javascript=True
+    )
+
 if 'logged_in' not in st.session_state:
     st.session_state['logged_in'] = False
     st.session_state['user_name'] = None
     st.session_state['user_email'] = None
     st.session_state['is_admin'] = False
 
+# Página recarregada ou reconexão: restaura o login pelo token do cookie, sem ler a planilha de usuários
+session_cookie = st.context.cookies.get(SESSION_COOKIE)
+if not st.session_state['logged_in'] and session_cookie:
+    claims = session_tokens.verify(session_cookie)
+    if claims is not None:
+        set_logged_in(claims['nome'], claims['email'])
+        st.session_state['session_token'] = session_cookie
+        st.session_state['session_cookie_set'] = True
+
 # Se não estiver logado, mostra o formulário de login/registro
 if not st.session_state['logged_in']:
+    if session_cookie and not st.session_state.get('session_cookie_cleared'):
+        # Token vencido, revogado ou adulterado. st.context.cookies não muda durante a
+        # conexão, então o cookie é apagado uma vez só
+        set_session_cookie("", 0)
+        st.session_state['session_cookie_cleared'] = True
     
     tab_login, tab_register = st.tabs(["Login", "Registrar"])
     
@@ -635,11 +444,8 @@ if not st.session_state['logged_in']:
                     # Verifica se é usuário OAuth ou tradicional
                     if user_data['senha_hash'] == "OAUTH_USER":
                         st.error("Esta conta foi criada com Google. Use 'Login com Google' abaixo.")
-                    elif check_password(password, user_data['senha_hash']):
-                        st.session_state['logged_in'] = True
-                        st.session_state['user_name'] = user_data['nome']
-                        st.session_state['user_email'] = user_data['email']
-                        st.session_state['is_admin'] = (user_data['email'] == ADMIN_EMAIL)
+                    elif check_user_password(user_data['email'], password, user_data['senha_hash']):
+                        start_session(user_data['nome'], user_data['email'])
                         st.rerun() # Recarrega a página para o estado "logado"
                     else:
                         st.error("Email ou senha incorretos.")
@@ -685,20 +491,14 @@ if not st.session_state['logged_in']:
                     
                     if user_data is not None:
                         # Usuário já existe, faz login
-                        st.session_state['logged_in'] = True
-                        st.session_state['user_name'] = user_data['nome']
-                        st.session_state['user_email'] = user_data['email']
-                        st.session_state['is_admin'] = (user_data['email'] == ADMIN_EMAIL)
+                        start_session(user_data['nome'], user_data['email'])
                         st.rerun()
                     else:
                         # Usuário não existe, tenta registrar automaticamente
                         success, message = register_user_oauth(name, email)
                         if success:
                             # Registrou com sucesso, faz login automaticamente
-                            st.session_state['logged_in'] = True
-                            st.session_state['user_name'] = name
-                            st.session_state['user_email'] = email
-                            st.session_state['is_admin'] = (email == ADMIN_EMAIL)
+                            start_session(name, normalize_email(email))
                             st.success(message)
                             time.sleep(1)
                             st.rerun()
@@ -735,7 +535,14 @@ if not st.session_state['logged_in']:
 # --- Aplicação Principal (Se estiver logado) ---
 else:
     st.sidebar.write(f"Bem-vindo(a), **{st.session_state['user_name']}**!")
+    if st.session_state.get('session_token') and not st.session_state.get('session_cookie_set'):
+        # Login novo nesta conexão: grava o token no cookie uma vez só
+        set_session_cookie(st.session_state['session_token'], st.session_state['session_max_age'])
+        st.session_state['session_cookie_set'] = True
     if st.sidebar.button("Logout"):
+        # Revoga o token para que o cookie não restaure o login (o cookie é apagado na tela de login)
+        if st.session_state.get('session_token'):
+            session_tokens.revoke(st.session_state['session_token'])
         for key in list(st.session_state.keys()):
             del st.session_state[key] # Limpa a sessão
         st.rerun()
@@ -743,7 +550,8 @@ else:
     # --- Visão do Administrador ---
     if st.session_state['is_admin']:
         st.sidebar.title("Painel do Administrador")
-        menu_admin = st.sidebar.radio("Selecione:", ["Criar/Ver Escala", "Gerenciar Emails Permitidos", "Configurar Regras", "Histórico"])
+        menu_admin = st.sidebar.radio("Selecione:", ["Criar/Ver Escala", "Gerenciar Emails Permitidos", "Configurar Regras", "Diagnóstico", "Histórico"])
+        storage_stats.set_render_label(f"Admin: {menu_admin}")
 
         if menu_admin == "Criar/Ver Escala":
             st.header("Gerenciador de Escalas 🗓️")
@@ -848,24 +656,31 @@ else:
                 df_escala_completa = get_escala_completa(escala_nome)
                 st.dataframe(df_escala_completa, use_container_width=True)
 
-                # Botões de Exportação
-                col1, col2 = st.columns(2)
+                # Botões de Exportação (os arquivos só são gerados quando alguém baixa)
+                export_cache = get_export_cache()
+                col1, col2, col3 = st.columns(3)
                 with col1:
-                    pdf_data = dataframe_to_pdf(df_escala_completa)
                     st.download_button(
                         label="📥 Exportar para PDF",
-                        data=pdf_data,
+                        data=lambda: export_cache.pdf(df_escala_completa, f"Escala {escala_nome}"),
                         file_name=f"escala_{escala_nome.replace('/', '_')}.pdf",
                         mime="application/pdf",
                     )
                 with col2:
-                    excel_data = dataframe_to_excel(df_escala_completa)
                     st.download_button(
                         label="📥 Exportar para Excel",
-                        data=excel_data,
+                        data=lambda: export_cache.excel(df_escala_completa),
                         file_name=f"escala_{escala_nome.replace('/', '_')}.xlsx",
                         mime="application/vnd.ms-excel"
                     )
+                with col3:
+                    # Um PDF por participante, com as atividades escolhidas por ele
+                    st.download_button(
+                        label="📦 Escalas Individuais (PDF em zip)",
+                        data=lambda: export_cache.participant_zip(get_participant_schedules(escala_nome), escala_nome),
+                        file_name=f"escalas_individuais_{escala_nome.replace('/', '_')}.zip",
+                        mime="application/zip"
+                    )
                 
                 st.divider()
                 
@@ -875,17 +690,33 @@ else:
                 current_round = get_current_round(escala_nome)
                 if current_round is not None:
                     st.info(f"📍 Rodada atual: **{int(current_round['numero_rodada'])}**")
+
+                    # Modo cédulas: distribui todas as vezes pendentes de uma vez
+                    if get_rules(escala_nome)['modo_escolha'] == CHOICE_BALLOT and get_current_turn(escala_nome) is not None:
+                        st.write(f"🗳️ Cédulas recebidas: **{count_ballots(escala_nome)}**")
+                        metodos = {
+                            BALLOT_SERIAL: "Seguir a ordem das rodadas",
+                            BALLOT_OPTIMAL: "Distribuição ótima (melhor posição média nas cédulas)",
+                        }
+                        metodo = st.radio("Método de distribuição:", options=list(metodos), format_func=lambda x: metodos[x])
+                        if st.button("📬 Distribuir Vagas pelas Cédulas"):
+                            success, message = run_ballot(escala_nome, metodo)
+                            if success:
+                                st.success(message)
+                                st.rerun()
+                            else:
+                                st.error(message)
                     
                     # Mostra a ordem da rodada
                     df_order = get_round_order(escala_nome)
                     st.dataframe(df_order, use_container_width=True)
                     
                     # Verifica se todos já escolheram
-                    all_chosen = (df_order['Status'] == '✅ Escolheu').all()
+                    all_chosen = (df_order['Status'] != '⏳ Aguardando').all()
                     if all_chosen:
                         st.success("✅ Todos os participantes já escolheram nesta rodada!")
                         if st.button("🔄 Iniciar Nova Rodada"):
-                            success, message = create_new_round(escala_nome)
+                            success, message = create_new_round(escala_nome, total_rodadas=1)
                             if success:
                                 st.success(message)
                                 st.rerun()
@@ -920,6 +751,76 @@ else:
                             st.error(message)
                     else:
                         st.warning("Por favor, digite um email válido.")
+
+            # Adicionar vários emails de uma vez (uma única escrita na planilha)
+            with st.form("form_add_emails_bulk", clear_on_submit=True):
+                st.subheader("Adicionar Vários Emails")
+                st.caption("Cole os emails separados por linha, vírgula ou ponto e vírgula, ou envie um arquivo CSV. "
+                           "Outras colunas (nome, matrícula) são ignoradas.")
+                pasted = st.text_area("Emails:")
+                uploaded = st.file_uploader("Arquivo CSV:", type=["csv", "txt"])
+                add_bulk_button = st.form_submit_button("Adicionar Emails")
+
+                if add_bulk_button:
+                    text = pasted or ""
+                    if uploaded is not None:
+                        text += "\n" + uploaded.getvalue().decode("utf-8-sig", errors="replace")
+                    emails, invalid = extract_emails(text)
+                    if invalid:
+                        st.warning(f"{len(invalid)} endereço(s) inválido(s) ignorado(s): {', '.join(invalid[:10])}")
+                    if emails:
+                        success, message = add_allowed_emails_bulk(emails)
+                        if success:
+                            st.success(message)
+                        else:
+                            st.error(message)
+                    elif not invalid:
+                        st.warning("Nenhum email encontrado.")
+
+            # Cadastro em lote: autoriza e cria as contas da turma a partir de uma planilha
+            with st.form("form_import_roster", clear_on_submit=True):
+                st.subheader("Importar Turma")
+                st.caption("Envie uma planilha (CSV ou Excel) com as colunas Nome, Matrícula e Email. Os emails são "
+                           "autorizados e as contas são criadas com senhas iniciais aleatórias, para você repassar "
+                           "aos participantes.")
+                roster_file = st.file_uploader("Planilha da turma:", type=["csv", "xlsx"])
+                import_button = st.form_submit_button("Importar Turma")
+
+                if import_button:
+                    if roster_file is None:
+                        st.warning("Selecione a planilha da turma.")
+                    else:
+                        try:
+                            df_roster = read_roster(roster_file.getvalue(), roster_file.name)
+                        except ValueError as e:
+                            st.error(str(e))
+                        else:
+                            with st.spinner("Criando as contas..."):
+                                success, message, credentials = provision_users(df_roster)
+                            if success:
+                                st.success(message)
+                                # Guardadas na sessão para o download sobreviver às próximas execuções
+                                st.session_state['credenciais_turma'] = credentials
+                            else:
+                                st.error(message)
+
+            credentials = st.session_state.get('credenciais_turma')
+            if credentials is not None and not credentials.empty:
+                st.info("🔑 Senhas iniciais das contas criadas. Baixe e repasse aos participantes: "
+                        "elas não ficam guardadas e não poderão ser vistas de novo.")
+                col_download, col_discard = st.columns(2)
+                with col_download:
+                    st.download_button(
+                        label="📥 Baixar Senhas Iniciais (CSV)",
+                        data=credentials.to_csv(index=False).encode("utf-8-sig"),
+                        file_name="senhas_iniciais.csv",
+                        mime="text/csv",
+                        on_click="ignore"
+                    )
+                with col_discard:
+                    if st.button("Descartar Senhas"):
+                        del st.session_state['credenciais_turma']
+                        st.rerun()
             
             # Mostrar lista de emails permitidos
             st.subheader("Lista de Emails Autorizados")
@@ -929,11 +830,11 @@ else:
                 df_allowed = pd.DataFrame(allowed_emails, columns=["Email"])
                 st.dataframe(df_allowed, use_container_width=True)
                 
-                # Remover email
-                st.subheader("Remover Email da Lista")
-                email_to_remove = st.selectbox("Selecione o email para remover:", allowed_emails)
-                if st.button("Remover Email Selecionado"):
-                    success, message = remove_allowed_email(email_to_remove)
+                # Remover emails (uma única escrita na planilha)
+                st.subheader("Remover Emails da Lista")
+                emails_to_remove = st.multiselect("Selecione os emails para remover:", allowed_emails)
+                if st.button("Remover Emails Selecionados", disabled=not emails_to_remove):
+                    success, message = remove_allowed_emails(emails_to_remove)
                     if success:
                         st.success(message)
                         st.rerun()
@@ -943,17 +844,193 @@ else:
                 st.info("Nenhum email cadastrado na lista de permitidos. Adicione emails acima para permitir novos cadastros.")
 
         elif menu_admin == "Configurar Regras":
-            st.header("Configuração de Regras (Em Desenvolvimento) ⚙️")
-            # ... (Lógica das regras) ...
+            st.header("Configuração de Regras ⚙️")
+            escala_nome = st.text_input("Digite o nome da escala (ex: 'Dezembro/2025'):")
+
+            if escala_nome:
+                rules = get_rules(escala_nome)
+                acoes = {
+                    DEADLINE_SKIP: "Pular o participante",
+                    DEADLINE_DEFAULT_PICK: "Escolher automaticamente a primeira atividade disponível",
+                }
+
+                st.subheader("Prazo de Cada Vez")
+                st.info("💡 Com prazo definido, a vez passa para o próximo participante automaticamente quando o tempo acaba. Use 0 para não ter prazo.")
+                with st.form("form_regras_prazo"):
+                    prazo_minutos = st.number_input("Prazo por vez (minutos):", min_value=0, value=rules['prazo_minutos'], step=5)
+                    acao_prazo = st.radio(
+                        "Quando o prazo terminar:",
+                        options=list(acoes),
+                        index=list(acoes).index(rules['acao_prazo']),
+                        format_func=lambda x: acoes[x]
+                    )
+                    if st.form_submit_button("💾 Salvar Prazo"):
+                        success, message = set_rules(escala_nome, prazo_minutos=int(prazo_minutos), acao_prazo=acao_prazo)
+                        if success:
+                            st.success(message)
+                        else:
+                            st.error(message)
+
+                deadline = get_turn_deadline(escala_nome)
+                if deadline is not None:
+                    st.caption(f"⏰ A vez atual termina às {deadline.strftime('%H:%M')}.")
+
+                st.markdown("---")
+
+                st.subheader("Modo de Escolha")
+                modos_escolha = {
+                    CHOICE_DRAFT: "Rodadas (cada participante escolhe na sua vez)",
+                    CHOICE_BALLOT: "Cédulas (todos enviam preferências e as vagas são distribuídas de uma vez)",
+                }
+                with st.form("form_regras_modo"):
+                    modo_escolha = st.radio(
+                        "Como os participantes escolhem:",
+                        options=list(modos_escolha),
+                        index=list(modos_escolha).index(rules['modo_escolha']),
+                        format_func=lambda x: modos_escolha[x]
+                    )
+                    if st.form_submit_button("💾 Salvar Modo"):
+                        success, message = set_rules(escala_nome, modo_escolha=modo_escolha)
+                        if success:
+                            st.success(message)
+                        else:
+                            st.error(message)
+
+                st.markdown("---")
+
+                st.subheader("Rodadas Planejadas")
+                st.info("💡 Ao iniciar a primeira rodada, a ordem de todas as rodadas planejadas é gerada de uma vez, e cada rodada começa sozinha quando a anterior termina.")
+                modos = {
+                    ORDER_RANDOM: "Aleatória (novo sorteio a cada rodada)",
+                    ORDER_SNAKE: "Serpentina (um sorteio; as rodadas alternam ida e volta)",
+                    ORDER_REVERSE: "Inversa (a cada duas rodadas, a segunda é a inversa da primeira)",
+                }
+                with st.form("form_regras_rodadas"):
+                    total_rodadas = st.number_input("Número de rodadas:", min_value=1, value=rules['total_rodadas'], step=1)
+                    modo_ordem = st.radio(
+                        "Ordem das rodadas:",
+                        options=list(modos),
+                        index=list(modos).index(rules['modo_ordem']),
+                        format_func=lambda x: modos[x]
+                    )
+                    if st.form_submit_button("💾 Salvar Rodadas"):
+                        success, message = set_rules(escala_nome, total_rodadas=int(total_rodadas), modo_ordem=modo_ordem)
+                        if success:
+                            st.success(message)
+                        else:
+                            st.error(message)
             
+        elif menu_admin == "Diagnóstico":
+            st.header("Diagnóstico do Armazenamento 🩻")
+            st.write("Chamadas ao armazenamento desde o início do processo (ou desde a última limpeza). "
+                     "\"Backend\" são as chamadas que chegam ao Google Sheets / SQLite; as demais são atendidas pelo cache. "
+                     "\"KiB em Memória\" é o tamanho dos dados no pandas, não o tráfego de rede.")
+
+            df_calls = storage_stats.calls()
+            app_reads = df_calls[df_calls['cache'].notna()]
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Chamadas ao backend", int((df_calls['camada'] == LAYER_BACKEND).sum()))
+            col2.metric("Leituras pelo cache", len(app_reads))
+            col3.metric("Acertos de cache", f"{(app_reads['cache'] == 'acerto').mean():.0%}" if not app_reads.empty else "-")
+
+            # Escritas que a fila desistiu de gravar (só no Google Sheets, com a fila em segundo plano)
+            falhas = db.failed_writes()
+            if falhas:
+                st.subheader("Escritas Não Gravadas")
+                st.error(f"⚠️ {len(falhas)} escrita(s) foram recusadas pelo backend {falhas[-1]['tentativas']} vezes e saíram da fila: "
+                         f"esses dados não estão na planilha. Uma cópia fica em {GSHEETS_WRITE_JOURNAL}.falhas.")
+                st.dataframe(pd.DataFrame([{
+                    "Quando": time.strftime("%d/%m/%Y %H:%M:%S", time.localtime(f["instante"])),
+                    "Planilha": f["worksheet"],
+                    "Operação": f["kind"],
+                    "Dados": str({k: f[k] for k in ("rows", "where", "values") if k in f}),
+                    "Erro": f["erro"],
+                } for f in falhas]), use_container_width=True, hide_index=True)
+
+            st.subheader("Latência por Planilha (backend)")
+            st.dataframe(storage_stats.latency_by_worksheet(), use_container_width=True, hide_index=True)
+
+            st.subheader("Execuções Mais Lentas")
+            st.dataframe(storage_stats.slowest_renders(), use_container_width=True, hide_index=True)
+
+            st.subheader("Chamadas por Tela e Função")
+            st.dataframe(storage_stats.calls_by_caller(), use_container_width=True, hide_index=True)
+
+            st.subheader("Sessões")
+            st.dataframe(storage_stats.sessions(), use_container_width=True, hide_index=True)
+
+            if st.button("🧹 Limpar Estatísticas"):
+                storage_stats.clear()
+                st.rerun()
+
         elif menu_admin == "Histórico":
-            st.header("Histórico de Escalas (Em Desenvolvimento) 📚")
-            # ... (Lógica do histórico) ...
+            st.header("Histórico de Escalas 📚")
+
+            # Arquivamento: move a escala encerrada para o arquivo e a remove das planilhas ao vivo
+            st.subheader("Arquivar Escala Encerrada")
+            st.info("💡 Escalas arquivadas saem das planilhas usadas durante as rodadas, mas continuam disponíveis para consulta abaixo.")
+            escala_arquivar = st.text_input("Nome da escala a arquivar:")
+            if escala_arquivar and st.button("📦 Arquivar Escala"):
+                success, message = archive_escala(escala_arquivar)
+                if success:
+                    st.success(message)
+                else:
+                    st.error(message)
+
+            st.markdown("---")
+
+            # Consulta: só a escala selecionada é lida do arquivo
+            st.subheader("Escalas Arquivadas")
+            escalas_arquivadas = get_archived_escalas()
+            if not escalas_arquivadas:
+                st.info("Nenhuma escala arquivada ainda.")
+            else:
+                escala_historico = st.selectbox("Selecione a escala:", escalas_arquivadas)
+                df_historico = get_escala_arquivada(escala_historico)
+                st.dataframe(df_historico, use_container_width=True)
+
+                export_cache = get_export_cache()
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.download_button(
+                        label="📥 Exportar para PDF",
+                        data=lambda: export_cache.pdf(df_historico, f"Escala {escala_historico}"),
+                        file_name=f"escala_{escala_historico.replace('/', '_')}.pdf",
+                        mime="application/pdf",
+                    )
+                with col2:
+                    st.download_button(
+                        label="📥 Exportar para Excel",
+                        data=lambda: export_cache.excel(df_historico),
+                        file_name=f"escala_{escala_historico.replace('/', '_')}.xlsx",
+                        mime="application/vnd.ms-excel"
+                    )
+
+            st.markdown("---")
+
+            # Exportação de várias escalas (ex: fechamento do ano) em uma planilha com várias abas
+            st.subheader("Exportar Várias Escalas (Excel)")
+            todas_escalas = sorted(set(get_escalas()) | set(escalas_arquivadas))
+            if not todas_escalas:
+                st.info("Nenhuma escala cadastrada ainda.")
+            else:
+                selecionadas = st.multiselect("Escalas:", todas_escalas, default=todas_escalas)
+                abas = {WORKBOOK_BY_ESCALA: "Uma aba por escala", WORKBOOK_BY_PARTICIPANT: "Uma aba por participante"}
+                por = st.radio("Organização:", options=list(abas), format_func=lambda x: abas[x], horizontal=True)
+                if selecionadas:
+                    # A planilha é gravada aba por aba só quando alguém baixa
+                    st.download_button(
+                        label="📥 Exportar Escalas Selecionadas",
+                        data=lambda: workbook_excel(iter_workbook_sheets(selecionadas, por)),
+                        file_name=f"escalas_por_{por}.xlsx",
+                        mime="application/vnd.ms-excel"
+                    )
 
     # --- Visão do Participante ---
     else:
         st.sidebar.title("Menu do Participante")
         menu_user = st.sidebar.radio("Selecione:", ["Escolher Horário", "Minha Escala", "Trocar Horário"])
+        storage_stats.set_render_label(f"Participante: {menu_user}")
 
         if menu_user == "Escolher Horário":
             st.header("Rodada de Escolha de Horários 🕒")
@@ -962,109 +1039,62 @@ else:
             escala_nome = st.text_input("Digite o nome da escala (ex: 'Dezembro/2025'):")
             
             if escala_nome:
-                # Verifica se existe uma rodada ativa
-                current_round = get_current_round(escala_nome)
-                
-                if current_round is None:
-                    st.warning("⏳ Nenhuma rodada foi iniciada ainda para esta escala. Aguarde o administrador iniciar a primeira rodada.")
-                else:
-                    round_number = int(current_round['numero_rodada'])
-                    st.info(f"📍 Rodada atual: **{round_number}**")
-                    
-                    # Mostra a ordem da rodada
-                    st.subheader("Ordem de Escolha")
-                    df_order = get_round_order(escala_nome)
-                    st.dataframe(df_order, use_container_width=True)
-                    
-                    # Verifica de quem é a vez
-                    current_turn = get_current_turn(escala_nome)
-                    user_email = st.session_state['user_email']
-                    
-                    if current_turn is None:
-                        st.success("✅ Todos os participantes já escolheram nesta rodada! Aguarde o administrador iniciar a próxima rodada.")
-                    elif current_turn == user_email:
-                        st.success("🎯 É a sua vez de escolher!")
-                        
-                        # Mostra atividades disponíveis
-                        st.subheader("Atividades Disponíveis (Ordenadas Cronologicamente)")
-                        df_available = get_available_activities(escala_nome)
-                        
-                        if df_available.empty:
-                            st.warning("Nenhuma atividade disponível no momento.")
-                        else:
-                            # Prepara dados para exibição
-                            df_display = df_available.copy()
-                            if len(df_display.columns) == 6:
-                                # Com observações
-                                df_display.columns = ['ID', 'Tipo', 'Data', 'Horário', 'Vagas Disponíveis', 'Observações']
-                                df_display = df_display[['Tipo', 'Data', 'Horário', 'Vagas Disponíveis', 'Observações']]
-                            else:
-                                # Sem observações
-                                df_display.columns = ['ID', 'Tipo', 'Data', 'Horário', 'Vagas Disponíveis']
-                                df_display = df_display[['Tipo', 'Data', 'Horário', 'Vagas Disponíveis']]
-                            
-                            st.dataframe(df_display, use_container_width=True)
-                            
-                            # Formulário de escolha
-                            with st.form("form_escolha"):
-                                st.write("**Selecione uma atividade:**")
-                                
-                                # Cria opções para o selectbox
-                                options = []
-                                for idx, row in df_available.iterrows():
-                                    option_text = f"{row['tipo']} - {row['data']} - {row['horario']} ({int(row['vagas_disponiveis'])} vaga(s))"
-                                    options.append((option_text, row['id_atividade']))
-                                
-                                selected = st.selectbox(
-                                    "Escolha:",
-                                    options=range(len(options)),
-                                    format_func=lambda x: options[x][0]
-                                )
-                                
-                                submit = st.form_submit_button("✅ Confirmar Escolha", type="primary")
-                                
-                                if submit:
-                                    selected_id = options[selected][1]
-                                    success, message = make_choice(
-                                        escala_nome, 
-                                        user_email, 
-                                        st.session_state['user_name'],
-                                        selected_id
-                                    )
-                                    
-                                    if success:
-                                        st.success(message)
-                                        time.sleep(1)
-                                        st.rerun()
-                                    else:
-                                        st.error(message)
+                user_email = st.session_state['user_email']
+                current_turn = get_current_turn(escala_nome)
+
+                if get_rules(escala_nome)['modo_escolha'] == CHOICE_BALLOT:
+                    ballot_view(escala_nome, user_email)
+                elif current_turn == user_email:
+                    show_round_header(get_current_round(escala_nome), get_round_order(escala_nome))
+                    st.success("🎯 É a sua vez de escolher!")
+                    deadline = get_turn_deadline(escala_nome)
+                    if deadline is not None:
+                        st.warning(f"⏰ Você tem até **{deadline.strftime('%H:%M')}** para escolher.")
+
+                    # Mostra atividades disponíveis
+                    st.subheader("Atividades Disponíveis (Ordenadas Cronologicamente)")
+                    df_available = get_available_activities(escala_nome)
+
+                    if df_available.empty:
+                        st.warning("Nenhuma atividade disponível no momento.")
                     else:
-                        # Mostra quem está escolhendo no momento
-                        try:
-                            df_users = conn.read(worksheet="usuarios", ttl=5)
-                            current_user = df_users[df_users['email'] == current_turn]
-                            if not current_user.empty:
-                                current_name = current_user.iloc[0]['nome']
-                                st.info(f"⏳ Aguarde sua vez. Escolhendo agora: **{current_name}**")
-                            else:
-                                st.info(f"⏳ Aguarde sua vez.")
-                        except:
-                            st.info(f"⏳ Aguarde sua vez.")
-                        
-                        # Mostra atividades disponíveis (apenas visualização)
-                        with st.expander("👁️ Ver Atividades Disponíveis"):
-                            df_available = get_available_activities(escala_nome)
-                            if not df_available.empty:
-                                df_display = df_available.copy()
-                                if len(df_display.columns) == 6:
-                                    # Com observações
-                                    df_display.columns = ['ID', 'Tipo', 'Data', 'Horário', 'Vagas Disponíveis', 'Observações']
-                                    df_display = df_display[['Tipo', 'Data', 'Horário', 'Vagas Disponíveis', 'Observações']]
+                        st.dataframe(format_available_activities(df_available), use_container_width=True)
+
+                        # Formulário de escolha
+                        with st.form("form_escolha"):
+                            st.write("**Selecione uma atividade:**")
+
+                            # Cria opções para o selectbox
+                            options = []
+                            for idx, row in df_available.iterrows():
+                                option_text = f"{row['tipo']} - {row['data']} - {row['horario']} ({int(row['vagas_disponiveis'])} vaga(s))"
+                                options.append((option_text, row['id_atividade']))
+
+                            selected = st.selectbox(
+                                "Escolha:",
+                                options=range(len(options)),
+                                format_func=lambda x: options[x][0]
+                            )
+
+                            submit = st.form_submit_button("✅ Confirmar Escolha", type="primary")
+
+                            if submit:
+                                selected_id = options[selected][1]
+                                success, message = make_choice(
+                                    escala_nome,
+                                    user_email,
+                                    st.session_state['user_name'],
+                                    selected_id
+                                )
+
+                                if success:
+                                    st.success(message)
+                                    st.rerun()
                                 else:
-                                    # Sem observações
-                                    df_display.columns = ['ID', 'Tipo', 'Data', 'Horário', 'Vagas Disponíveis']
-                                    df_display = df_display[['Tipo', 'Data', 'Horário', 'Vagas Disponíveis']]
-                                st.dataframe(df_display, use_container_width=True)
+                                    st.error(message)
+                else:
+                    # Enquanto não é a vez do participante, só a seção de espera é atualizada
+                    waiting_view(escala_nome, user_email)
 
         elif menu_user == "Minha Escala":
             st.header("Minha Escala Pessoal")
@@ -1073,47 +1103,18 @@ else:
             
             if escala_nome:
                 try:
-                    df_escolhas = conn.read(worksheet="escolhas", ttl=5)
-                    df_atividades = conn.read(worksheet="atividades", ttl=5)
-                    
-                    # Filtra escolhas do usuário
+                    # Busca as escolhas do usuário com as informações das atividades
                     user_email = st.session_state['user_email']
-                    minhas_escolhas = df_escolhas[
-                        (df_escolhas['email_participante'] == user_email) &
-                        (df_escolhas['escala_nome'] == escala_nome)
-                    ]
+                    minhas_atividades = get_user_choices(escala_nome, user_email)
                     
-                    if minhas_escolhas.empty:
+                    if minhas_atividades.empty:
                         st.info("Você ainda não escolheu nenhuma atividade nesta escala.")
                     else:
-                        # Junta com informações das atividades
-                        minhas_atividades = minhas_escolhas.merge(
-                            df_atividades,
-                            on='id_atividade',
-                            how='left'
-                        )
-                        
-                        # Prepara dados para exibição
-                        if 'observacoes' in minhas_atividades.columns:
-                            df_display = minhas_atividades[['tipo', 'data', 'horario', 'observacoes']].copy()
-                            df_display.columns = ['Tipo', 'Data', 'Horário', 'Observações']
-                        else:
-                            df_display = minhas_atividades[['tipo', 'data', 'horario']].copy()
-                            df_display.columns = ['Tipo', 'Data', 'Horário']
-                        
                         # Ordena cronologicamente
-                        df_display['data_sort'] = pd.to_datetime(df_display['Data'], format='%d/%m/%Y', errors='coerce')
-                        if df_display['data_sort'].isna().all():
-                            # Se falhou, tenta formato YYYY-MM-DD
-                            df_display['data_sort'] = pd.to_datetime(df_display['Data'], format='%Y-%m-%d', errors='coerce')
-                        df_display['horario_sort'] = df_display['Horário'].str.split('-').str[0].str.strip()
-                        df_display = df_display.sort_values(['data_sort', 'horario_sort'])
+                        minhas_atividades = sort_by_start(minhas_atividades)
                         
-                        # Remove colunas de ordenação
-                        if 'observacoes' in minhas_atividades.columns:
-                            df_display = df_display[['Tipo', 'Data', 'Horário', 'Observações']]
-                        else:
-                            df_display = df_display[['Tipo', 'Data', 'Horário']]
+                        # Prepara dados para exibição
+                        df_display = format_personal_schedule(minhas_atividades)
                         
                         st.dataframe(df_display, use_container_width=True)
                         
@@ -1124,3 +1125,6 @@ else:
         elif menu_user == "Trocar Horário":
             st.header("Solicitar Troca de Horários 🔄")
             st.info("Funcionalidade em desenvolvimento.")
+
+# Fim da execução do script (execuções interrompidas por st.rerun são encerradas na próxima)
+storage_stats.end_render()
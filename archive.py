@@ -0,0 +1,80 @@
+"""
+Arquivo histórico das escalas encerradas.
+
+Cada escala arquivada vira um arquivo Parquet (colunar, comprimido com zstd)
+por planilha: <diretório>/<planilha>/<escala>.parquet. As planilhas ao vivo
+ficam só com as escalas em andamento, e o histórico é lido sob demanda,
+uma escala por vez.
+"""
+import hashlib
+import os
+import re
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Planilhas com dados por escala que vão para o arquivo
+ARCHIVED_WORKSHEETS = ["atividades", "rodadas", "escolhas", "regras", "preferencias"]
+
+# Chave dos metadados do Parquet com o nome original da escala
+_ESCALA_KEY = b"escala_nome"
+
+
+def _file_name(escala_nome):
+    """Nome de arquivo seguro para a escala (o hash evita colisões entre nomes parecidos)."""
+    slug = re.sub(r"[^A-Za-z0-9]+", "_", escala_nome).strip("_") or "escala"
+    digest = hashlib.sha1(escala_nome.encode("utf-8")).hexdigest()[:8]
+    return f"{slug}-{digest}.parquet"
+
+
+class EscalaArchive:
+    """Arquivo de escalas encerradas em um diretório local."""
+
+    def __init__(self, directory="arquivo"):
+        self.directory = directory
+
+    def _path(self, worksheet, escala_nome):
+        return os.path.join(self.directory, worksheet, _file_name(escala_nome))
+
+    def save(self, escala_nome, frames):
+        """Grava as planilhas da escala (planilha -> DataFrame) no arquivo."""
+        for worksheet in ARCHIVED_WORKSHEETS:
+            df = frames.get(worksheet, pd.DataFrame())
+            path = self._path(worksheet, escala_nome)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            metadata = dict(table.schema.metadata or {})
+            metadata[_ESCALA_KEY] = escala_nome.encode("utf-8")
+            table = table.replace_schema_metadata(metadata)
+
+            # Grava em um arquivo temporário para não deixar arquivos pela metade
+            tmp_path = path + ".tmp"
+            pq.write_table(table, tmp_path, compression="zstd")
+            os.replace(tmp_path, path)
+
+    def contains(self, escala_nome):
+        """Indica se a escala já foi arquivada."""
+        return os.path.exists(self._path("atividades", escala_nome))
+
+    def list_escalas(self):
+        """Nomes das escalas arquivadas (lê só os metadados dos arquivos)."""
+        folder = os.path.join(self.directory, "atividades")
+        if not os.path.isdir(folder):
+            return []
+        escalas = []
+        for name in sorted(os.listdir(folder)):
+            if not name.endswith(".parquet"):
+                continue
+            metadata = pq.read_schema(os.path.join(folder, name)).metadata or {}
+            if _ESCALA_KEY in metadata:
+                escalas.append(metadata[_ESCALA_KEY].decode("utf-8"))
+        return sorted(escalas)
+
+    def read(self, worksheet, escala_nome, columns=None):
+        """Lê uma planilha de uma escala arquivada (só as colunas pedidas, se informadas)."""
+        path = self._path(worksheet, escala_nome)
+        if not os.path.exists(path):
+            return pd.DataFrame(columns=columns or [])
+        return pq.read_table(path, columns=columns).to_pandas()
@@ -0,0 +1,1148 @@
+"""
+Funções de banco de dados da plataforma de escalas.
+
+As funções usam o backend de armazenamento configurado em init()
+(Google Sheets ou SQLite, ver storage.py).
+"""
+import io
+import random
+import re
+import secrets
+import threading
+import unicodedata
+import uuid
+from collections import Counter
+from datetime import date, datetime, time, timedelta
+
+import pandas as pd
+import streamlit as st
+
+from allocation import min_cost_assignment, serial_dictatorship
+from archive import ARCHIVED_WORKSHEETS
+from events import turn_channel
+from passwords import PasswordHasher
+from storage import NO_SLOTS, NOT_YOUR_TURN, UNKNOWN_ACTIVITY, SnapshotStorage, normalize_email
+
+# Backend de armazenamento ativo, email do administrador, arquivo histórico, canal de eventos,
+# fila de prazos das vezes e pool de hash de senhas, definidos por init()
+_db = None
+_admin_email = None
+_archive = None
+_events = None
+_scheduler = None
+_hasher = None
+
+# Snapshot da execução atual do script (cada sessão do Streamlit roda em sua própria thread)
+_local = threading.local()
+
+CONFIG_ERROR_MSG = "⚠️ ERRO DE CONFIGURAÇÃO: O Google Sheets não está configurado com Service Account. Consulte GOOGLE_SHEETS_SETUP.md para instruções."
+
+
+def init(storage, admin_email, archive=None, events=None, scheduler=None, hasher=None):
+    """Define o backend de armazenamento, o email do administrador e os serviços opcionais."""
+    global _db, _admin_email, _archive, _events, _scheduler, _hasher
+    _db = storage
+    _admin_email = normalize_email(admin_email)
+    _archive = archive
+    _events = events
+    _scheduler = scheduler
+    _hasher = hasher
+
+def begin_snapshot():
+    """Inicia um novo snapshot das planilhas para a execução atual do script."""
+    _local.snapshot = SnapshotStorage(_db)
+
+def _get_db():
+    """Retorna o snapshot da execução atual, ou o backend se não houver snapshot."""
+    snapshot = getattr(_local, 'snapshot', None)
+    if snapshot is not None and snapshot.backend is _db:
+        return snapshot
+    return _db
+
+
+# --- Funções de Hash de Senha ---
+def _password_hasher():
+    """Pool de hash definido em init(), ou um pool com o custo padrão."""
+    global _hasher
+    if _hasher is None:
+        _hasher = PasswordHasher()
+    return _hasher
+
+def hash_password(password):
+    """Criptografa a senha."""
+    return _password_hasher().hash(password)
+
+def check_user_password(email, password, hashed):
+    """Verifica a senha do usuário no login.
+
+    Se o hash foi gerado com um custo diferente do configurado, grava um novo
+    hash com o custo atual (o usuário não percebe a troca).
+    """
+    valid, new_hash = _password_hasher().verify_and_update(password, hashed)
+    if valid and new_hash is not None:
+        try:
+            _get_db().update_rows("usuarios", {"email": email}, {"senha_hash": new_hash})
+        except Exception:
+            # O login não depende da troca do hash; ela é tentada de novo no próximo login
+            pass
+    return valid
+
+# --- Datas e Horários ---
+
+# Formatos aceitos para a data das atividades, testados linha a linha
+DATE_FORMATS = ['%d/%m/%Y', '%Y-%m-%d']
+
+# Formato em que o início/fim das atividades é gravado
+DATETIME_FORMAT = '%Y-%m-%d %H:%M'
+
+def parse_date(value):
+    """Converte a data de uma atividade (dd/mm/AAAA ou AAAA-MM-DD) para date. Retorna None se inválida."""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    if value is None or pd.isna(value):
+        return None
+    text = str(value).strip().split(' ')[0]
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+def parse_time(value):
+    """Converte "HH:MM" para time. Retorna None se inválido."""
+    try:
+        return datetime.strptime(str(value).strip(), '%H:%M').time()
+    except ValueError:
+        return None
+
+def activity_interval(data, horario):
+    """Retorna (inicio, fim) da atividade como datetime.
+
+    Plantões que atravessam a meia-noite (ex: "19:00-07:00") terminam no dia seguinte.
+    """
+    dia = parse_date(data)
+    if dia is None:
+        return None, None
+
+    partes = str(horario).split('-') if horario is not None and not pd.isna(horario) else []
+    hora_inicio = parse_time(partes[0]) if partes else None
+    hora_fim = parse_time(partes[1]) if len(partes) > 1 else None
+
+    inicio = datetime.combine(dia, hora_inicio or time(0, 0))
+    fim = None
+    if hora_fim is not None:
+        fim = datetime.combine(dia, hora_fim)
+        if fim <= inicio:
+            fim += timedelta(days=1)
+    return inicio, fim
+
+def _add_activity_times(df):
+    """Grava as colunas inicio/fim (chaves cronológicas) nas atividades novas."""
+    intervals = [activity_interval(d, h) for d, h in zip(df['data'], df['horario'])]
+    df['inicio'] = [i.strftime(DATETIME_FORMAT) if i else None for i, _ in intervals]
+    df['fim'] = [f.strftime(DATETIME_FORMAT) if f else None for _, f in intervals]
+    return df
+
+def start_times(df):
+    """Retorna o início de cada atividade como Timestamp, para ordenação.
+
+    Usa a coluna inicio gravada na ingestão; atividades antigas, sem ela,
+    são convertidas linha a linha a partir de data/horario.
+    """
+    if 'inicio' in df.columns:
+        inicio = pd.to_datetime(df['inicio'], format=DATETIME_FORMAT, errors='coerce')
+    else:
+        inicio = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+    missing = inicio.isna()
+    if missing.any():
+        inicio[missing] = [
+            activity_interval(d, h)[0] for d, h in zip(df.loc[missing, 'data'], df.loc[missing, 'horario'])
+        ]
+        inicio = pd.to_datetime(inicio)
+    return inicio
+
+def sort_by_start(df):
+    """Ordena atividades pelo início (data + horário inicial)."""
+    return df.assign(_inicio=start_times(df)).sort_values('_inicio', kind='stable').drop(columns='_inicio')
+
+# --- Funções de Banco de Dados ---
+
+def get_allowed_emails():
+    """Busca a lista de emails permitidos para cadastro."""
+    try:
+        df_emails = _get_db().read("emails_permitidos")
+        if not df_emails.empty:
+            return df_emails['email'].tolist()
+        return []
+    except Exception as e:
+        # Se a planilha não existir ainda, retorna lista vazia
+        return []
+
+def is_email_allowed(email):
+    """Indica se o email está na lista de permitidos (busca no índice, sem varrer a lista)."""
+    try:
+        return normalize_email(email) in _get_db().email_index("emails_permitidos")
+    except Exception as e:
+        # Se a planilha não existir ainda, ninguém está na lista
+        return False
+
+def add_allowed_email(email):
+    """Adiciona um email à lista de permitidos."""
+    try:
+        # Verifica se o email já existe
+        if is_email_allowed(email):
+            return False, "Email já está na lista de permitidos."
+
+        _get_db().insert("emails_permitidos", pd.DataFrame([{"email": normalize_email(email)}]))
+        return True, "Email adicionado à lista de permitidos!"
+    except Exception as e:
+        error_msg = str(e)
+        if "Public Spreadsheet cannot be written to" in error_msg:
+            return False, CONFIG_ERROR_MSG
+        return False, f"Erro ao adicionar email: {error_msg}"
+
+# Separadores aceitos na importação de emails (vírgula, ponto e vírgula, espaços e quebras de linha)
+_EMAIL_SEPARATORS = re.compile(r"[,;\s]+")
+_EMAIL_PATTERN = re.compile(r"^[^@\s]+@[^@\s]+\.[^@\s]+$")
+
+def extract_emails(text):
+    """Separa os emails de um texto colado ou de um arquivo CSV.
+
+    Trechos sem "@" (cabeçalhos, nomes, matrículas) são ignorados. Retorna
+    (emails normalizados, sem repetição, na ordem em que aparecem; trechos com
+    "@" que não são emails válidos).
+    """
+    emails, invalid = {}, []
+    for token in _EMAIL_SEPARATORS.split(text or ""):
+        token = token.strip("\"'<>()[]")
+        if "@" not in token:
+            continue
+        email = normalize_email(token)
+        if _EMAIL_PATTERN.match(email):
+            emails.setdefault(email, None)
+        else:
+            invalid.append(token)
+    return list(emails), invalid
+
+def add_allowed_emails_bulk(emails):
+    """Adiciona vários emails à lista de permitidos em uma única escrita.
+
+    Os emails são normalizados e os que já estão na lista (ou repetidos)
+    são ignorados.
+    """
+    try:
+        allowed = _get_db().email_index("emails_permitidos")
+        new_emails = list(dict.fromkeys(
+            email for email in map(normalize_email, emails) if email and email not in allowed
+        ))
+        skipped = len(emails) - len(new_emails)
+        if not new_emails:
+            return False, "Nenhum email novo: todos já estão na lista de permitidos."
+
+        _get_db().insert("emails_permitidos", pd.DataFrame({"email": new_emails}))
+        message = f"{len(new_emails)} email(s) adicionado(s) à lista de permitidos!"
+        if skipped:
+            message += f" {skipped} já estava(m) na lista ou repetido(s)."
+        return True, message
+    except Exception as e:
+        error_msg = str(e)
+        if "Public Spreadsheet cannot be written to" in error_msg:
+            return False, CONFIG_ERROR_MSG
+        return False, f"Erro ao adicionar emails: {error_msg}"
+
+def remove_allowed_emails(emails):
+    """Remove vários emails da lista de permitidos em uma única escrita."""
+    try:
+        to_remove = set(map(normalize_email, emails))
+        df_emails = _get_db().read("emails_permitidos")
+        if df_emails.empty:
+            return False, "Nenhum dos emails está na lista."
+        keep = ~df_emails['email'].map(normalize_email).isin(to_remove)
+        removed = int((~keep).sum())
+        if not removed:
+            return False, "Nenhum dos emails está na lista."
+
+        _get_db().write("emails_permitidos", df_emails[keep])
+        return True, f"{removed} email(s) removido(s) da lista de permitidos!"
+    except Exception as e:
+        error_msg = str(e)
+        if "Public Spreadsheet cannot be written to" in error_msg:
+            return False, CONFIG_ERROR_MSG
+        return False, f"Erro ao remover emails: {error_msg}"
+
+def get_user_data(email):
+    """Busca os dados do usuário pelo email (sem diferenciar maiúsculas nem espaços nas pontas)."""
+    try:
+        user_data = _get_db().email_index("usuarios").get(normalize_email(email))
+        if user_data is not None:
+            return pd.Series(user_data)
+    except Exception as e:
+        # Se a planilha não existir ainda ou houver erro de autenticação, retorna None
+        # O erro será tratado no contexto de uso
+        pass
+    return None
+
+def register_user(name, matricula, email, password):
+    """Registra um novo usuário (o email é gravado normalizado)."""
+    email = normalize_email(email)
+    if get_user_data(email) is not None:
+        return False, "E-mail já cadastrado."
+
+    # Verifica se o email está na lista de permitidos
+    # O email do administrador sempre pode se registrar
+    if email != _admin_email and not is_email_allowed(email):
+        return False, "E-mail não autorizado. Entre em contato com o administrador para solicitar acesso."
+
+    hashed_pw = hash_password(password)
+    new_user_data = pd.DataFrame([{
+        "nome": name,
+        "matricula": matricula,
+        "email": email,
+        "senha_hash": hashed_pw
+    }])
+
+    try:
+        _get_db().insert("usuarios", new_user_data)
+        return True, "Usuário registrado com sucesso!"
+    except Exception as e:
+        error_msg = str(e)
+        if "Public Spreadsheet cannot be written to" in error_msg:
+            return False, CONFIG_ERROR_MSG
+        return False, f"Erro ao registrar: {error_msg}"
+
+def register_user_oauth(name, email):
+    """Registra um novo usuário via OAuth (sem senha; o email é gravado normalizado)."""
+    email = normalize_email(email)
+    if get_user_data(email) is not None:
+        return False, "E-mail já cadastrado."
+
+    # Verifica se o email está na lista de permitidos
+    # O email do administrador sempre pode se registrar
+    if email != _admin_email and not is_email_allowed(email):
+        return False, "E-mail não autorizado. Entre em contato com o administrador para solicitar acesso."
+
+    # Para usuários OAuth, não há senha (usa hash vazio como marcador)
+    new_user_data = pd.DataFrame([{
+        "nome": name,
+        "matricula": "OAUTH",  # Matrícula padrão para usuários OAuth
+        "email": email,
+        "senha_hash": "OAUTH_USER"  # Marcador para identificar usuários OAuth
+    }])
+
+    try:
+        _get_db().insert("usuarios", new_user_data)
+        return True, "Usuário registrado com sucesso via Google!"
+    except Exception as e:
+        error_msg = str(e)
+        if "Public Spreadsheet cannot be written to" in error_msg:
+            return False, CONFIG_ERROR_MSG
+        return False, f"Erro ao registrar: {error_msg}"
+
+# --- Cadastro em Lote (Turma) ---
+
+ROSTER_COLUMNS = ['nome', 'matricula', 'email']
+# Cabeçalhos aceitos na planilha da turma (sem acentos, minúsculos) -> coluna
+ROSTER_HEADERS = {
+    'nome': 'nome', 'nome completo': 'nome',
+    'matricula': 'matricula',
+    'email': 'email', 'e-mail': 'email',
+}
+CREDENTIAL_COLUMNS = ['nome', 'matricula', 'email', 'senha_inicial']
+# Custo do bcrypt das senhas iniciais. Elas são aleatórias (72 bits), então um custo menor
+# não as deixa adivinháveis; o hash é refeito com o custo configurado no primeiro login.
+INITIAL_PASSWORD_ROUNDS = 8
+
+def _header_key(header):
+    text = unicodedata.normalize('NFKD', str(header)).encode('ascii', 'ignore').decode('ascii')
+    return text.strip().lower()
+
+def read_roster(data, filename):
+    """Lê a planilha da turma (CSV ou Excel) com as colunas nome, matrícula e email.
+
+    Os cabeçalhos são reconhecidos sem diferenciar acentos e maiúsculas.
+    Levanta ValueError se o arquivo não tiver as três colunas.
+    """
+    if filename.lower().endswith(('.xlsx', '.xls')):
+        df = pd.read_excel(io.BytesIO(data), dtype=str)
+    else:
+        # Separador detectado (vírgula ou ponto e vírgula)
+        df = pd.read_csv(io.StringIO(data.decode('utf-8-sig', errors='replace')), sep=None, engine='python', dtype=str)
+    df = df.rename(columns=lambda c: ROSTER_HEADERS.get(_header_key(c), c))
+    missing = [column for column in ROSTER_COLUMNS if column not in df.columns]
+    if missing:
+        raise ValueError(f"Coluna(s) ausente(s) na planilha: {', '.join(missing)}. Use os cabeçalhos Nome, Matrícula e Email.")
+    return df[ROSTER_COLUMNS].fillna('')
+
+def provision_users(df_roster):
+    """Autoriza e cadastra os participantes da turma de uma só vez.
+
+    Os emails novos entram na lista de permitidos em uma única escrita e as
+    contas que ainda não existem são criadas em outra, cada uma com uma senha
+    inicial aleatória (os hashes são calculados em paralelo no pool de senhas,
+    com o custo INITIAL_PASSWORD_ROUNDS).
+    Linhas sem email válido e emails repetidos são ignorados.
+
+    Retorna (sucesso, mensagem, credenciais) - as credenciais são um DataFrame
+    com as senhas iniciais das contas criadas, para o administrador repassar.
+    """
+    credentials = pd.DataFrame(columns=CREDENTIAL_COLUMNS)
+    df = df_roster[ROSTER_COLUMNS].fillna('').astype(str).apply(lambda column: column.str.strip())
+    df['email'] = df['email'].map(normalize_email)
+    valid = df['email'].map(lambda email: bool(_EMAIL_PATTERN.match(email)))
+    invalid = int((~valid).sum())
+    df = df[valid].drop_duplicates('email')
+    if df.empty:
+        return False, "Nenhum email válido na planilha.", credentials
+
+    try:
+        allowed = _get_db().email_index("emails_permitidos")
+        new_allowed = [email for email in df['email'] if email not in allowed]
+        if new_allowed:
+            _get_db().insert("emails_permitidos", pd.DataFrame({"email": new_allowed}))
+
+        users = _get_db().email_index("usuarios")
+        new_users = df[~df['email'].isin(users)]
+        if not new_users.empty:
+            passwords = [secrets.token_urlsafe(9) for _ in range(len(new_users))]
+            _get_db().insert("usuarios", pd.DataFrame({
+                "nome": new_users['nome'].tolist(),
+                "matricula": new_users['matricula'].tolist(),
+                "email": new_users['email'].tolist(),
+                "senha_hash": _password_hasher().hash_many(
+                    passwords, min(INITIAL_PASSWORD_ROUNDS, _password_hasher().rounds)
+                )
+            }))
+            credentials = new_users.assign(senha_inicial=passwords).reset_index(drop=True)
+    except Exception as e:
+        error_msg = str(e)
+        if "Public Spreadsheet cannot be written to" in error_msg:
+            return False, CONFIG_ERROR_MSG, credentials
+        return False, f"Erro ao cadastrar a turma: {error_msg}", credentials
+
+    if credentials.empty and not new_allowed:
+        return False, "Nenhuma alteração: todos os participantes já estão autorizados e cadastrados.", credentials
+    message = f"{len(credentials)} conta(s) criada(s) e {len(new_allowed)} email(s) autorizado(s)."
+    if len(df) > len(credentials):
+        message += f" {len(df) - len(credentials)} participante(s) já tinha(m) cadastro."
+    if invalid:
+        message += f" {invalid} linha(s) sem email válido ignorada(s)."
+    return True, message, credentials
+
+def add_atividades_bulk(escala_nome, df_new_atividades):
+    """Adiciona múltiplas atividades ao banco de dados."""
+    if df_new_atividades.empty:
+        return False, "Nenhuma atividade para adicionar."
+
+    # Adiciona IDs únicos e nome da escala
+    df_new_atividades['id_atividade'] = [str(uuid.uuid4()) for _ in range(len(df_new_atividades))]
+    df_new_atividades['escala_nome'] = escala_nome
+    _add_activity_times(df_new_atividades)
+
+    try:
+        _get_db().insert("atividades", df_new_atividades)
+        return True, f"{len(df_new_atividades)} atividade(s) adicionada(s) com sucesso!"
+    except Exception as e:
+        return False, f"Erro ao adicionar atividades: {e}"
+
+def add_atividade(escala_nome, tipo, data, horario, vagas):
+    """Adiciona uma nova atividade ao banco de dados."""
+    atividade_id = str(uuid.uuid4()) # Gera um ID único
+    new_atividade = pd.DataFrame([{
+        "escala_nome": escala_nome,
+        "tipo": tipo,
+        "data": str(data),
+        "horario": horario,
+        "vagas": vagas,
+        "id_atividade": atividade_id
+    }])
+    _add_activity_times(new_atividade)
+
+    try:
+        _get_db().insert("atividades", new_atividade)
+        return True
+    except Exception as e:
+        st.error(f"Erro ao adicionar atividade: {e}")
+        return False
+
+ESCALA_COLUMNS = ['Tipo', 'Data', 'Horário', 'Vagas', 'Participantes', 'Observações']
+
+def _format_escala(atividades_escala, df_escolhas, sort_chronologically=True):
+    """Monta a tabela da escala (atividades com os nomes dos participantes)."""
+    if atividades_escala.empty:
+        return pd.DataFrame(columns=ESCALA_COLUMNS)
+
+    # Agrupa os participantes por atividade
+    escolhas_agrupadas = df_escolhas.groupby('id_atividade')['nome_participante'].apply(lambda x: ', '.join(x)).reset_index()
+
+    # Junta atividades com escolhas
+    df_final = pd.merge(
+        atividades_escala,
+        escolhas_agrupadas,
+        on="id_atividade",
+        how="left"
+    )
+
+    df_final['Participantes'] = df_final['nome_participante'].fillna('')
+
+    # Formata a data para dd/mm/YYYY a partir do início da atividade
+    inicio = start_times(df_final)
+    df_final['data'] = inicio.dt.strftime('%d/%m/%Y').where(inicio.notna(), df_final['data'])
+
+    # Ordena cronologicamente se solicitado
+    if sort_chronologically:
+        df_final = df_final.assign(_inicio=inicio).sort_values('_inicio', kind='stable')
+
+    # Inclui observações se existir, senão cria coluna vazia
+    if 'observacoes' in df_final.columns:
+        df_final = df_final[['tipo', 'data', 'horario', 'vagas', 'Participantes', 'observacoes']]
+        df_final.columns = ESCALA_COLUMNS
+    else:
+        df_final = df_final[['tipo', 'data', 'horario', 'vagas', 'Participantes']]
+        df_final.columns = ESCALA_COLUMNS[:-1]
+        df_final['Observações'] = ''
+
+    return df_final
+
+def get_escala_completa(escala_nome, sort_chronologically=True):
+    """Busca a escala com os nomes dos participantes."""
+    try:
+        return _format_escala(
+            _get_db().read_escala("atividades", escala_nome),
+            _get_db().read_escala("escolhas", escala_nome),
+            sort_chronologically
+        )
+    except Exception as e:
+        st.error(f"Erro ao buscar escala: {e}")
+        return pd.DataFrame(columns=ESCALA_COLUMNS)
+
+
+def get_current_round(escala_nome):
+    """Busca a rodada atual da escala.
+
+    É a primeira rodada com participantes pendentes (as rodadas podem ser
+    geradas antecipadamente); se todas terminaram, a de maior número.
+    """
+    try:
+        rounds_escala = _get_db().read_escala("rodadas", escala_nome)
+        if rounds_escala.empty:
+            return None
+        pendentes = rounds_escala[rounds_escala['ja_escolheu'] == False]
+        if not pendentes.empty:
+            return pendentes.loc[pendentes['numero_rodada'].idxmin()]
+        # Retorna a rodada com maior número (última rodada)
+        return rounds_escala.loc[rounds_escala['numero_rodada'].idxmax()]
+    except:
+        return None
+
+def next_round_order(participants, previous_order, numero_rodada, modo_ordem):
+    """Gera a ordem de escolha de uma rodada a partir da ordem da rodada anterior."""
+    participantes = set(participants)
+    anterior = [email for email in previous_order if email in participantes]
+    # Participantes que não estavam na rodada anterior entram sorteados no final
+    novos = [email for email in participants if email not in set(anterior)]
+    random.shuffle(novos)
+
+    if modo_ordem == ORDER_SNAKE and anterior:
+        return anterior[::-1] + novos
+    if modo_ordem == ORDER_REVERSE and anterior and numero_rodada % 2 == 0:
+        return anterior[::-1] + novos
+
+    order = list(participants)
+    random.shuffle(order)
+    return order
+
+def create_new_round(escala_nome, total_rodadas=None):
+    """Cria as próximas rodadas da escala, com a ordem de todas já definida.
+
+    Por padrão cria o número de rodadas configurado nas regras da escala. As
+    rodadas seguintes começam sozinhas assim que a anterior termina.
+    """
+    try:
+        # Busca todos os usuários (exceto admin)
+        df_users = _get_db().read("usuarios")
+        participants = df_users[df_users['email'].map(normalize_email) != _admin_email]['email'].tolist()
+
+        if not participants:
+            return False, "Nenhum participante cadastrado."
+
+        rules = get_rules(escala_nome)
+        if total_rodadas is None:
+            total_rodadas = rules['total_rodadas']
+
+        # A ordem continua a partir da última rodada existente
+        df_rounds = _get_db().read_escala("rodadas", escala_nome)
+        if df_rounds.empty:
+            last_round_number, previous_order = 0, []
+        else:
+            last_round_number = int(df_rounds['numero_rodada'].max())
+            previous_order = df_rounds[df_rounds['numero_rodada'] == last_round_number].sort_values('posicao')['email_participante'].tolist()
+
+        # Cria registros para as novas rodadas
+        round_data = []
+        for new_round_number in range(last_round_number + 1, last_round_number + total_rodadas + 1):
+            order = next_round_order(participants, previous_order, new_round_number, rules['modo_ordem'])
+            for position, email in enumerate(order, start=1):
+                round_data.append({
+                    "escala_nome": escala_nome,
+                    "numero_rodada": new_round_number,
+                    "posicao": position,
+                    "email_participante": email,
+                    "ja_escolheu": False,
+                    "pulado": False
+                })
+            previous_order = order
+
+        new_round_df = pd.DataFrame(round_data)
+
+        # Salva todas as rodadas em uma única escrita
+        _get_db().insert("rodadas", new_round_df)
+        _publish_turn(escala_nome, last_round_number + 1)
+
+        if total_rodadas == 1:
+            return True, f"Rodada {last_round_number + 1} criada com {len(participants)} participantes!"
+        return True, f"Rodadas {last_round_number + 1} a {last_round_number + total_rodadas} criadas com {len(participants)} participantes!"
+    except Exception as e:
+        return False, f"Erro ao criar rodada: {e}"
+
+def get_round_order(escala_nome):
+    """Retorna a ordem de escolha da rodada atual."""
+    try:
+        df_rounds = _get_db().read_escala("rodadas", escala_nome)
+        current_round = get_current_round(escala_nome)
+
+        if current_round is None:
+            return pd.DataFrame(columns=['Posição', 'Participante', 'Email', 'Status'])
+
+        round_number = current_round['numero_rodada']
+        round_data = df_rounds[df_rounds['numero_rodada'] == round_number].sort_values('posicao')
+
+        # Busca os nomes dos participantes
+        df_users = _get_db().read("usuarios")
+        round_data = round_data.merge(
+            df_users[['email', 'nome']],
+            left_on='email_participante',
+            right_on='email',
+            how='left'
+        )
+
+        pulado = round_data['pulado'] == True if 'pulado' in round_data.columns else False
+        round_data['Status'] = round_data['ja_escolheu'].apply(lambda x: '✅ Escolheu' if x else '⏳ Aguardando')
+        round_data.loc[pulado, 'Status'] = '⏭️ Pulou (prazo esgotado)'
+
+        result = round_data[['posicao', 'nome', 'email_participante', 'Status']]
+        result.columns = ['Posição', 'Participante', 'Email', 'Status']
+
+        return result
+    except Exception as e:
+        st.error(f"Erro ao buscar ordem da rodada: {e}")
+        return pd.DataFrame(columns=['Posição', 'Participante', 'Email', 'Status'])
+
+def _publish_turn(escala_nome, numero_rodada):
+    """Avisa as telas de espera de que a vez mudou na escala."""
+    if _events is not None:
+        _events.publish(turn_channel(escala_nome), {"escala_nome": escala_nome, "numero_rodada": numero_rodada})
+
+def turn_sequence(escala_nome):
+    """Número de mudanças de vez já publicadas para a escala (0 sem canal de eventos)."""
+    if _events is None:
+        return 0
+    return _events.sequence(turn_channel(escala_nome))
+
+def get_current_turn(escala_nome):
+    """Retorna o email do participante cuja vez é de escolher."""
+    try:
+        df_rounds = _get_db().read_escala("rodadas", escala_nome)
+        current_round = get_current_round(escala_nome)
+
+        if current_round is None:
+            return None
+
+        round_number = current_round['numero_rodada']
+        round_data = df_rounds[
+            (df_rounds['numero_rodada'] == round_number) &
+            (df_rounds['ja_escolheu'] == False)
+        ].sort_values('posicao')
+
+        if round_data.empty:
+            return None  # Todos já escolheram
+
+        return round_data.iloc[0]['email_participante']
+    except:
+        return None
+
+# --- Regras da Escala ---
+
+# O que acontece quando o prazo da vez termina
+DEADLINE_SKIP = "pular"
+DEADLINE_DEFAULT_PICK = "escolha_padrao"
+
+# Como a ordem de cada rodada é gerada
+ORDER_RANDOM = "aleatoria"   # novo sorteio a cada rodada
+ORDER_SNAKE = "serpentina"   # um sorteio; as rodadas alternam ida e volta
+ORDER_REVERSE = "inversa"    # rodadas em pares: a segunda de cada par é a inversa da primeira
+
+# Como os participantes escolhem
+CHOICE_DRAFT = "rodadas"   # um de cada vez, na ordem das rodadas
+CHOICE_BALLOT = "cedula"   # todos enviam cédulas de preferência e as vagas são distribuídas de uma vez
+
+DEFAULT_RULES = {
+    "prazo_minutos": 0, "acao_prazo": DEADLINE_SKIP, "total_rodadas": 1,
+    "modo_ordem": ORDER_RANDOM, "modo_escolha": CHOICE_DRAFT
+}
+
+def get_rules(escala_nome):
+    """Retorna as regras da escala, com os valores padrão para o que não foi configurado."""
+    rules = dict(DEFAULT_RULES)
+    df_regras = _get_db().read_escala("regras", escala_nome)
+    if df_regras.empty:
+        return rules
+    regra = df_regras.iloc[-1]
+    for column in ("prazo_minutos", "total_rodadas"):
+        value = pd.to_numeric(regra.get(column), errors='coerce')
+        if pd.notna(value):
+            rules[column] = int(value)
+    if regra.get('acao_prazo') in (DEADLINE_SKIP, DEADLINE_DEFAULT_PICK):
+        rules['acao_prazo'] = regra['acao_prazo']
+    if regra.get('modo_ordem') in (ORDER_RANDOM, ORDER_SNAKE, ORDER_REVERSE):
+        rules['modo_ordem'] = regra['modo_ordem']
+    if regra.get('modo_escolha') in (CHOICE_DRAFT, CHOICE_BALLOT):
+        rules['modo_escolha'] = regra['modo_escolha']
+    return rules
+
+def set_rules(escala_nome, **changes):
+    """Altera regras da escala (prazo_minutos, acao_prazo, total_rodadas, modo_ordem, modo_escolha)."""
+    rules = get_rules(escala_nome)
+    rules.update(changes)
+    if rules['prazo_minutos'] < 0:
+        return False, "O prazo não pode ser negativo."
+    if rules['acao_prazo'] not in (DEADLINE_SKIP, DEADLINE_DEFAULT_PICK):
+        return False, "Ação de prazo inválida."
+    if rules['total_rodadas'] < 1:
+        return False, "O número de rodadas deve ser pelo menos 1."
+    if rules['modo_ordem'] not in (ORDER_RANDOM, ORDER_SNAKE, ORDER_REVERSE):
+        return False, "Modo de ordem inválido."
+    if rules['modo_escolha'] not in (CHOICE_DRAFT, CHOICE_BALLOT):
+        return False, "Modo de escolha inválido."
+    try:
+        _get_db().delete_rows("regras", {"escala_nome": escala_nome})
+        _get_db().insert("regras", pd.DataFrame([{"escala_nome": escala_nome, **rules}]))
+        if 'prazo_minutos' in changes or 'modo_escolha' in changes:
+            # A vez atual passa a contar com o novo prazo
+            if _scheduler is not None:
+                _scheduler.clear(escala_nome)
+            schedule_turn_deadline(escala_nome)
+        return True, "Regras salvas com sucesso!"
+    except Exception as e:
+        return False, f"Erro ao salvar regras: {e}"
+
+# --- Prazos das Vezes ---
+
+def schedule_turn_deadline(escala_nome):
+    """Agenda o prazo da vez atual da escala (chamada a cada mudança de vez)."""
+    if _scheduler is None:
+        return
+    rules = get_rules(escala_nome)
+    # Com cédulas não há vez individual: as vagas são distribuídas de uma vez
+    has_deadline = rules['prazo_minutos'] > 0 and rules['modo_escolha'] == CHOICE_DRAFT
+    current_turn = get_current_turn(escala_nome) if has_deadline else None
+    if current_turn is None:
+        _scheduler.clear(escala_nome)
+        return
+
+    numero_rodada = int(get_current_round(escala_nome)['numero_rodada'])
+    active = _scheduler.deadline(escala_nome)
+    if active is not None and active[1:] == (numero_rodada, current_turn):
+        return  # Mesma vez: mantém o prazo já em andamento
+    _scheduler.set_deadline(escala_nome, numero_rodada, current_turn, _scheduler.clock() + rules['prazo_minutos'] * 60)
+
+def schedule_all_turn_deadlines():
+    """Agenda os prazos de todas as escalas com prazo configurado (ao iniciar o app)."""
+    df_regras = _get_db().read("regras")
+    if df_regras.empty:
+        return
+    com_prazo = df_regras[pd.to_numeric(df_regras['prazo_minutos'], errors='coerce') > 0]
+    for escala_nome in com_prazo['escala_nome'].unique():
+        schedule_turn_deadline(escala_nome)
+
+def get_turn_deadline(escala_nome):
+    """Retorna o horário em que a vez atual da escala expira (datetime), ou None."""
+    if _scheduler is None:
+        return None
+    active = _scheduler.deadline(escala_nome)
+    return datetime.fromtimestamp(active[0]) if active is not None else None
+
+def skip_turn(escala_nome, numero_rodada, email):
+    """Pula a vez do participante (prazo esgotado) e avança a rodada."""
+    skipped = _get_db().skip_turn(escala_nome, int(numero_rodada), email)
+    if skipped:
+        _publish_turn(escala_nome, int(numero_rodada))
+    return skipped
+
+def expire_turn(escala_nome, numero_rodada, email):
+    """Encerra uma vez cujo prazo terminou: faz a escolha padrão ou pula o participante."""
+    if get_rules(escala_nome)['acao_prazo'] == DEADLINE_DEFAULT_PICK:
+        # Escolha padrão: a primeira atividade disponível em ordem cronológica
+        df_available = get_available_activities(escala_nome)
+        if not df_available.empty:
+            user = get_user_data(email)
+            nome = user['nome'] if user is not None else email
+            success, _ = make_choice(escala_nome, email, nome, df_available.iloc[0]['id_atividade'])
+            if success:
+                return
+    skip_turn(escala_nome, numero_rodada, email)
+
+def get_available_activities(escala_nome):
+    """Retorna atividades disponíveis (com vagas) ordenadas cronologicamente."""
+    try:
+        # Lê só as atividades da escala
+        atividades_escala = _get_db().read_escala("atividades", escala_nome).copy()
+
+        if atividades_escala.empty:
+            return pd.DataFrame()
+
+        # Vagas ocupadas e disponíveis vêm do índice de ocupação (mantido a cada escolha)
+        occupancy = _get_db().occupancy(escala_nome)
+        # Atividade ausente do índice (ex: inserida direto na planilha): ainda sem escolhas, todas as vagas livres
+        vagas = pd.to_numeric(atividades_escala['vagas'], errors='coerce').fillna(0).astype(int)
+        ocupacao = [occupancy.get(id_atividade, (0, total)) for id_atividade, total in zip(atividades_escala['id_atividade'], vagas)]
+        atividades_escala['ocupadas'] = [ocupadas for ocupadas, _ in ocupacao]
+        atividades_escala['vagas_disponiveis'] = [restantes for _, restantes in ocupacao]
+
+        # Filtra apenas atividades com vagas disponíveis
+        atividades_disponiveis = atividades_escala[atividades_escala['vagas_disponiveis'] > 0].copy()
+
+        # Ordena cronologicamente
+        atividades_disponiveis = sort_by_start(atividades_disponiveis)
+
+        # Inclui observações se disponível
+        if 'observacoes' in atividades_disponiveis.columns:
+            return atividades_disponiveis[['id_atividade', 'tipo', 'data', 'horario', 'vagas_disponiveis', 'observacoes']]
+        else:
+            return atividades_disponiveis[['id_atividade', 'tipo', 'data', 'horario', 'vagas_disponiveis']]
+    except Exception as e:
+        st.error(f"Erro ao buscar atividades disponíveis: {e}")
+        return pd.DataFrame()
+
+def make_choice(escala_nome, email_participante, nome_participante, id_atividade):
+    """Registra a escolha de um participante.
+
+    A reserva confere a vez e as vagas, grava a escolha e avança a vez em um
+    único passo, então escolhas simultâneas não ultrapassam as vagas.
+    """
+    try:
+        current_round = get_current_round(escala_nome)
+        if current_round is None:
+            return False, "Nenhuma rodada ativa para esta escala."
+
+        result = _get_db().reserve_slot(
+            escala_nome,
+            int(current_round['numero_rodada']),
+            id_atividade,
+            email_participante,
+            nome_participante
+        )
+
+        if result == NO_SLOTS:
+            return False, "Esta atividade não tem mais vagas. Por favor, escolha outra."
+        if result == NOT_YOUR_TURN:
+            return False, "Não é a sua vez de escolher (ou sua escolha já foi registrada)."
+        if result == UNKNOWN_ACTIVITY:
+            return False, "Atividade não encontrada nesta escala."
+        _publish_turn(escala_nome, int(current_round['numero_rodada']))
+        return True, "Escolha registrada com sucesso!"
+    except Exception as e:
+        return False, f"Erro ao registrar escolha: {e}"
+
+def get_user_choices(escala_nome, email):
+    """Retorna as atividades escolhidas por um participante em uma escala."""
+    df_escolhas = _get_db().read_escala("escolhas", escala_nome)
+    df_atividades = _get_db().read_escala("atividades", escala_nome)
+
+    minhas_escolhas = df_escolhas[df_escolhas['email_participante'] == email]
+    if minhas_escolhas.empty:
+        return pd.DataFrame()
+
+    # Junta com informações das atividades
+    return minhas_escolhas.merge(
+        df_atividades.drop(columns=['escala_nome']),
+        on='id_atividade',
+        how='left'
+    )
+
+# Colunas da escala pessoal (Minha Escala e PDFs individuais)
+PERSONAL_COLUMNS = {'tipo': 'Tipo', 'data': 'Data', 'horario': 'Horário', 'observacoes': 'Observações'}
+
+def format_personal_schedule(minhas_atividades):
+    """Prepara as atividades de um participante para exibição/exportação."""
+    columns = [c for c in PERSONAL_COLUMNS if c in minhas_atividades.columns]
+    return minhas_atividades[columns].rename(columns=PERSONAL_COLUMNS)
+
+def get_participant_schedules(escala_nome):
+    """Escalas pessoais de todos os participantes, em ordem cronológica.
+
+    Faz de uma vez para a escala inteira a mesma junção de get_user_choices.
+    Retorna um DataFrame com email_participante, nome_participante e as
+    colunas de format_personal_schedule.
+    """
+    return _participant_schedules(
+        _get_db().read_escala("atividades", escala_nome),
+        _get_db().read_escala("escolhas", escala_nome)
+    )
+
+def _participant_schedules(df_atividades, df_escolhas):
+    if df_escolhas.empty:
+        return pd.DataFrame(columns=['email_participante', 'nome_participante'] + list(PERSONAL_COLUMNS.values()))
+
+    escolhas = df_escolhas[['id_atividade', 'email_participante', 'nome_participante']].merge(
+        df_atividades.drop(columns=['escala_nome']),
+        on='id_atividade',
+        how='inner'
+    )
+    escolhas = sort_by_start(escolhas)
+    df_schedules = pd.concat([escolhas[['email_participante', 'nome_participante']], format_personal_schedule(escolhas)], axis=1)
+    return df_schedules.sort_values('nome_participante', kind='stable', ignore_index=True)
+
+
+# --- Arquivo Histórico ---
+def archive_escala(escala_nome):
+    """Move uma escala encerrada das planilhas ao vivo para o arquivo histórico."""
+    if _archive is None:
+        return False, "Arquivo histórico não configurado."
+    try:
+        # Não sobrescreve uma escala já arquivada com o mesmo nome
+        if _archive.contains(escala_nome):
+            return False, f"Já existe uma escala '{escala_nome}' no arquivo histórico."
+        frames = {ws: _get_db().read_escala(ws, escala_nome) for ws in ARCHIVED_WORKSHEETS}
+        if frames["atividades"].empty:
+            return False, "Escala não encontrada."
+        if get_current_turn(escala_nome) is not None:
+            return False, "A escala ainda tem uma rodada em andamento."
+
+        # Grava o arquivo antes de remover as linhas, para não perder dados se algo falhar
+        _archive.save(escala_nome, frames)
+        for worksheet in ARCHIVED_WORKSHEETS:
+            _get_db().delete_rows(worksheet, {"escala_nome": escala_nome})
+
+        return True, f"Escala '{escala_nome}' arquivada ({len(frames['atividades'])} atividade(s), {len(frames['escolhas'])} escolha(s))."
+    except Exception as e:
+        return False, f"Erro ao arquivar escala: {e}"
+
+def get_archived_escalas():
+    """Lista as escalas do arquivo histórico."""
+    if _archive is None:
+        return []
+    return _archive.list_escalas()
+
+def get_escala_arquivada(escala_nome, sort_chronologically=True):
+    """Busca uma escala do arquivo histórico no mesmo formato de get_escala_completa."""
+    if _archive is None:
+        return pd.DataFrame(columns=ESCALA_COLUMNS)
+    return _format_escala(
+        _archive.read("atividades", escala_nome),
+        _archive.read("escolhas", escala_nome, columns=['id_atividade', 'nome_participante']),
+        sort_chronologically
+    )
+
+
+# --- Exportação de Várias Escalas ---
+
+# Uma aba por escala ou uma aba por participante
+WORKBOOK_BY_ESCALA = "escala"
+WORKBOOK_BY_PARTICIPANT = "participante"
+# Participantes montados por vez na exportação por participante
+WORKBOOK_PARTICIPANT_BATCH = 50
+
+def get_escalas():
+    """Nomes das escalas em andamento (com atividades nas planilhas ao vivo)."""
+    df_atividades = _get_db().read("atividades")
+    if df_atividades.empty:
+        return []
+    return sorted(df_atividades['escala_nome'].dropna().unique().tolist())
+
+def _escala_frames(escala_nome):
+    """Atividades e escolhas da escala, das planilhas ao vivo ou do arquivo histórico."""
+    df_atividades = _get_db().read_escala("atividades", escala_nome)
+    if df_atividades.empty and _archive is not None and _archive.contains(escala_nome):
+        return _archive.read("atividades", escala_nome), _archive.read("escolhas", escala_nome)
+    return df_atividades, _get_db().read_escala("escolhas", escala_nome)
+
+def iter_workbook_sheets(escalas, por=WORKBOOK_BY_ESCALA):
+    """Abas da exportação de várias escalas, geradas uma por vez: (nome da aba, tabela, resumo).
+
+    Por escala, cada aba é a escala completa; só uma escala é lida por vez.
+    Por participante, cada aba tem as atividades do participante em todas as
+    escalas (coluna Escala), na ordem das escalas pedidas e em ordem
+    cronológica dentro de cada uma. As escalas são lidas uma por vez, para
+    um lote de WORKBOOK_PARTICIPANT_BATCH participantes de cada vez, então a
+    memória não cresce com o histórico inteiro.
+    """
+    if por == WORKBOOK_BY_ESCALA:
+        for escala_nome in escalas:
+            df_atividades, df_escolhas = _escala_frames(escala_nome)
+            yield escala_nome, _format_escala(df_atividades, df_escolhas), {
+                "Escala": escala_nome,
+                "Atividades": len(df_atividades),
+                "Vagas": int(pd.to_numeric(df_atividades['vagas'], errors='coerce').sum()) if not df_atividades.empty else 0,
+                "Escolhas": len(df_escolhas),
+                "Participantes": df_escolhas['email_participante'].nunique() if not df_escolhas.empty else 0,
+            }
+        return
+
+    # 1ª passada: só os participantes (email -> nome) e as escalas de cada um
+    participants = {}
+    for escala_nome in escalas:
+        df_atividades, df_escolhas = _escala_frames(escala_nome)
+        if df_escolhas.empty:
+            continue
+        df_escolhas = df_escolhas[df_escolhas['id_atividade'].isin(df_atividades['id_atividade'])]
+        df_escolhas = df_escolhas.sort_values('nome_participante', kind='stable')
+        for email, nome in df_escolhas[['email_participante', 'nome_participante']].itertuples(index=False):
+            participants.setdefault(email, (nome, []))
+            if escala_nome not in participants[email][1]:
+                participants[email][1].append(escala_nome)
+    ordem = sorted(participants, key=lambda email: participants[email][0])
+
+    # 2ª passada: um lote de participantes por vez, lendo uma escala por vez;
+    # só as linhas do lote ficam em memória
+    for inicio in range(0, len(ordem), WORKBOOK_PARTICIPANT_BATCH):
+        lote = ordem[inicio:inicio + WORKBOOK_PARTICIPANT_BATCH]
+        rows = {email: [] for email in lote}
+        for escala_nome in escalas:
+            if not any(escala_nome in participants[email][1] for email in lote):
+                continue
+            df = _participant_schedules(*_escala_frames(escala_nome))
+            df = df[df['email_participante'].isin(rows)]
+            for email, df_email in df.groupby('email_participante', sort=False):
+                rows[email].append(df_email.assign(Escala=escala_nome))
+        for email in lote:
+            df = pd.concat(rows.pop(email), ignore_index=True)
+            columns = ['Escala'] + [c for c in PERSONAL_COLUMNS.values() if c in df.columns]
+            nome = participants[email][0]
+            yield nome, df[columns], {"Participante": nome, "Email": email, "Escalas": df['Escala'].nunique()}
+
+
+# --- Cédulas de Preferência ---
+
+# Métodos de distribuição das vagas a partir das cédulas
+BALLOT_SERIAL = "serial"   # segue a ordem das rodadas
+BALLOT_OPTIMAL = "otimo"   # minimiza a soma das posições nas cédulas
+
+def save_preferences(escala_nome, email, ids_atividades):
+    """Grava a cédula do participante (ids das atividades, da preferida para a menos preferida)."""
+    try:
+        ids_escala = set(_get_db().read_escala("atividades", escala_nome)['id_atividade'])
+        ids_atividades = [i for i in dict.fromkeys(ids_atividades) if i in ids_escala]
+
+        _get_db().delete_rows("preferencias", {"escala_nome": escala_nome, "email_participante": email})
+        if ids_atividades:
+            _get_db().insert("preferencias", pd.DataFrame({
+                "escala_nome": escala_nome,
+                "email_participante": email,
+                "id_atividade": ids_atividades,
+                "posicao": range(1, len(ids_atividades) + 1)
+            }))
+        return True, f"Preferências salvas! ({len(ids_atividades)} atividade(s) na sua cédula)"
+    except Exception as e:
+        return False, f"Erro ao salvar preferências: {e}"
+
+def _ballots(escala_nome):
+    """Cédulas da escala: email -> ids das atividades em ordem de preferência."""
+    df_preferencias = _get_db().read_escala("preferencias", escala_nome)
+    if df_preferencias.empty:
+        return {}
+    df_preferencias = df_preferencias.sort_values(['email_participante', 'posicao'], kind='stable')
+    return df_preferencias.groupby('email_participante', sort=False)['id_atividade'].apply(list).to_dict()
+
+def get_user_preferences(escala_nome, email):
+    """Retorna a cédula do participante (ids das atividades em ordem de preferência)."""
+    return _ballots(escala_nome).get(email, [])
+
+def count_ballots(escala_nome):
+    """Número de participantes que já enviaram cédula para a escala."""
+    return len(_ballots(escala_nome))
+
+def run_ballot(escala_nome, method=BALLOT_SERIAL):
+    """Distribui de uma vez todas as vezes pendentes da escala a partir das cédulas.
+
+    Cada vez pendente nas rodadas vale uma atividade. Vezes que a cédula não
+    consegue preencher recebem a primeira atividade disponível em ordem
+    cronológica. As escolhas são gravadas em uma única inserção. A leitura das
+    vezes e das vagas e as gravações rodam sob o lock de reserva da escala,
+    então duas distribuições (ou uma escolha) simultâneas não ocupam as mesmas vagas.
+    """
+    def distribute():
+        df_rounds = _get_db().read_escala("rodadas", escala_nome)
+        pendentes = df_rounds[df_rounds['ja_escolheu'] == False].sort_values(['numero_rodada', 'posicao'])
+        if pendentes.empty:
+            return None
+
+        order = pendentes['email_participante'].tolist()
+        ballots = _ballots(escala_nome)
+        capacity = {id_atividade: restantes for id_atividade, (_, restantes) in _get_db().occupancy(escala_nome).items()}
+        df_escolhas = _get_db().read_escala("escolhas", escala_nome)
+        taken = df_escolhas.groupby('email_participante')['id_atividade'].apply(set).to_dict() if not df_escolhas.empty else {}
+
+        if method == BALLOT_OPTIMAL:
+            assignment = min_cost_assignment(Counter(order), ballots, capacity, taken)
+        else:
+            assignment = serial_dictatorship(order, ballots, capacity, taken)
+
+        # Vezes sem atividade da cédula: primeira atividade disponível em ordem cronológica
+        received = Counter(email for email, _ in assignment)
+        unfilled = []
+        for email in order:
+            if received[email] > 0:
+                received[email] -= 1
+            else:
+                unfilled.append(email)
+        if unfilled:
+            remaining = dict(capacity)
+            for _, id_atividade in assignment:
+                remaining[id_atividade] -= 1
+            for email, id_atividade in assignment:
+                taken.setdefault(email, set()).add(id_atividade)
+            chronological = sort_by_start(_get_db().read_escala("atividades", escala_nome))['id_atividade'].tolist()
+            assignment += serial_dictatorship(unfilled, {email: chronological for email in unfilled}, remaining, taken)
+
+        if assignment:
+            df_users = _get_db().read("usuarios")
+            nomes = dict(zip(df_users['email'], df_users['nome']))
+            _get_db().insert("escolhas", pd.DataFrame([{
+                "escala_nome": escala_nome,
+                "id_atividade": id_atividade,
+                "email_participante": email,
+                "nome_participante": nomes.get(email, email)
+            } for email, id_atividade in assignment]))
+
+        # Vezes que nem a cédula nem as vagas restantes preencheram ficam como puladas
+        filled = Counter(email for email, _ in assignment)
+        for _, row in pendentes.iterrows():
+            email = row['email_participante']
+            if filled[email] > 0:
+                filled[email] -= 1
+            else:
+                _get_db().update_rows(
+                    "rodadas",
+                    {"escala_nome": escala_nome, "numero_rodada": int(row['numero_rodada']), "email_participante": email},
+                    {"ja_escolheu": True, "pulado": True}
+                )
+        _get_db().update_rows("rodadas", {"escala_nome": escala_nome, "ja_escolheu": False}, {"ja_escolheu": True})
+        return order, assignment, int(pendentes['numero_rodada'].max())
+
+    try:
+        result = _get_db().run_locked(escala_nome, distribute)
+        if result is None:
+            return False, "Nenhuma vez pendente. Inicie as rodadas antes de distribuir as vagas."
+        order, assignment, numero_rodada = result
+        _publish_turn(escala_nome, numero_rodada)
+
+        sem_vaga = len(order) - len(assignment)
+        message = f"{len(assignment)} vaga(s) distribuída(s) para {len(set(order))} participante(s)."
+        if sem_vaga:
+            message += f" {sem_vaga} vez(es) ficaram sem atividade por falta de vagas."
+        return True, message
+    except Exception as e:
+        return False, f"Erro ao distribuir as vagas: {e}"
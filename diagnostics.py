@@ -0,0 +1,264 @@
+"""
+Estatísticas das chamadas ao armazenamento.
+
+InstrumentedStorage (storage.py) registra cada chamada aqui, em duas camadas:
+- "app": o que as funções de dados pedem ao cache compartilhado (acerto ou falta)
+- "backend": as chamadas que chegam de fato ao Google Sheets / SQLite
+
+Cada registro guarda a planilha, a operação, o tempo, as linhas, o tamanho
+em memória dos dados lidos ou gravados no backend (o DataFrame do pandas,
+não os bytes enviados pela rede, que costumam ser bem menos) e a função que
+fez a chamada, e é somado à execução do script (render) e à sessão em
+andamento. Os registros mais recentes ficam em memória para o
+menu Diagnóstico do administrador.
+"""
+import sys
+import threading
+import time
+from collections import deque
+
+import pandas as pd
+
+# Camadas instrumentadas
+LAYER_APP = "app"
+LAYER_BACKEND = "backend"
+
+# Resultado do cache nas leituras da camada app
+CACHE_HIT = "acerto"
+CACHE_MISS = "falta"
+
+# Módulos ignorados ao procurar a função que fez a chamada
+_INTERNAL_MODULES = {__name__, "storage", "threading"}
+
+
+def _caller():
+    """Função fora das camadas de armazenamento que originou a chamada (ex: database.get_current_turn)."""
+    frame = sys._getframe(2)
+    while frame is not None:
+        module = frame.f_globals.get("__name__", "")
+        if module not in _INTERNAL_MODULES:
+            # O script do Streamlit roda como __main__
+            return f"{'app' if module == '__main__' else module}.{frame.f_code.co_name}"
+        frame = frame.f_back
+    return "segundo plano"
+
+
+def frame_size(df):
+    """Bytes ocupados pelo DataFrame na memória do pandas (0 se não for um DataFrame)."""
+    if not isinstance(df, pd.DataFrame):
+        return 0
+    return int(df.memory_usage(index=False, deep=True).sum())
+
+
+def _new_totals():
+    return {"chamadas": 0, "chamadas_backend": 0, "tempo_backend": 0.0, "bytes_backend": 0, "acertos": 0, "faltas": 0}
+
+
+class StorageStats:
+    """Coletor das chamadas ao armazenamento, compartilhado pelas sessões do processo."""
+
+    def __init__(self, max_calls=5000, max_renders=500):
+        self._calls = deque(maxlen=max_calls)  # registros mais recentes
+        self._renders = deque(maxlen=max_renders)  # execuções encerradas
+        self._open = {}  # sessão -> execução em andamento
+        self._sessions = {}  # sessão -> totais
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    # --- Execuções do script ---
+
+    def _close(self, render, end):
+        render["duracao"] = end - render["inicio"]
+        self._renders.append(render)
+
+    def begin_render(self, session_id, tela):
+        """Inicia a contagem de uma execução do script da sessão.
+
+        Execuções interrompidas (st.rerun, st.stop) são encerradas aqui, no
+        instante da última chamada registrada.
+        """
+        now = time.perf_counter()
+        render = {"sessao": session_id, "tela": tela, "inicio": now, "ultima": now, **_new_totals()}
+        with self._lock:
+            previous = self._open.pop(session_id, None)
+            if previous is not None:
+                self._close(previous, previous["ultima"])
+            self._open[session_id] = render
+            self._sessions.setdefault(session_id, {**_new_totals(), "renders": 0})["renders"] += 1
+        self._local.render = render
+
+    def set_render_label(self, tela):
+        """Nomeia a execução atual (ex: o menu escolhido)."""
+        render = getattr(self._local, "render", None)
+        if render is not None:
+            render["tela"] = tela
+
+    def begin_fragment(self, session_id, tela):
+        """Inicia a contagem de um fragmento (st.fragment) da sessão.
+
+        Dentro de uma execução completa do script, o fragmento é contado à
+        parte e as suas chamadas também somam na execução que o contém, que
+        continua aberta. Numa execução só do fragmento, ele é uma execução
+        própria, sem encerrar a última execução completa da sessão.
+        """
+        now = time.perf_counter()
+        parent = getattr(self._local, "render", None)
+        with self._lock:
+            if parent is not None and self._open.get(parent["sessao"]) is not parent:
+                # Execução que já foi encerrada (ex: interrompida por st.rerun)
+                parent = None
+            totals = self._sessions.setdefault(session_id, {**_new_totals(), "renders": 0})
+            if parent is None:
+                totals["renders"] += 1
+        self._local.render = {"sessao": session_id, "tela": tela, "inicio": now, "ultima": now, "pai": parent, **_new_totals()}
+
+    def end_fragment(self):
+        """Encerra o fragmento atual e volta a contar na execução que o contém."""
+        render = getattr(self._local, "render", None)
+        if render is None or "pai" not in render:
+            return
+        self._local.render = render["pai"]
+        with self._lock:
+            self._close(render, time.perf_counter())
+
+    def end_render(self):
+        """Encerra a execução atual do script."""
+        render = getattr(self._local, "render", None)
+        self._local.render = None
+        if render is None:
+            return
+        with self._lock:
+            if self._open.get(render["sessao"]) is render:
+                del self._open[render["sessao"]]
+                self._close(render, time.perf_counter())
+
+    # --- Chamadas ---
+
+    def backend_calls(self):
+        """Chamadas ao backend feitas pela thread atual (para saber se uma leitura foi falta de cache)."""
+        return getattr(self._local, "backend_calls", 0)
+
+    def record(self, layer, operation, worksheet, seconds, rows=None, nbytes=0, cache=None):
+        """Registra uma chamada e a soma à execução e à sessão atuais."""
+        if layer == LAYER_BACKEND:
+            self._local.backend_calls = self.backend_calls() + 1
+        render = getattr(self._local, "render", None)
+        call = {
+            "camada": layer,
+            "operacao": operation,
+            "planilha": worksheet,
+            "tempo": seconds,
+            "linhas": rows,
+            "bytes": nbytes,
+            "cache": cache,
+            "funcao": _caller(),
+            "sessao": render["sessao"] if render is not None else None,
+            "tela": render["tela"] if render is not None else None,
+        }
+        with self._lock:
+            self._calls.append(call)
+            targets = []
+            if render is not None:
+                # O fragmento e as execuções que o contêm
+                now = time.perf_counter()
+                enclosing = render
+                while enclosing is not None:
+                    enclosing["ultima"] = now
+                    targets.append(enclosing)
+                    enclosing = enclosing.get("pai")
+                # A sessão pode ter saído dos totais num clear() durante a execução
+                targets.append(self._sessions.setdefault(render["sessao"], {**_new_totals(), "renders": 1}))
+            for totals in targets:
+                if layer == LAYER_BACKEND:
+                    totals["chamadas_backend"] += 1
+                    totals["tempo_backend"] += seconds
+                    totals["bytes_backend"] += nbytes
+                else:
+                    totals["chamadas"] += 1
+                    if cache == CACHE_HIT:
+                        totals["acertos"] += 1
+                    elif cache == CACHE_MISS:
+                        totals["faltas"] += 1
+
+    def clear(self):
+        """Descarta as estatísticas acumuladas."""
+        with self._lock:
+            self._calls.clear()
+            self._renders.clear()
+            self._sessions.clear()
+            for session_id, render in self._open.items():
+                self._sessions[session_id] = {**_new_totals(), "renders": 1}
+
+    # --- Relatórios ---
+
+    def calls(self):
+        """Registros mais recentes como DataFrame."""
+        with self._lock:
+            return pd.DataFrame(list(self._calls), columns=[
+                "camada", "operacao", "planilha", "tempo", "linhas", "bytes", "cache", "funcao", "sessao", "tela"
+            ])
+
+    def latency_by_worksheet(self, layer=LAYER_BACKEND):
+        """Latência p50/p95 (ms), chamadas, linhas e tamanho em memória por planilha e operação."""
+        df = self.calls()
+        df = df[df["camada"] == layer]
+        columns = ["Planilha", "Operação", "Chamadas", "p50 (ms)", "p95 (ms)", "Linhas", "KiB em Memória"]
+        if df.empty:
+            return pd.DataFrame(columns=columns)
+        grouped = df.groupby(["planilha", "operacao"])
+        result = pd.DataFrame({
+            "Chamadas": grouped.size(),
+            "p50 (ms)": grouped["tempo"].quantile(0.5) * 1000,
+            "p95 (ms)": grouped["tempo"].quantile(0.95) * 1000,
+            "Linhas": grouped["linhas"].sum(),
+            "KiB em Memória": grouped["bytes"].sum() / 1024,
+        }).reset_index().rename(columns={"planilha": "Planilha", "operacao": "Operação"})
+        return result.sort_values("p95 (ms)", ascending=False, ignore_index=True)[columns]
+
+    def calls_by_caller(self):
+        """Chamadas por tela e função: leituras do cache (acertos/faltas) e chamadas ao backend."""
+        df = self.calls()
+        columns = ["Tela", "Função", "Chamadas", "Acertos", "Faltas", "Chamadas ao Backend", "KiB em Memória"]
+        if df.empty:
+            return pd.DataFrame(columns=columns)
+        df["tela"] = df["tela"].fillna("(segundo plano)")
+        app = df[df["camada"] == LAYER_APP]
+        backend = df[df["camada"] == LAYER_BACKEND]
+        keys = ["tela", "funcao"]
+        result = pd.DataFrame({
+            "Chamadas": app.groupby(keys).size(),
+            "Acertos": app[app["cache"] == CACHE_HIT].groupby(keys).size(),
+            "Faltas": app[app["cache"] == CACHE_MISS].groupby(keys).size(),
+            "Chamadas ao Backend": backend.groupby(keys).size(),
+            "KiB em Memória": backend.groupby(keys)["bytes"].sum() / 1024,
+        }).fillna(0).reset_index().rename(columns={"tela": "Tela", "funcao": "Função"})
+        for column in ["Chamadas", "Acertos", "Faltas", "Chamadas ao Backend"]:
+            result[column] = result[column].astype(int)
+        return result.sort_values(["Chamadas ao Backend", "Faltas"], ascending=False, ignore_index=True)[columns]
+
+    @staticmethod
+    def _totals_frame(rows, first_columns):
+        df = pd.DataFrame(rows)
+        columns = first_columns + ["Chamadas", "Acertos", "Faltas", "Chamadas ao Backend", "Tempo no Backend (ms)", "KiB em Memória"]
+        if df.empty:
+            return pd.DataFrame(columns=columns)
+        df["Tempo no Backend (ms)"] = df["tempo_backend"] * 1000
+        df["KiB em Memória"] = df["bytes_backend"] / 1024
+        return df.rename(columns={
+            "chamadas": "Chamadas", "acertos": "Acertos", "faltas": "Faltas", "chamadas_backend": "Chamadas ao Backend"
+        })[columns]
+
+    def slowest_renders(self, limit=10):
+        """Execuções do script encerradas mais lentas."""
+        with self._lock:
+            renders = sorted(self._renders, key=lambda r: r["duracao"], reverse=True)[:limit]
+        rows = [{**r, "Tela": r["tela"], "Sessão": str(r["sessao"])[:8], "Duração (ms)": r["duracao"] * 1000} for r in renders]
+        return self._totals_frame(rows, ["Tela", "Sessão", "Duração (ms)"])
+
+    def sessions(self):
+        """Totais por sessão."""
+        with self._lock:
+            rows = [{**totals, "Sessão": str(session_id)[:8], "Execuções": totals["renders"]}
+                    for session_id, totals in self._sessions.items()]
+        df = self._totals_frame(rows, ["Sessão", "Execuções"])
+        return df.sort_values("Chamadas ao Backend", ascending=False, ignore_index=True) if not df.empty else df
@@ -0,0 +1,74 @@
+"""
+Canal de eventos em processo (pub/sub) da plataforma de escalas.
+
+As funções de dados publicam aqui as mudanças de vez (nova rodada, escolha
+registrada); as telas de espera consultam o número de sequência do canal e
+só voltam a ler as planilhas quando ele muda. Cada canal guarda só o
+último evento e um contador, então consultar o canal não custa leituras.
+"""
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def turn_channel(escala_nome):
+    """Canal com as mudanças de vez de uma escala."""
+    return f"vez:{escala_nome}"
+
+
+class EventBus:
+    """Pub/sub em memória, compartilhado pelas sessões do mesmo processo."""
+
+    def __init__(self):
+        self._sequences = {}  # canal -> número de eventos publicados
+        self._last = {}  # canal -> último evento
+        self._subscribers = {}  # canal -> lista de callbacks
+        self._condition = threading.Condition()
+
+    def publish(self, channel, event):
+        """Publica um evento e avisa os inscritos. Retorna o novo número de sequência."""
+        with self._condition:
+            sequence = self._sequences.get(channel, 0) + 1
+            self._sequences[channel] = sequence
+            self._last[channel] = event
+            callbacks = self._subscribers.get(channel, []) + self._subscribers.get(None, [])
+            self._condition.notify_all()
+
+        # Callbacks rodam fora do lock; um inscrito com erro não impede os demais
+        for callback in callbacks:
+            try:
+                callback(sequence, event)
+            except Exception:
+                logger.exception("Erro em inscrito do canal %s", channel)
+        return sequence
+
+    def subscribe(self, channel, callback):
+        """Chama callback(sequencia, evento) a cada publicação no canal (None = todos os canais).
+
+        Retorna a função que cancela a inscrição.
+        """
+        with self._condition:
+            self._subscribers.setdefault(channel, []).append(callback)
+
+        def unsubscribe():
+            with self._condition:
+                if callback in self._subscribers.get(channel, []):
+                    self._subscribers[channel].remove(callback)
+        return unsubscribe
+
+    def sequence(self, channel):
+        """Número de eventos já publicados no canal."""
+        with self._condition:
+            return self._sequences.get(channel, 0)
+
+    def last(self, channel):
+        """Último evento publicado no canal (None se não houver)."""
+        with self._condition:
+            return self._last.get(channel)
+
+    def wait(self, channel, after, timeout=None):
+        """Espera um evento com sequência maior que `after`. Retorna a sequência atual."""
+        with self._condition:
+            self._condition.wait_for(lambda: self._sequences.get(channel, 0) > after, timeout)
+            return self._sequences.get(channel, 0)
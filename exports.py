@@ -0,0 +1,441 @@
+"""
+Exportação das escalas em PDF e Excel.
+
+O Excel é gravado com o xlsxwriter em modo de memória constante: as linhas
+vão para arquivos temporários à medida que são escritas, e as abas são
+recebidas uma por vez (workbook_excel), então exportações grandes não
+precisam ficar inteiras na memória.
+
+Os arquivos são gerados só quando alguém baixa (ExportCache) e guardados
+pelo hash do conteúdo da tabela, então baixar de novo uma escala que não
+mudou não gera o arquivo outra vez.
+
+O PDF é montado como uma tabela: as larguras das colunas saem do texto
+medido (cada palavra é medida uma única vez), as células de uma linha são
+quebradas em várias linhas de texto e desenhadas com a mesma altura, e o
+cabeçalho da tabela se repete em todas as páginas.
+"""
+import hashlib
+import io
+import multiprocessing
+import os
+import re
+import threading
+import unicodedata
+import zipfile
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import xlsxwriter
+from fpdf import FPDF
+
+PDF_FONT = "helvetica"
+PDF_FONT_SIZE = 9
+PDF_LINE_HEIGHT = 4.5  # mm por linha de texto
+PDF_PADDING = 1.5  # mm entre o texto e a borda da célula
+PDF_MIN_COLUMN_WIDTH = 12  # mm
+
+# Pontuação tipográfica comum fora do latin-1 (as fontes padrão do PDF só têm latin-1)
+_PDF_CHARS = str.maketrans({"\u2013": "-", "\u2014": "-", "\u2018": "'", "\u2019": "'", "\u201c": '"', "\u201d": '"', "\u2026": "..."})
+
+
+def _text(value):
+    """Texto da célula (vazio para None/NaN; só caracteres das fontes padrão do PDF)."""
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return ""
+    return str(value).translate(_PDF_CHARS).encode("latin-1", "replace").decode("latin-1")
+
+
+class _TextMeasure:
+    """Mede e quebra textos com a fonte atual, medindo cada palavra uma única vez."""
+
+    def __init__(self, pdf):
+        self.pdf = pdf
+        self._widths = {}
+        self.space = pdf.get_string_width(" ")
+
+    def width(self, word):
+        width = self._widths.get(word)
+        if width is None:
+            width = self._widths[word] = self.pdf.get_string_width(word)
+        return width
+
+    def text_width(self, text):
+        words = text.split()
+        return sum(self.width(w) for w in words) + self.space * max(0, len(words) - 1)
+
+    def wrap(self, text, max_width):
+        """Quebra o texto em linhas de até max_width (palavras maiores são cortadas)."""
+        lines = []
+        for paragraph in text.split("\n"):
+            line, line_width = [], 0.0
+            for word in paragraph.split():
+                word_width = self.width(word)
+                if word_width > max_width:
+                    # Palavra maior que a coluna: corta por caractere
+                    if line:
+                        lines.append(" ".join(line))
+                        line, line_width = [], 0.0
+                    chunk = ""
+                    for char in word:
+                        if chunk and self.width(chunk + char) > max_width:
+                            lines.append(chunk)
+                            chunk = ""
+                        chunk += char
+                    line, line_width = [chunk], self.width(chunk)
+                    continue
+                needed = word_width if not line else line_width + self.space + word_width
+                if line and needed > max_width:
+                    lines.append(" ".join(line))
+                    line, line_width = [word], word_width
+                else:
+                    line.append(word)
+                    line_width = needed
+            lines.append(" ".join(line))
+        return lines
+
+
+def _column_widths(natural, available):
+    """Distribui a largura disponível entre as colunas.
+
+    Colunas cujo texto cabe na sua parte ficam com a largura natural; as
+    demais dividem o que sobra. Se tudo couber, a sobra é distribuída na
+    proporção das larguras naturais.
+    """
+    natural = [max(w, PDF_MIN_COLUMN_WIDTH) for w in natural]
+    total = sum(natural)
+    if total <= available:
+        return [w * available / total for w in natural]
+
+    widths = [None] * len(natural)
+    remaining = available
+    pending = list(range(len(natural)))
+    while pending:
+        share = remaining / len(pending)
+        fits = [i for i in pending if natural[i] <= share]
+        if not fits:
+            for i in pending:
+                widths[i] = share
+            break
+        for i in fits:
+            widths[i] = natural[i]
+            remaining -= natural[i]
+        pending = [i for i in pending if i not in fits]
+    return widths
+
+
+class TablePDF(FPDF):
+    """PDF de uma tabela, com título e cabeçalho repetidos em cada página."""
+
+    def __init__(self, columns, title=None, orientation="P"):
+        super().__init__(orientation=orientation, unit="mm", format="A4")
+        self.columns = [_text(c) for c in columns]
+        self.title_text = _text(title) if title else None
+        self.widths = None
+        self.set_margins(10, 10, 10)
+        self.set_auto_page_break(False, margin=10)
+        self.alias_nb_pages()
+
+    def _cell_lines(self, x, y, width, height, lines):
+        self.rect(x, y, width, height)
+        baseline = y + PDF_PADDING + PDF_LINE_HEIGHT * 0.75
+        for i, line in enumerate(lines):
+            if line:
+                self.text(x + PDF_PADDING, baseline + i * PDF_LINE_HEIGHT, line)
+
+    def header(self):
+        if self.title_text:
+            self.set_font(PDF_FONT, "B", PDF_FONT_SIZE + 3)
+            self.cell(0, 8, self.title_text, new_x="LMARGIN", new_y="NEXT")
+            self.ln(1)
+        self.set_font(PDF_FONT, "B", PDF_FONT_SIZE)
+        measure = _TextMeasure(self)
+        headers = [measure.wrap(c, w - 2 * PDF_PADDING) for c, w in zip(self.columns, self.widths)]
+        height = max((len(h) for h in headers), default=1) * PDF_LINE_HEIGHT + 2 * PDF_PADDING
+        self.set_fill_color(230, 230, 230)
+        x, y = self.l_margin, self.y
+        for lines, width in zip(headers, self.widths):
+            self.rect(x, y, width, height, style="F")
+            self._cell_lines(x, y, width, height, lines)
+            x += width
+        self.set_xy(self.l_margin, y + height)
+        self.set_font(PDF_FONT, "", PDF_FONT_SIZE)
+
+    def footer(self):
+        self.set_y(-10)
+        self.set_font(PDF_FONT, "", PDF_FONT_SIZE - 1)
+        self.cell(0, 5, f"Página {self.page_no()}/{{nb}}", align="R")
+        self.set_font(PDF_FONT, "", PDF_FONT_SIZE)
+
+    def add_row(self, cells):
+        """Desenha uma linha já quebrada (lista de linhas de texto por célula), com altura única.
+
+        Linhas mais altas que uma página continuam na página seguinte.
+        """
+        bottom = self.h - self.b_margin - 10  # espaço do rodapé
+        while True:
+            lines_fit = int((bottom - self.y - 2 * PDF_PADDING) // PDF_LINE_HEIGHT)
+            count = max((len(lines) for lines in cells), default=1)
+            if lines_fit < min(count, 1) or (lines_fit < count and self.y > self.first_row_y):
+                # Não cabe aqui: começa uma página nova (o cabeçalho é repetido)
+                self.add_page()
+                continue
+            part = [lines[:lines_fit] for lines in cells]
+            height = max(len(lines) for lines in part) * PDF_LINE_HEIGHT + 2 * PDF_PADDING
+            x, y = self.l_margin, self.y
+            for lines, width in zip(part, self.widths):
+                self._cell_lines(x, y, width, height, lines)
+                x += width
+            self.set_xy(self.l_margin, y + height)
+            cells = [lines[lines_fit:] for lines in cells]
+            if not any(cells):
+                return
+            self.add_page()
+
+    def add_page(self, *args, **kwargs):
+        super().add_page(*args, **kwargs)
+        # Primeira posição livre abaixo do cabeçalho da página
+        self.first_row_y = self.y
+
+
+def render_table_pdf(df, title=None):
+    """Monta o PDF da tabela e retorna o objeto TablePDF (use .output() para os bytes)."""
+    columns = list(df.columns)
+    probe = FPDF()
+    probe.set_font(PDF_FONT, "", PDF_FONT_SIZE)
+    measure = _TextMeasure(probe)
+
+    # Largura natural de cada coluna: o cabeçalho ou o maior texto, medido uma vez por coluna
+    texts = {c: [_text(v) for v in df[c]] for c in columns}
+    natural = []
+    for c in columns:
+        longest = max((measure.text_width(t) for t in set(texts[c])), default=0.0)
+        probe.set_font(PDF_FONT, "B", PDF_FONT_SIZE)
+        header = max((probe.get_string_width(w) for w in _text(c).split()), default=0.0)
+        probe.set_font(PDF_FONT, "", PDF_FONT_SIZE)
+        natural.append(max(longest, header) + 2 * PDF_PADDING)
+
+    portrait_width = 210 - 20
+    orientation = "P" if sum(natural) <= portrait_width else "L"
+    pdf = TablePDF(columns, title=title, orientation=orientation)
+    pdf.widths = _column_widths(natural, pdf.epw)
+    pdf.set_font(PDF_FONT, "", PDF_FONT_SIZE)
+    pdf.add_page()
+
+    measure = _TextMeasure(pdf)
+    wrap_widths = [w - 2 * PDF_PADDING for w in pdf.widths]
+    wrapped = [{} for _ in columns]  # textos repetidos (ex: datas, horários) são quebrados uma vez
+    for i in range(len(df)):
+        cells = []
+        for j, c in enumerate(columns):
+            text = texts[c][i]
+            lines = wrapped[j].get(text)
+            if lines is None:
+                lines = wrapped[j][text] = measure.wrap(text, wrap_widths[j])
+            cells.append(lines)
+        pdf.add_row(cells)
+    return pdf
+
+
+def dataframe_to_pdf(df, title=None):
+    """Exporta a tabela em PDF."""
+    # fpdf2 returns bytearray, convert to bytes for streamlit compatibility
+    return bytes(render_table_pdf(df, title).output())
+
+
+# Nome da aba de resumo das planilhas com várias abas
+EXCEL_SUMMARY_SHEET = "Resumo"
+
+# O Excel limita o nome das abas a 31 caracteres, sem os caracteres []:*?/\
+EXCEL_SHEET_NAME_LENGTH = 31
+
+# Linhas usadas para estimar a largura das colunas
+EXCEL_WIDTH_SAMPLE = 200
+EXCEL_MAX_COLUMN_WIDTH = 60
+
+
+def _sheet_name(name, used):
+    """Nome de aba válido e único (sem diferenciar maiúsculas, como o Excel)."""
+    name = re.sub(r"[\[\]:*?/\\]", "_", str(name)).strip("'").strip() or "Aba"
+    name = base = name[:EXCEL_SHEET_NAME_LENGTH]
+    counter = 2
+    while name.lower() in used:
+        suffix = f" ({counter})"
+        name = base[:EXCEL_SHEET_NAME_LENGTH - len(suffix)] + suffix
+        counter += 1
+    used.add(name.lower())
+    return name
+
+
+def _write_sheet(worksheet, df, header_format):
+    """Escreve a tabela na aba, linha a linha (exigência do modo de memória constante)."""
+    columns = [str(c) for c in df.columns]
+    sample = df.head(EXCEL_WIDTH_SAMPLE)
+    for j, column in enumerate(columns):
+        longest = max((len(str(v)) for v in sample.iloc[:, j]), default=0)
+        worksheet.set_column(j, j, min(max(len(column), longest) + 2, EXCEL_MAX_COLUMN_WIDTH))
+    worksheet.write_row(0, 0, columns, header_format)
+    worksheet.freeze_panes(1, 0)
+
+    # O método de escrita é escolhido uma vez por coluna (write() testaria o tipo de cada célula);
+    # NaN vira célula vazia e astype(object) troca os tipos do numpy pelos do Python
+    writers = []
+    for dtype in df.dtypes:
+        if pd.api.types.is_bool_dtype(dtype):
+            writers.append(worksheet.write_boolean)
+        elif pd.api.types.is_numeric_dtype(dtype):
+            writers.append(worksheet.write_number)
+        else:
+            writers.append(lambda i, j, value: worksheet.write_string(i, j, str(value)))
+    values = df.astype(object).where(df.notna(), None)
+    for i, row in enumerate(values.itertuples(index=False, name=None), start=1):
+        for j, value in enumerate(row):
+            if value is not None:
+                writers[j](i, j, value)
+    if columns:
+        worksheet.autofilter(0, 0, len(df), len(columns) - 1)
+
+
+def workbook_excel(sheets, summary=True):
+    """Planilha Excel com várias abas.
+
+    sheets: iterável de (nome da aba, DataFrame, resumo), consumido uma aba
+    por vez (pode ser um gerador); resumo é um dicionário com colunas extras
+    da aba de resumo, ou None.
+    summary: inclui a primeira aba, "Resumo", com uma linha por aba.
+    """
+    output = io.BytesIO()
+    workbook = xlsxwriter.Workbook(output, {"constant_memory": True})
+    header_format = workbook.add_format({"bold": True, "bg_color": "#E6E6E6", "border": 1})
+
+    used = set()
+    summary_sheet = workbook.add_worksheet(_sheet_name(EXCEL_SUMMARY_SHEET, used)) if summary else None
+    rows = []
+    for name, df, info in sheets:
+        sheet_name = _sheet_name(name, used)
+        _write_sheet(workbook.add_worksheet(sheet_name), df, header_format)
+        rows.append({"Aba": sheet_name, **(info or {}), "Linhas": len(df)})
+
+    if summary_sheet is not None:
+        df_summary = pd.DataFrame(rows) if rows else pd.DataFrame(columns=["Aba", "Linhas"])
+        _write_sheet(summary_sheet, df_summary, header_format)
+    workbook.close()
+    return output.getvalue()
+
+
+def dataframe_to_excel(df):
+    """Exporta a tabela em Excel."""
+    return workbook_excel([("Escala", df, None)], summary=False)
+
+
+# Abaixo deste número de PDFs, gerar no próprio processo sai mais barato que iniciar os processos
+PARALLEL_MIN_FILES = 16
+
+
+def _slug(text):
+    """Nome de arquivo seguro (sem acentos nem espaços)."""
+    text = unicodedata.normalize("NFKD", str(text)).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^A-Za-z0-9]+", "_", text).strip("_") or "participante"
+
+
+def _render_participant(job):
+    """Gera o PDF de um participante (roda nos processos do pool)."""
+    file_name, title, df = job
+    return file_name, dataframe_to_pdf(df, title)
+
+
+def participant_pdfs_zip(df_schedules, escala_nome, max_workers=None):
+    """Gera um PDF por participante e junta todos em um arquivo zip.
+
+    df_schedules: escalas pessoais (database.get_participant_schedules), com
+    email_participante, nome_participante e as colunas a exportar.
+
+    A geração dos PDFs usa só CPU, então é distribuída entre processos
+    (ProcessPoolExecutor, um por CPU se max_workers não for informado). Os
+    processos são iniciados com "spawn", seguro dentro do servidor do
+    Streamlit, que tem várias threads. Com poucos arquivos ou uma única CPU,
+    os PDFs são gerados no próprio processo.
+    """
+    columns = [c for c in df_schedules.columns if c not in ('email_participante', 'nome_participante')]
+    jobs = []
+    used = set()
+    for email, df in df_schedules.groupby('email_participante', sort=False):
+        nome = df['nome_participante'].iloc[0]
+        file_name = _slug(nome)
+        if file_name in used:
+            file_name = f"{file_name}_{_slug(email.split('@')[0])}"
+        used.add(file_name)
+        jobs.append((f"{file_name}.pdf", f"{escala_nome} - {nome}", df[columns].reset_index(drop=True)))
+
+    workers = min(max_workers or os.cpu_count() or 1, len(jobs))
+    if workers < 2 or len(jobs) < PARALLEL_MIN_FILES:
+        return _zip(map(_render_participant, jobs))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        return _zip(pool.map(_render_participant, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+
+def _zip(files):
+    """Arquivo zip com os (nome, bytes) informados (PDFs já são comprimidos)."""
+    output = io.BytesIO()
+    with zipfile.ZipFile(output, "w", compression=zipfile.ZIP_STORED) as archive:
+        for file_name, data in files:
+            archive.writestr(file_name, data)
+    return output.getvalue()
+
+
+def frame_digest(df):
+    """Hash do conteúdo da tabela (colunas e valores, na ordem)."""
+    digest = hashlib.sha1("\x1f".join(map(str, df.columns)).encode("utf-8"))
+    digest.update(pd.util.hash_pandas_object(df.astype(str), index=False).values.tobytes())
+    return digest.hexdigest()
+
+
+class ExportCache:
+    """Arquivos exportados, guardados pelo hash do conteúdo da tabela.
+
+    Mantém os `max_entries` arquivos usados mais recentemente. Pedidos
+    simultâneos do mesmo arquivo compartilham uma única geração.
+    """
+
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self.builds = 0  # arquivos gerados (para diagnóstico e testes)
+        self._files = OrderedDict()  # (formato, hash, título) -> bytes
+        self._lock = threading.Lock()
+        self._build_locks = {}
+
+    def _get(self, key, build):
+        with self._lock:
+            if key in self._files:
+                self._files.move_to_end(key)
+                return self._files[key]
+            build_lock = self._build_locks.setdefault(key, threading.Lock())
+        with build_lock:
+            with self._lock:
+                # Outra sessão pode ter gerado enquanto esperávamos o lock
+                if key in self._files:
+                    return self._files[key]
+            data = build()
+            with self._lock:
+                self.builds += 1
+                self._files[key] = data
+                while len(self._files) > self.max_entries:
+                    self._files.popitem(last=False)
+                self._build_locks.pop(key, None)
+            return data
+
+    def pdf(self, df, title=None):
+        """PDF da tabela (gerado só se a tabela mudou desde a última exportação)."""
+        return self._get(("pdf", frame_digest(df), title), lambda: dataframe_to_pdf(df, title))
+
+    def excel(self, df):
+        """Excel da tabela (gerado só se a tabela mudou desde a última exportação)."""
+        return self._get(("xlsx", frame_digest(df), None), lambda: dataframe_to_excel(df))
+
+    def participant_zip(self, df_schedules, escala_nome):
+        """Zip com um PDF por participante (gerado só se alguma escala pessoal mudou)."""
+        return self._get(
+            ("zip", frame_digest(df_schedules), escala_nome),
+            lambda: participant_pdfs_zip(df_schedules, escala_nome)
+        )
@@ -0,0 +1,115 @@
+"""
+Hash e verificação de senhas com bcrypt.
+
+O bcrypt é lento de propósito (cada verificação custa dezenas a centenas de
+milissegundos, conforme o custo) e libera o GIL durante o cálculo. Em vez de
+rodar na thread do script de cada sessão, o trabalho vai para um pool de
+threads limitado: na abertura da escala, quando dezenas de participantes
+entram ao mesmo tempo, os logins são atendidos em ordem, sem disputar a CPU
+entre si, e o número de cálculos simultâneos nunca passa do tamanho do pool.
+
+O custo (work factor) é configurável. Hashes gravados com outro custo
+continuam válidos e são refeitos com o custo atual no próximo login
+(verify_and_update).
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+# Custo padrão do bcrypt (2^12 iterações) e limites aceitos pela biblioteca
+DEFAULT_ROUNDS = 12
+MIN_ROUNDS = 4
+MAX_ROUNDS = 31
+
+
+def default_workers():
+    """Tamanho padrão do pool: um cálculo por CPU, no máximo 4."""
+    return max(1, min(4, os.cpu_count() or 1))
+
+
+def hash_rounds(hashed):
+    """Custo com que o hash foi gerado (ex: "$2b$12$..." -> 12), ou None se não for um hash bcrypt."""
+    try:
+        prefix, rounds = hashed.split("$")[1:3]
+    except (AttributeError, ValueError):
+        return None
+    if not prefix.startswith("2") or not rounds.isdigit():
+        return None
+    return int(rounds)
+
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _check(password, hashed):
+    try:
+        return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+    except ValueError:
+        # Hash inválido (ex: marcador de conta OAuth)
+        return False
+
+
+def _check_and_rehash(password, hashed, rounds):
+    if not _check(password, hashed):
+        return False, None
+    if hash_rounds(hashed) == rounds:
+        return True, None
+    return True, _hash(password, rounds)
+
+
+class PasswordHasher:
+    """Hash e verificação de senhas em um pool de threads limitado.
+
+    rounds: custo do bcrypt para os novos hashes
+    max_workers: cálculos simultâneos (0 calcula na própria thread, sem pool)
+    """
+
+    def __init__(self, rounds=DEFAULT_ROUNDS, max_workers=None):
+        if not MIN_ROUNDS <= rounds <= MAX_ROUNDS:
+            raise ValueError(f"Custo do bcrypt deve estar entre {MIN_ROUNDS} e {MAX_ROUNDS}: {rounds}")
+        self.rounds = rounds
+        self.max_workers = default_workers() if max_workers is None else max_workers
+        self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="bcrypt") if self.max_workers else None
+
+    def _run(self, function, *args):
+        if self._pool is None:
+            return function(*args)
+        return self._pool.submit(function, *args).result()
+
+    def hash(self, password):
+        """Hash da senha com o custo atual."""
+        return self._run(_hash, password, self.rounds)
+
+    def hash_many(self, passwords, rounds=None):
+        """Hashes de várias senhas, calculados em paralelo no pool (mesma ordem da entrada).
+
+        rounds: custo destes hashes (padrão: o custo atual); hashes com outro
+        custo são refeitos no primeiro login (verify_and_update)
+        """
+        rounds = self.rounds if rounds is None else rounds
+        if self._pool is None:
+            return [_hash(password, rounds) for password in passwords]
+        return list(self._pool.map(_hash, passwords, [rounds] * len(passwords)))
+
+    def verify(self, password, hashed):
+        """Verifica a senha com o hash (False se o hash for inválido)."""
+        return self._run(_check, password, hashed)
+
+    def needs_rehash(self, hashed):
+        """Indica se o hash foi gerado com um custo diferente do atual."""
+        return hash_rounds(hashed) != self.rounds
+
+    def verify_and_update(self, password, hashed):
+        """Verifica a senha e, se o hash usa outro custo, gera um novo hash.
+
+        Retorna (senha correta, novo hash ou None). As duas etapas rodam no
+        mesmo trabalho do pool, então o login espera a fila uma única vez.
+        """
+        return self._run(_check_and_rehash, password, hashed, self.rounds)
+
+    def shutdown(self):
+        """Encerra o pool (os trabalhos já enviados terminam)."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
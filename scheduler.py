@@ -0,0 +1,92 @@
+"""
+Prazos das vezes de escolha.
+
+Cada escala com prazo configurado tem no máximo um prazo ativo (o da vez
+atual). Os prazos ficam em uma fila de prioridade (heapq) ordenada pelo
+horário de expiração, então conferir os vencidos custa só olhar o topo da
+fila. Prazos substituídos não são removidos da fila: são descartados quando
+chegam ao topo.
+"""
+import heapq
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class TurnScheduler:
+    """Fila de prazos por escala, com uma thread que dispara os vencidos."""
+
+    def __init__(self, on_expire, clock=time.time):
+        # on_expire(escala_nome, numero_rodada, email) é chamado para cada prazo vencido
+        self.on_expire = on_expire
+        self.clock = clock
+        self._heap = []  # (prazo, ordem, escala_nome)
+        self._active = {}  # escala_nome -> (prazo, numero_rodada, email)
+        self._counter = 0
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._worker = None
+
+    def set_deadline(self, escala_nome, numero_rodada, email, deadline):
+        """Define o prazo da vez atual da escala (substitui o anterior)."""
+        with self._lock:
+            self._active[escala_nome] = (deadline, numero_rodada, email)
+            self._counter += 1
+            heapq.heappush(self._heap, (deadline, self._counter, escala_nome))
+        self._wakeup.set()
+
+    def clear(self, escala_nome):
+        """Remove o prazo da escala (sem vez pendente ou sem prazo configurado)."""
+        with self._lock:
+            self._active.pop(escala_nome, None)
+
+    def deadline(self, escala_nome):
+        """Prazo ativo da escala como (prazo, numero_rodada, email), ou None."""
+        with self._lock:
+            return self._active.get(escala_nome)
+
+    def pop_expired(self, now=None):
+        """Retira os prazos vencidos. Retorna [(escala_nome, numero_rodada, email)]."""
+        now = self.clock() if now is None else now
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                deadline, _, escala_nome = heapq.heappop(self._heap)
+                active = self._active.get(escala_nome)
+                # Entradas de prazos já substituídos ou removidos são descartadas aqui
+                if active is None or active[0] != deadline:
+                    continue
+                del self._active[escala_nome]
+                expired.append((escala_nome, active[1], active[2]))
+        return expired
+
+    def run_pending(self, now=None):
+        """Dispara on_expire para os prazos vencidos. Retorna quantos foram disparados."""
+        expired = self.pop_expired(now)
+        for escala_nome, numero_rodada, email in expired:
+            try:
+                self.on_expire(escala_nome, numero_rodada, email)
+            except Exception:
+                logger.exception("Erro ao encerrar a vez de %s em %s", email, escala_nome)
+        return len(expired)
+
+    def _seconds_to_next(self, max_wait):
+        with self._lock:
+            if not self._heap:
+                return max_wait
+            return min(max_wait, max(0.0, self._heap[0][0] - self.clock()))
+
+    def start(self, max_wait=30):
+        """Inicia a thread que dorme até o próximo prazo (ou até um novo prazo ser definido)."""
+        if self._worker is not None:
+            return
+        self._worker = threading.Thread(target=self._run, args=(max_wait,), name="prazos-vez", daemon=True)
+        self._worker.start()
+
+    def _run(self, max_wait):
+        while True:
+            self._wakeup.wait(self._seconds_to_next(max_wait))
+            self._wakeup.clear()
+            self.run_pending()
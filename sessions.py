@@ -0,0 +1,138 @@
+"""
+Tokens de sessão assinados.
+
+O estado de login fica em st.session_state, que se perde quando o navegador
+recarrega a página ou reconecta. Depois do login, o app guarda em um cookie
+do navegador um token com o email e o nome do usuário, o prazo de validade e
+um identificador, assinado com HMAC-SHA256. Ao recarregar, a sessão é restaurada
+conferindo só a assinatura e o prazo, sem ler a planilha de usuários nem
+calcular o bcrypt de novo.
+
+Tokens encerrados antes do prazo (logout) entram em uma lista de revogados,
+guardada em memória (e opcionalmente em um arquivo JSON) até o prazo de cada
+token vencer.
+
+Limitação: o Streamlit não grava cookies pela resposta HTTP, então o cookie é
+gravado por JavaScript (document.cookie) e não pode ser HttpOnly. Qualquer
+script que rode na página consegue ler o token e usá-lo até o prazo vencer.
+Por isso o token do administrador vale menos tempo (ADMIN_MAX_AGE).
+"""
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import os
+import secrets
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Validade padrão de um token (segundos)
+DEFAULT_MAX_AGE = 12 * 3600
+# Validade máxima do token do administrador (segundos)
+ADMIN_MAX_AGE = 2 * 3600
+
+
+def _encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _decode(text):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+
+class SessionTokens:
+    """Emite, confere e revoga tokens de sessão.
+
+    secret: chave do HMAC (texto ou bytes); sem chave, uma chave aleatória
+        é gerada e os tokens valem só enquanto o processo estiver no ar
+    max_age: validade dos tokens (segundos)
+    revocations_path: arquivo JSON que guarda os tokens revogados entre reinícios
+    """
+
+    def __init__(self, secret=None, max_age=DEFAULT_MAX_AGE, revocations_path=None, clock=time.time):
+        if not secret:
+            secret = secrets.token_bytes(32)
+        self._key = secret.encode("utf-8") if isinstance(secret, str) else secret
+        self.max_age = max_age
+        self.clock = clock
+        self.revocations_path = revocations_path
+        self._revoked = {}  # identificador do token -> prazo do token
+        self._lock = threading.Lock()
+        self._load_revocations()
+
+    def _sign(self, payload):
+        return _encode(hmac.new(self._key, payload.encode("ascii"), hashlib.sha256).digest())
+
+    def issue(self, email, nome, max_age=None):
+        """Novo token para o usuário, válido por max_age segundos (padrão: a validade do emissor)."""
+        max_age = self.max_age if max_age is None else max_age
+        claims = {"email": email, "nome": nome, "exp": int(self.clock() + max_age), "id": secrets.token_hex(8)}
+        payload = _encode(json.dumps(claims, separators=(",", ":")).encode("utf-8"))
+        return f"{payload}.{self._sign(payload)}"
+
+    def _claims(self, token):
+        """Conteúdo do token se a assinatura conferir, senão None (não olha prazo nem revogação)."""
+        try:
+            payload, signature = token.split(".")
+        except (AttributeError, ValueError):
+            return None
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            return None
+        try:
+            return json.loads(_decode(payload))
+        except ValueError:
+            return None
+
+    def verify(self, token):
+        """Retorna {"email", "nome", "exp", "id"} se o token for válido, senão None."""
+        claims = self._claims(token)
+        if claims is None or claims["exp"] <= self.clock():
+            return None
+        with self._lock:
+            if claims["id"] in self._revoked:
+                return None
+        return claims
+
+    def revoke(self, token):
+        """Revoga o token até o seu prazo (logout). Tokens inválidos são ignorados."""
+        claims = self._claims(token)
+        if claims is None:
+            return
+        now = self.clock()
+        with self._lock:
+            # Tokens vencidos já são recusados pelo prazo e saem da lista
+            self._revoked = {token_id: exp for token_id, exp in self._revoked.items() if exp > now}
+            if claims["exp"] > now:
+                self._revoked[claims["id"]] = claims["exp"]
+            self._save_revocations()
+
+    def revoked_count(self):
+        """Quantidade de tokens na lista de revogados."""
+        with self._lock:
+            return len(self._revoked)
+
+    def _load_revocations(self):
+        if not self.revocations_path or not os.path.exists(self.revocations_path):
+            return
+        try:
+            with open(self.revocations_path, encoding="utf-8") as f:
+                revoked = json.load(f)
+        except (OSError, ValueError):
+            logger.exception("Não foi possível ler a lista de sessões revogadas")
+            return
+        now = self.clock()
+        self._revoked = {token_id: exp for token_id, exp in revoked.items() if exp > now}
+
+    def _save_revocations(self):
+        if not self.revocations_path:
+            return
+        tmp_path = f"{self.revocations_path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._revoked, f)
+            os.replace(tmp_path, self.revocations_path)
+        except OSError:
+            logger.exception("Não foi possível gravar a lista de sessões revogadas")
@@ -0,0 +1,415 @@
+"""
+Simulador de escolhas e benchmark de ponta a ponta.
+
+Troca a conexão do Google Sheets por uma conexão falsa em memória, que conta
+as chamadas, mede os bytes trafegados e pode simular a latência da API, e
+conduz uma escala completa (N participantes, M atividades, R rodadas) pelas
+mesmas funções usadas pelo app: create_new_round, get_current_turn,
+get_available_activities e make_choice. As camadas de armazenamento são as
+mesmas do app (cache compartilhado + fila de escritas + Google Sheets).
+
+Também mede a vazão de logins na abertura da escala (--logins): todos os
+participantes entram ao mesmo tempo, cada um na sua thread, como as sessões
+do Streamlit, e as senhas são verificadas pelo pool de hash do app.
+
+Uso:
+    python simulator.py --participantes 30 --atividades 60 --rodadas 3 --latencia 0.05
+    python simulator.py --logins 80 --custo 12 --workers 4
+"""
+import argparse
+import io
+import math
+import random
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+import pandas as pd
+from gspread.exceptions import WorksheetNotFound
+
+import database
+from passwords import PasswordHasher, hash_rounds
+from storage import WORKSHEETS, CachedStorage, GSheetsStorage, WriteBehindStorage
+
+ADMIN_EMAIL = "admin@email.com"
+ESCALA_NOME = "Simulação"
+
+# Chamadas à API contadas como leitura (as demais são escritas)
+READ_CALLS = {"read", "row_values", "select_worksheet"}
+
+
+def _cell(value):
+    """Valor como o Sheets devolve (texto; vazio para None/NaN)."""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return ""
+    return str(value)
+
+
+def _payload_size(rows):
+    """Tamanho em bytes das linhas, codificadas como CSV."""
+    buffer = io.StringIO()
+    pd.DataFrame(rows).to_csv(buffer, index=False, header=False)
+    return len(buffer.getvalue().encode("utf-8"))
+
+
+class FakeWorksheet:
+    """Aba em memória com a parte da API do gspread usada por GSheetsStorage."""
+
+    def __init__(self, conn, name):
+        self.conn = conn
+        self.name = name
+
+    def row_values(self, row):
+        rows = self.conn.sheets[self.name]
+        values = rows[row - 1] if len(rows) >= row else []
+        self.conn._request("row_values", _payload_size([values]) if values else 0)
+        return list(values)
+
+    def update(self, range_name, values):
+        # GSheetsStorage só atualiza o cabeçalho (A1)
+        self.conn._request("update_range", _payload_size(values))
+        rows = self.conn.sheets[self.name]
+        if rows:
+            rows[0] = [_cell(v) for v in values[0]]
+        else:
+            rows.append([_cell(v) for v in values[0]])
+
+    def append_rows(self, values, **kwargs):
+        self.conn._request("append_rows", _payload_size(values))
+        self.conn.sheets[self.name].extend([_cell(v) for v in row] for row in values)
+
+
+class FakeGSheetsClient:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def _select_worksheet(self, worksheet=None, **kwargs):
+        self.conn._request("select_worksheet", 0)
+        if worksheet not in self.conn.sheets:
+            raise WorksheetNotFound(worksheet)
+        return FakeWorksheet(self.conn, worksheet)
+
+
+class FakeGSheetsConnection:
+    """Substituto em memória da GSheetsConnection.
+
+    Guarda cada aba como uma lista de linhas de texto (a primeira é o
+    cabeçalho), como o Sheets. Cada chamada é contada por tipo, soma os
+    bytes enviados/recebidos (linhas codificadas como CSV) e espera
+    `latency` segundos.
+    """
+
+    def __init__(self, latency=0.0, worksheets=None):
+        self.latency = latency
+        self.sheets = {name: [list(columns)] for name, columns in (worksheets or WORKSHEETS).items()}
+        self.client = FakeGSheetsClient(self)
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.calls = Counter()
+        self.bytes_read = 0
+        self.bytes_written = 0
+
+    def _request(self, kind, size):
+        self.calls[kind] += 1
+        if kind in READ_CALLS:
+            self.bytes_read += size
+        else:
+            self.bytes_written += size
+        if self.latency:
+            time.sleep(self.latency)
+
+    @property
+    def reads(self):
+        return sum(count for kind, count in self.calls.items() if kind in READ_CALLS)
+
+    @property
+    def writes(self):
+        return sum(count for kind, count in self.calls.items() if kind not in READ_CALLS)
+
+    def _store(self, worksheet, data):
+        self.sheets[worksheet] = [list(map(str, data.columns))] + [[_cell(v) for v in row] for row in data.itertuples(index=False)]
+
+    def read(self, worksheet=None, ttl=None, **kwargs):
+        if worksheet not in self.sheets:
+            self._request("read", 0)
+            raise WorksheetNotFound(worksheet)
+        rows = self.sheets[worksheet]
+        self._request("read", _payload_size(rows) if rows else 0)
+        if not rows:
+            return pd.DataFrame()
+        buffer = io.StringIO()
+        pd.DataFrame(rows[1:], columns=rows[0]).to_csv(buffer, index=False)
+        buffer.seek(0)
+        # Mesma inferência de tipos do conector (texto -> números/booleanos)
+        return pd.read_csv(buffer, keep_default_na=True)
+
+    def update(self, worksheet=None, data=None, **kwargs):
+        if worksheet not in self.sheets:
+            self._request("update", 0)
+            raise WorksheetNotFound(worksheet)
+        self._store(worksheet, data)
+        self._request("update", _payload_size(self.sheets[worksheet]))
+
+    def create(self, worksheet=None, data=None, **kwargs):
+        self._store(worksheet, data)
+        self._request("create", _payload_size(self.sheets[worksheet]))
+
+
+def _activities(count, vagas):
+    """Atividades da simulação: dois plantões por dia, a partir de 01/12/2025."""
+    first_day = date(2025, 12, 1)
+    return pd.DataFrame({
+        'tipo': ['Plantão'] * count,
+        'data': [(first_day + timedelta(days=i // 2)).strftime('%d/%m/%Y') for i in range(count)],
+        'horario': ['07:00-19:00' if i % 2 == 0 else '19:00-07:00' for i in range(count)],
+        'vagas': [vagas] * count,
+        'observacoes': [''] * count
+    })
+
+
+def simulate_draft(participantes=30, atividades=60, rodadas=3, latency=0.0, cached=True, flush_every=1, seed=0):
+    """Conduz uma escala completa contra a conexão falsa e retorna as métricas.
+
+    participantes, atividades, rodadas: tamanho da escala (as vagas por atividade
+        são as mínimas para todos escolherem em todas as rodadas)
+    latency: segundos de espera por chamada à API
+    cached: usa o cache compartilhado entre as sessões, como o app
+    flush_every: grava a fila de escritas a cada N escolhas (no app, a cada 2 segundos)
+
+    Cada escolha reproduz uma execução do script do participante da vez: novo
+    snapshot, get_current_turn, get_available_activities e make_choice.
+    """
+    rng = random.Random(seed)
+    random.seed(seed)  # ordem das rodadas
+
+    conn = FakeGSheetsConnection()
+    # O flush é feito pela simulação, não pela thread da fila
+    writer = WriteBehindStorage(GSheetsStorage(conn), flush_interval=24 * 3600, max_age=300 if cached else 0)
+    try:
+        storage = CachedStorage(writer, max_age=300) if cached else writer
+        database.init(storage, ADMIN_EMAIL)
+
+        # Preparação (fora da medição): usuários, atividades e regras
+        emails = [f"participante{i:04d}@email.com" for i in range(participantes)]
+        storage.insert("usuarios", pd.DataFrame({
+            "nome": [f"Participante {i}" for i in range(participantes)],
+            "matricula": [str(i) for i in range(participantes)],
+            "email": emails,
+            "senha_hash": [""] * participantes
+        }))
+        vagas = max(1, math.ceil(participantes * rodadas / atividades))
+        success, message = database.add_atividades_bulk(ESCALA_NOME, _activities(atividades, vagas))
+        if not success:
+            raise RuntimeError(message)
+        database.set_rules(ESCALA_NOME, total_rodadas=rodadas)
+        writer.flush()
+        nomes = dict(zip(emails, [f"Participante {i}" for i in range(participantes)]))
+
+        conn.reset_counters()
+        conn.latency = latency
+        start = time.perf_counter()
+
+        database.begin_snapshot()
+        success, message = database.create_new_round(ESCALA_NOME)
+        if not success:
+            raise RuntimeError(message)
+        writer.flush()
+
+        picks = 0
+        pick_times = []
+        while True:
+            pick_start = time.perf_counter()
+            database.begin_snapshot()
+            email = database.get_current_turn(ESCALA_NOME)
+            if email is None:
+                break
+            available = database.get_available_activities(ESCALA_NOME)
+            if available.empty:
+                raise RuntimeError("Sem vagas disponíveis durante a simulação")
+            mine = set(database.get_user_choices(ESCALA_NOME, email).get('id_atividade', []))
+            options = [i for i in available['id_atividade'] if i not in mine] or list(available['id_atividade'])
+            success, message = database.make_choice(ESCALA_NOME, email, nomes[email], rng.choice(options))
+            if not success:
+                raise RuntimeError(message)
+            picks += 1
+            if picks % flush_every == 0:
+                writer.flush()
+            pick_times.append(time.perf_counter() - pick_start)
+
+        writer.flush()
+        elapsed = time.perf_counter() - start
+        database.begin_snapshot()
+
+        gravadas = len(conn.sheets["escolhas"]) - 1
+        if gravadas != picks:
+            raise RuntimeError(f"{picks} escolhas feitas, {gravadas} gravadas na planilha")
+
+        pick_times.sort()
+        return {
+            "participantes": participantes,
+            "atividades": atividades,
+            "rodadas": rodadas,
+            "escolhas": picks,
+            "tempo_total": elapsed,
+            "tempo_por_escolha_p50": pick_times[len(pick_times) // 2] if pick_times else 0.0,
+            "tempo_por_escolha_p95": pick_times[int(len(pick_times) * 0.95)] if pick_times else 0.0,
+            "leituras": conn.reads,
+            "escritas": conn.writes,
+            "leituras_por_escolha": conn.reads / picks if picks else 0.0,
+            "escritas_por_escolha": conn.writes / picks if picks else 0.0,
+            "bytes_lidos": conn.bytes_read,
+            "bytes_gravados": conn.bytes_written,
+            "chamadas": dict(conn.calls),
+        }
+    finally:
+        writer.close()
+
+
+def simulate_logins(usuarios=80, rounds=10, workers=None, old_rounds=None, latency=0.0):
+    """Simula a abertura da escala: todos os participantes fazem login ao mesmo tempo.
+
+    usuarios: logins simultâneos (uma thread por sessão)
+    rounds: custo do bcrypt configurado no app
+    workers: tamanho do pool de hash (0 calcula na thread da sessão, sem pool)
+    old_rounds: custo com que as senhas foram gravadas; se diferente de rounds,
+        cada login também refaz o hash com o custo atual
+    latency: segundos de espera por chamada à API
+
+    Cada login reproduz o formulário do app: get_user_data e check_user_password.
+    """
+    conn = FakeGSheetsConnection()
+    writer = WriteBehindStorage(GSheetsStorage(conn), flush_interval=24 * 3600)
+    try:
+        storage = CachedStorage(writer, max_age=300)
+        hasher = PasswordHasher(rounds, max_workers=workers)
+        database.init(storage, ADMIN_EMAIL, hasher=hasher)
+
+        # Preparação (fora da medição): senhas gravadas com o custo antigo (ou o atual)
+        emails = [f"participante{i:04d}@email.com" for i in range(usuarios)]
+        senhas = [f"senha-{i}" for i in range(usuarios)]
+        setup = PasswordHasher(old_rounds or rounds)
+        storage.insert("usuarios", pd.DataFrame({
+            "nome": [f"Participante {i}" for i in range(usuarios)],
+            "matricula": [str(i) for i in range(usuarios)],
+            "email": emails,
+            "senha_hash": setup.hash_many(senhas)
+        }))
+        setup.shutdown()
+        writer.flush()
+
+        conn.latency = latency
+        start_line = threading.Barrier(usuarios + 1)
+        times = [None] * usuarios
+        failures = []
+
+        def login(i):
+            start_line.wait()
+            login_start = time.perf_counter()
+            user_data = database.get_user_data(emails[i])
+            if user_data is None or not database.check_user_password(emails[i], senhas[i], user_data['senha_hash']):
+                failures.append(emails[i])
+            times[i] = time.perf_counter() - login_start
+
+        threads = [threading.Thread(target=login, args=(i,)) for i in range(usuarios)]
+        for thread in threads:
+            thread.start()
+        start_line.wait()
+        start = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        writer.flush()
+        hasher.shutdown()
+
+        if failures:
+            raise RuntimeError(f"{len(failures)} login(s) recusado(s) durante a simulação")
+        stored = storage.read("usuarios")["senha_hash"]
+
+        times.sort()
+        return {
+            "logins": usuarios,
+            "custo": rounds,
+            "custo_antigo": old_rounds,
+            "workers": hasher.max_workers,
+            "tempo_total": elapsed,
+            "logins_por_segundo": usuarios / elapsed if elapsed else 0.0,
+            "tempo_por_login_p50": times[len(times) // 2],
+            "tempo_por_login_p95": times[int(len(times) * 0.95)],
+            "hashes_no_custo_atual": int(sum(hash_rounds(h) == rounds for h in stored)),
+        }
+    finally:
+        writer.close()
+
+
+def format_login_report(report):
+    """Relatório da simulação de logins em texto."""
+    pool = f"pool de {report['workers']}" if report['workers'] else "sem pool"
+    lines = [
+        f"Logins simultâneos: {report['logins']} (custo {report['custo']}, {pool})",
+        f"Tempo total: {report['tempo_total']:.2f} s ({report['logins_por_segundo']:.1f} logins/s)",
+        f"Espera por login: p50 {report['tempo_por_login_p50'] * 1000:.0f} ms, "
+        f"p95 {report['tempo_por_login_p95'] * 1000:.0f} ms",
+    ]
+    if report['custo_antigo'] and report['custo_antigo'] != report['custo']:
+        lines.append(f"Hashes refeitos do custo {report['custo_antigo']} para {report['custo']}: "
+                     f"{report['hashes_no_custo_atual']} de {report['logins']}")
+    return "\n".join(lines)
+
+
+def format_report(report):
+    """Relatório da simulação em texto."""
+    lines = [
+        f"Escala: {report['participantes']} participantes, {report['atividades']} atividades, {report['rodadas']} rodada(s)",
+        f"Escolhas: {report['escolhas']}",
+        f"Tempo total: {report['tempo_total']:.2f} s "
+        f"(por escolha: p50 {report['tempo_por_escolha_p50'] * 1000:.1f} ms, p95 {report['tempo_por_escolha_p95'] * 1000:.1f} ms)",
+        f"Leituras: {report['leituras']} ({report['leituras_por_escolha']:.2f} por escolha), "
+        f"{report['bytes_lidos'] / 1024:.1f} KiB",
+        f"Escritas: {report['escritas']} ({report['escritas_por_escolha']:.2f} por escolha), "
+        f"{report['bytes_gravados'] / 1024:.1f} KiB",
+        "Chamadas: " + ", ".join(f"{kind}={count}" for kind, count in sorted(report['chamadas'].items())),
+    ]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simula uma escala completa contra um Google Sheets em memória.")
+    parser.add_argument("--participantes", type=int, default=30)
+    parser.add_argument("--atividades", type=int, default=60)
+    parser.add_argument("--rodadas", type=int, default=3)
+    parser.add_argument("--latencia", type=float, default=0.0, help="segundos por chamada à API")
+    parser.add_argument("--sem-cache", action="store_true", help="desliga o cache compartilhado")
+    parser.add_argument("--flush-a-cada", type=int, default=1, help="grava a fila de escritas a cada N escolhas")
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--logins", type=int, help="mede N logins simultâneos em vez da escala")
+    parser.add_argument("--custo", type=int, default=10, help="custo do bcrypt nos logins")
+    parser.add_argument("--custo-antigo", type=int, help="custo das senhas gravadas (refeitas no login)")
+    parser.add_argument("--workers", type=int, help="tamanho do pool de hash (0 = sem pool)")
+    args = parser.parse_args()
+
+    if args.logins:
+        print(format_login_report(simulate_logins(
+            usuarios=args.logins,
+            rounds=args.custo,
+            workers=args.workers,
+            old_rounds=args.custo_antigo,
+            latency=args.latencia,
+        )))
+        return
+
+    report = simulate_draft(
+        participantes=args.participantes,
+        atividades=args.atividades,
+        rodadas=args.rodadas,
+        latency=args.latencia,
+        cached=not args.sem_cache,
+        flush_every=args.flush_a_cada,
+        seed=args.semente,
+    )
+    print(format_report(report))
+
+
+if __name__ == "__main__":
+    main()
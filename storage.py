@@ -0,0 +1,1225 @@
+"""
+Camada de armazenamento da plataforma de escalas.
+
+Define uma interface comum para as planilhas usadas pelo app e dois backends:
+- GSheetsStorage: Google Sheets via st-gsheets-connection (opcional)
+- SQLiteStorage: banco SQLite local, com tabelas indexadas e escrita por linha
+"""
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from diagnostics import CACHE_HIT, CACHE_MISS, LAYER_BACKEND, frame_size
+
+logger = logging.getLogger(__name__)
+
+# Colunas de cada planilha, na ordem em que são gravadas
+WORKSHEETS = {
+    "usuarios": ["nome", "matricula", "email", "senha_hash"],
+    "emails_permitidos": ["email"],
+    "atividades": ["escala_nome", "tipo", "data", "horario", "vagas", "id_atividade", "observacoes", "inicio", "fim"],
+    "rodadas": ["escala_nome", "numero_rodada", "posicao", "email_participante", "ja_escolheu", "pulado"],
+    "escolhas": ["escala_nome", "id_atividade", "email_participante", "nome_participante"],
+    "regras": ["escala_nome", "prazo_minutos", "acao_prazo", "total_rodadas", "modo_ordem", "modo_escolha"],
+    "preferencias": ["escala_nome", "email_participante", "id_atividade", "posicao"],
+}
+
+# Tipos das colunas no SQLite (as demais são TEXT)
+COLUMN_TYPES = {
+    "vagas": "INTEGER",
+    "numero_rodada": "INTEGER",
+    "posicao": "INTEGER",
+    "ja_escolheu": "INTEGER",
+    "pulado": "INTEGER",
+    "prazo_minutos": "INTEGER",
+    "total_rodadas": "INTEGER",
+}
+
+# Colunas booleanas (gravadas como 0/1 no SQLite)
+BOOL_COLUMNS = {"ja_escolheu", "pulado"}
+
+# Índices criados no SQLite para as consultas do app
+INDEXES = {
+    "usuarios": [("email",)],
+    "emails_permitidos": [("email",)],
+    "atividades": [("escala_nome",), ("id_atividade",)],
+    "rodadas": [("escala_nome", "numero_rodada", "posicao")],
+    "escolhas": [("escala_nome",), ("id_atividade",), ("email_participante",)],
+    "regras": [("escala_nome",)],
+    "preferencias": [("escala_nome", "email_participante")],
+}
+
+
+# Resultados de Storage.reserve_slot()
+RESERVED = "reservado"
+NOT_YOUR_TURN = "fora_da_vez"
+NO_SLOTS = "sem_vagas"
+UNKNOWN_ACTIVITY = "atividade_inexistente"
+
+# Locks de reserva por escala, compartilhados pelo processo
+_reserve_locks = {}
+_reserve_locks_guard = threading.Lock()
+
+
+def _reserve_lock(escala_nome):
+    with _reserve_locks_guard:
+        return _reserve_locks.setdefault(escala_nome, threading.Lock())
+
+
+def empty_frame(worksheet):
+    """Retorna um DataFrame vazio com as colunas da planilha."""
+    return pd.DataFrame(columns=WORKSHEETS[worksheet])
+
+
+def _to_python(value):
+    """Converte escalares do numpy/pandas para tipos nativos aceitos pelo sqlite3."""
+    if value is None:
+        return None
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+def compute_occupancy(df_atividades, df_escolhas):
+    """Monta o índice de ocupação: id_atividade -> (ocupadas, vagas_disponiveis)."""
+    if df_atividades.empty:
+        return {}
+    ocupadas = df_escolhas['id_atividade'].value_counts().to_dict() if not df_escolhas.empty else {}
+    vagas = pd.to_numeric(df_atividades['vagas'], errors='coerce').fillna(0).astype(int)
+    return {
+        id_atividade: (ocupadas.get(id_atividade, 0), total - ocupadas.get(id_atividade, 0))
+        for id_atividade, total in zip(df_atividades['id_atividade'], vagas)
+    }
+
+
+def normalize_email(email):
+    """Email na forma usada nas buscas (sem espaços nas pontas, minúsculo); "" para vazio."""
+    if email is None or (isinstance(email, float) and pd.isna(email)):
+        return ""
+    return str(email).strip().lower()
+
+
+def _index_emails(index, df):
+    """Acrescenta as linhas de `df` ao índice por email (vale a primeira linha de cada email)."""
+    if df.empty or 'email' not in df.columns:
+        return index
+    for record in df.to_dict('records'):
+        key = normalize_email(record['email'])
+        if key:
+            index.setdefault(key, record)
+    return index
+
+
+def build_email_index(df):
+    """Monta o índice email normalizado -> linha (dicionário) das planilhas usuarios e emails_permitidos."""
+    return _index_emails({}, df)
+
+
+def _apply_update(df, where, values):
+    """Aplica update_rows em um DataFrame em memória. Retorna (df, linhas alteradas)."""
+    if df.empty:
+        return df, 0
+    mask = pd.Series(True, index=df.index)
+    for column, value in where.items():
+        if column not in df.columns:
+            return df, 0
+        mask &= df[column] == value
+    count = int(mask.sum())
+    if count:
+        df = df.copy()
+        for column, value in values.items():
+            df.loc[mask, column] = value
+    return df, count
+
+
+def _apply_delete(df, where):
+    """Aplica delete_rows em um DataFrame em memória. Retorna (df, linhas removidas)."""
+    if df.empty:
+        return df, 0
+    mask = pd.Series(True, index=df.index)
+    for column, value in where.items():
+        if column not in df.columns:
+            return df, 0
+        mask &= df[column] == value
+    count = int(mask.sum())
+    if count:
+        df = df[~mask].reset_index(drop=True)
+    return df, count
+
+
+def _to_cell(value):
+    """Converte um valor para célula do Sheets (vazio em vez de None/NaN)."""
+    value = _to_python(value)
+    return "" if value is None else value
+
+
+class Storage:
+    """Interface comum dos backends de armazenamento.
+
+    Todas as operações recebem o nome da planilha (ex: "atividades").
+    `where` é um dicionário coluna -> valor combinado com AND.
+    """
+
+    def read(self, worksheet):
+        """Retorna a planilha inteira como DataFrame."""
+        raise NotImplementedError
+
+    def write(self, worksheet, df):
+        """Substitui todo o conteúdo da planilha por `df`."""
+        raise NotImplementedError
+
+    def insert(self, worksheet, df):
+        """Adiciona as linhas de `df` ao final da planilha."""
+        raise NotImplementedError
+
+    def update_rows(self, worksheet, where, values):
+        """Atualiza as colunas de `values` nas linhas que casam com `where`.
+
+        Retorna o número de linhas alteradas.
+        """
+        raise NotImplementedError
+
+    def delete_rows(self, worksheet, where):
+        """Remove as linhas que casam com `where`. Retorna o número de linhas removidas."""
+        df, count = _apply_delete(self.read(worksheet), where)
+        if count:
+            self.write(worksheet, df)
+        return count
+
+    # Backends que filtram por escala no próprio armazenamento (sem ler a planilha inteira)
+    partitioned = False
+
+    def read_escala(self, worksheet, escala_nome):
+        """Retorna só as linhas de uma escala (planilhas atividades, rodadas e escolhas)."""
+        df = self.read(worksheet)
+        return df[df['escala_nome'] == escala_nome]
+
+    def occupancy(self, escala_nome):
+        """Índice de ocupação das atividades da escala: id_atividade -> (ocupadas, vagas_disponiveis)."""
+        return compute_occupancy(self.read_escala("atividades", escala_nome), self.read_escala("escolhas", escala_nome))
+
+    def email_index(self, worksheet):
+        """Índice por email normalizado das planilhas usuarios e emails_permitidos: email -> linha (dicionário)."""
+        return build_email_index(self.read(worksheet))
+
+    def failed_writes(self):
+        """Escritas que o backend recusou e que foram descartadas: lista de mutações
+        (planilha, tipo, linhas, tentativas, erro). Só a fila de escritas em segundo plano tem."""
+        return []
+
+    # Backends que implementam reserve_slot com uma transação própria
+    transactional = False
+
+    def reserve_slot(self, escala_nome, numero_rodada, id_atividade, email, nome):
+        """Reserva uma vaga em um único passo atômico.
+
+        Confere se é a vez do participante e se a atividade ainda tem vagas,
+        grava a escolha e avança a vez. Retorna RESERVED, NOT_YOUR_TURN,
+        NO_SLOTS ou UNKNOWN_ACTIVITY.
+
+        Esta implementação serializa as reservas de cada escala com um lock do
+        processo; backends transacionais a substituem.
+        """
+        with _reserve_lock(escala_nome):
+            df_rounds = self.read_escala("rodadas", escala_nome)
+            pendentes = df_rounds[
+                (df_rounds['numero_rodada'] == numero_rodada) &
+                (df_rounds['ja_escolheu'] == False)
+            ].sort_values('posicao')
+            if pendentes.empty or pendentes.iloc[0]['email_participante'] != email:
+                return NOT_YOUR_TURN
+
+            occupancy = self.occupancy(escala_nome)
+            if id_atividade not in occupancy:
+                return UNKNOWN_ACTIVITY
+            _, restantes = occupancy[id_atividade]
+            if restantes <= 0:
+                return NO_SLOTS
+
+            self.insert("escolhas", pd.DataFrame([{
+                "escala_nome": escala_nome,
+                "id_atividade": id_atividade,
+                "email_participante": email,
+                "nome_participante": nome
+            }]))
+            self.update_rows(
+                "rodadas",
+                {"escala_nome": escala_nome, "numero_rodada": numero_rodada, "email_participante": email},
+                {"ja_escolheu": True}
+            )
+            return RESERVED
+
+
+    def run_locked(self, escala_nome, fn):
+        """Executa fn() com as reservas da escala bloqueadas e retorna o resultado.
+
+        Para operações que leem a vez e as vagas e depois gravam várias linhas
+        (ex: a distribuição das cédulas): nenhuma reserva, vez pulada ou outra
+        operação bloqueada da mesma escala se intercala. fn não deve chamar
+        reserve_slot, skip_turn nem run_locked.
+
+        Esta implementação usa o lock de reserva do processo; backends
+        transacionais também rodam fn em uma transação.
+        """
+        with _reserve_lock(escala_nome):
+            return fn()
+
+    def skip_turn(self, escala_nome, numero_rodada, email):
+        """Encerra a vez pendente do participante sem escolha (prazo esgotado).
+
+        Roda sob o mesmo lock da reserva, então não se mistura com uma escolha
+        simultânea. Retorna True se a vez foi pulada.
+        """
+        with _reserve_lock(escala_nome):
+            return self.update_rows(
+                "rodadas",
+                {"escala_nome": escala_nome, "numero_rodada": numero_rodada, "email_participante": email, "ja_escolheu": False},
+                {"ja_escolheu": True, "pulado": True}
+            ) > 0
+
+
+class GSheetsStorage(Storage):
+    """Backend Google Sheets.
+
+    Inserções enviam só as linhas novas; leituras, atualizações e
+    substituições trabalham com a planilha inteira.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self._worksheets = {}  # nome -> gspread.Worksheet
+        self._headers = {}  # nome -> lista de colunas da linha 1
+
+    def _worksheet(self, worksheet):
+        """Abre a aba uma única vez (o conector não expõe append, então usa o gspread)."""
+        if worksheet not in self._worksheets:
+            self._worksheets[worksheet] = self.conn.client._select_worksheet(worksheet=worksheet)
+        return self._worksheets[worksheet]
+
+    def read(self, worksheet):
+        from gspread.exceptions import WorksheetNotFound
+
+        try:
+            # ttl=0: o cache de leituras fica a cargo do app, não do conector
+            df = self.conn.read(worksheet=worksheet, ttl=0)
+        except WorksheetNotFound:
+            return empty_frame(worksheet)
+        return df.dropna(how="all")
+
+    def write(self, worksheet, df):
+        from gspread.exceptions import WorksheetNotFound
+
+        try:
+            self.conn.update(worksheet=worksheet, data=df)
+        except WorksheetNotFound:
+            # Se a planilha não existir, cria com os dados
+            self.conn.create(worksheet=worksheet, data=df)
+        self._headers[worksheet] = list(df.columns)
+
+    def insert(self, worksheet, df):
+        """Envia apenas as linhas novas (append da API do Sheets).
+
+        O append é atômico no servidor, então escritas concorrentes não se sobrescrevem.
+        """
+        from gspread.exceptions import WorksheetNotFound
+
+        if df.empty:
+            return
+        try:
+            ws = self._worksheet(worksheet)
+        except WorksheetNotFound:
+            self.write(worksheet, df)
+            return
+
+        header = self._headers.get(worksheet)
+        if header is None:
+            header = ws.row_values(1)
+        if not header:
+            # Aba vazia: grava com cabeçalho
+            self.write(worksheet, df)
+            return
+
+        # Colunas novas (ex: observacoes) são acrescentadas ao cabeçalho
+        new_columns = [c for c in df.columns if c not in header]
+        if new_columns:
+            header = header + new_columns
+            ws.update(range_name="A1", values=[header])
+        self._headers[worksheet] = header
+
+        rows = [[_to_cell(row.get(c)) for c in header] for row in df.to_dict("records")]
+        ws.append_rows(rows, value_input_option="USER_ENTERED", insert_data_option="INSERT_ROWS", table_range="A1")
+
+    def update_rows(self, worksheet, where, values):
+        df, count = _apply_update(self.read(worksheet), where, values)
+        if count:
+            self.write(worksheet, df)
+        return count
+
+
+class SQLiteStorage(Storage):
+    """Backend SQLite local.
+
+    Usa uma única conexão compartilhada entre as sessões do Streamlit,
+    protegida por um lock (o sqlite3 não é seguro para uso concorrente).
+    """
+
+    def __init__(self, path="escalas.db"):
+        self.path = path
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._in_transaction = False  # dentro de run_locked: as escritas não fazem commit
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._lock, self._conn:
+            for worksheet, columns in WORKSHEETS.items():
+                column_defs = ", ".join(f'"{c}" {COLUMN_TYPES.get(c, "TEXT")}' for c in columns)
+                self._conn.execute(f'CREATE TABLE IF NOT EXISTS "{worksheet}" ({column_defs})')
+
+                # Migração simples: adiciona colunas novas em bancos já existentes
+                existing = {row[1] for row in self._conn.execute(f'PRAGMA table_info("{worksheet}")')}
+                for column in columns:
+                    if column not in existing:
+                        self._conn.execute(
+                            f'ALTER TABLE "{worksheet}" ADD COLUMN "{column}" {COLUMN_TYPES.get(column, "TEXT")}'
+                        )
+
+                for index_columns in INDEXES.get(worksheet, []):
+                    index_name = f"idx_{worksheet}_{'_'.join(index_columns)}"
+                    cols = ", ".join(f'"{c}"' for c in index_columns)
+                    self._conn.execute(f'CREATE INDEX IF NOT EXISTS "{index_name}" ON "{worksheet}" ({cols})')
+
+    def _select(self, worksheet, where_sql="", params=()):
+        columns = WORKSHEETS[worksheet]
+        cols = ", ".join(f'"{c}"' for c in columns)
+        with self._lock:
+            df = pd.read_sql_query(f'SELECT {cols} FROM "{worksheet}" {where_sql} ORDER BY rowid', self._conn, params=params)
+        for column in BOOL_COLUMNS.intersection(df.columns):
+            df[column] = df[column].fillna(0).astype(bool)
+        return df
+
+    def _insert_rows(self, worksheet, df):
+        columns = [c for c in WORKSHEETS[worksheet] if c in df.columns]
+        if df.empty or not columns:
+            return
+        cols = ", ".join(f'"{c}"' for c in columns)
+        placeholders = ", ".join("?" for _ in columns)
+        rows = [tuple(_to_python(v) for v in row) for row in df[columns].itertuples(index=False, name=None)]
+        self._conn.executemany(f'INSERT INTO "{worksheet}" ({cols}) VALUES ({placeholders})', rows)
+
+    @staticmethod
+    def _where_clause(where):
+        if not where:
+            return "", []
+        clause = " AND ".join(f'"{c}" = ?' for c in where)
+        return f"WHERE {clause}", [_to_python(v) for v in where.values()]
+
+    def read(self, worksheet):
+        return self._select(worksheet)
+
+    partitioned = True
+
+    def read_escala(self, worksheet, escala_nome):
+        # Usa os índices por escala_nome: escalas antigas não são lidas
+        return self._select(worksheet, 'WHERE "escala_nome" = ?', (escala_nome,))
+
+    def _execute(self, statements):
+        """Executa a escrita em uma transação própria, ou na transação de run_locked em andamento."""
+        with self._lock:
+            if self._in_transaction:
+                return statements()
+            with self._conn:
+                return statements()
+
+    def write(self, worksheet, df):
+        def statements():
+            self._conn.execute(f'DELETE FROM "{worksheet}"')
+            self._insert_rows(worksheet, df)
+        self._execute(statements)
+
+    def insert(self, worksheet, df):
+        self._execute(lambda: self._insert_rows(worksheet, df))
+
+    def update_rows(self, worksheet, where, values):
+        where_sql, params = self._where_clause(where)
+        set_sql = ", ".join(f'"{c}" = ?' for c in values)
+        set_params = [_to_python(v) for v in values.values()]
+        cursor = self._execute(lambda: self._conn.execute(f'UPDATE "{worksheet}" SET {set_sql} {where_sql}', set_params + params))
+        return cursor.rowcount
+
+    def delete_rows(self, worksheet, where):
+        where_sql, params = self._where_clause(where)
+        cursor = self._execute(lambda: self._conn.execute(f'DELETE FROM "{worksheet}" {where_sql}', params))
+        return cursor.rowcount
+
+    transactional = True
+
+    def reserve_slot(self, escala_nome, numero_rodada, id_atividade, email, nome):
+        # BEGIN IMMEDIATE também protege contra outros processos usando o mesmo arquivo
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = self._reserve_in_transaction(escala_nome, int(numero_rodada), id_atividade, email, nome)
+            except Exception:
+                self._conn.rollback()
+                raise
+            if result == RESERVED:
+                self._conn.commit()
+            else:
+                self._conn.rollback()
+            return result
+
+    def run_locked(self, escala_nome, fn):
+        # O lock da escala segura skip_turn; a transação (BEGIN IMMEDIATE) segura as
+        # reservas, também as de outros processos usando o mesmo arquivo
+        with _reserve_lock(escala_nome), self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            self._in_transaction = True
+            try:
+                result = fn()
+            except Exception:
+                self._conn.rollback()
+                raise
+            finally:
+                self._in_transaction = False
+            self._conn.commit()
+            return result
+
+    def _reserve_in_transaction(self, escala_nome, numero_rodada, id_atividade, email, nome):
+        row = self._conn.execute(
+            'SELECT email_participante FROM rodadas WHERE escala_nome = ? AND numero_rodada = ? '
+            'AND NOT ja_escolheu ORDER BY posicao LIMIT 1',
+            (escala_nome, numero_rodada)
+        ).fetchone()
+        if row is None or row[0] != email:
+            return NOT_YOUR_TURN
+
+        row = self._conn.execute(
+            'SELECT vagas FROM atividades WHERE escala_nome = ? AND id_atividade = ?',
+            (escala_nome, id_atividade)
+        ).fetchone()
+        if row is None:
+            return UNKNOWN_ACTIVITY
+
+        (ocupadas,) = self._conn.execute(
+            'SELECT COUNT(*) FROM escolhas WHERE id_atividade = ?', (id_atividade,)
+        ).fetchone()
+        if ocupadas >= int(row[0]):
+            return NO_SLOTS
+
+        self._conn.execute(
+            'INSERT INTO escolhas (escala_nome, id_atividade, email_participante, nome_participante) VALUES (?, ?, ?, ?)',
+            (escala_nome, id_atividade, email, nome)
+        )
+        self._conn.execute(
+            'UPDATE rodadas SET ja_escolheu = 1 WHERE escala_nome = ? AND numero_rodada = ? AND email_participante = ?',
+            (escala_nome, numero_rodada, email)
+        )
+        return RESERVED
+
+
+class SnapshotStorage(Storage):
+    """Snapshot das planilhas válido durante uma execução do script.
+
+    Cada planilha (ou fatia de uma escala) é lida do backend no máximo uma
+    vez; as funções de dados recebem o mesmo DataFrame (não devem
+    modificá-lo). Escritas vão direto ao backend e descartam o snapshot da
+    planilha alterada.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._frames = {}  # planilha ou (planilha, escala) -> DataFrame
+
+    def read(self, worksheet):
+        if worksheet not in self._frames:
+            self._frames[worksheet] = self.backend.read(worksheet)
+        return self._frames[worksheet]
+
+    def read_escala(self, worksheet, escala_nome):
+        key = (worksheet, escala_nome)
+        if key not in self._frames:
+            self._frames[key] = self.backend.read_escala(worksheet, escala_nome)
+        return self._frames[key]
+
+    def _discard(self, *worksheets):
+        for key in list(self._frames):
+            if (key[0] if isinstance(key, tuple) else key) in worksheets:
+                del self._frames[key]
+
+    def write(self, worksheet, df):
+        self._discard(worksheet)
+        self.backend.write(worksheet, df)
+
+    def insert(self, worksheet, df):
+        self._discard(worksheet)
+        self.backend.insert(worksheet, df)
+
+    def update_rows(self, worksheet, where, values):
+        self._discard(worksheet)
+        return self.backend.update_rows(worksheet, where, values)
+
+    def delete_rows(self, worksheet, where):
+        self._discard(worksheet)
+        return self.backend.delete_rows(worksheet, where)
+
+    def reserve_slot(self, escala_nome, numero_rodada, id_atividade, email, nome):
+        self._discard("escolhas", "rodadas")
+        return self.backend.reserve_slot(escala_nome, numero_rodada, id_atividade, email, nome)
+
+    def skip_turn(self, escala_nome, numero_rodada, email):
+        self._discard("rodadas")
+        return self.backend.skip_turn(escala_nome, numero_rodada, email)
+
+    def run_locked(self, escala_nome, fn):
+        # O que foi lido antes do lock pode ter mudado: fn lê de novo
+        self._frames.clear()
+        return self.backend.run_locked(escala_nome, fn)
+
+    def occupancy(self, escala_nome):
+        return self.backend.occupancy(escala_nome)
+
+    def email_index(self, worksheet):
+        return self.backend.email_index(worksheet)
+
+    def failed_writes(self):
+        return self.backend.failed_writes()
+
+
+class CachedStorage(Storage):
+    """Cache de planilhas compartilhado por todas as sessões do processo.
+
+    Cada planilha tem um contador de versão incrementado a cada escrita feita
+    por este processo; a leitura só volta ao backend quando a versão mudou
+    (ou quando o dado passou de `max_age` segundos, para captar edições
+    feitas diretamente na planilha). Leituras simultâneas da mesma planilha
+    compartilham uma única busca. Os DataFrames retornados são compartilhados
+    entre sessões e não devem ser modificados.
+
+    As leituras por escala têm versões próprias: uma escrita em uma escala
+    não invalida as demais. Com backends particionados (SQLite) só a fatia
+    da escala é buscada; nos demais a planilha é lida uma vez e indexada por
+    escala.
+
+    Também mantém o índice de ocupação de cada escala, atualizado a cada
+    escolha inserida em vez de recontar o histórico de escolhas, e os índices
+    por email de usuarios e emails_permitidos, que recebem as linhas inseridas
+    sem serem reconstruídos.
+    """
+
+    def __init__(self, backend, max_age=None):
+        self.backend = backend
+        self.max_age = max_age
+        # Versões: planilha -> qualquer escrita; (planilha, escala) -> escritas na escala;
+        # (planilha, None) -> escritas que podem afetar qualquer escala
+        self._versions = {}
+        self._frames = {}  # chave de leitura -> (versão, instante da busca, DataFrame ou índice por escala)
+        self._occupancy = {}  # escala -> (versões, instantes das buscas das fatias usadas, índice)
+        self._lock = threading.Lock()
+        self._fetch_locks = {}
+        self._local = threading.local()  # bypass: leituras dentro de run_locked, direto do backend
+
+    def version(self, worksheet):
+        """Versão atual da planilha (incrementada a cada escrita)."""
+        return self._versions.get(worksheet, 0)
+
+    def _partition_version(self, worksheet, escala_nome):
+        return (self._versions.get((worksheet, None), 0), self._versions.get((worksheet, escala_nome), 0))
+
+    def _cached(self, key, version):
+        entry = self._frames.get(key)
+        if entry is None:
+            return None
+        cached_version, fetched_at, value = entry
+        if cached_version != version:
+            return None
+        if self.max_age is not None and time.monotonic() - fetched_at > self.max_age:
+            return None
+        return value
+
+    def _fetch(self, key, version_of, fetch):
+        """Lê pelo cache; buscas simultâneas da mesma chave compartilham uma única busca."""
+        if getattr(self._local, "bypass", False):
+            return fetch()
+        value = self._cached(key, version_of())
+        if value is not None:
+            return value
+        with self._lock:
+            fetch_lock = self._fetch_locks.setdefault(key, threading.Lock())
+        with fetch_lock:
+            # Outra sessão pode ter buscado enquanto esperávamos o lock
+            version = version_of()
+            value = self._cached(key, version)
+            if value is not None:
+                return value
+            value = fetch()
+            with self._lock:
+                # Só guarda se nenhuma escrita aconteceu durante a busca
+                if version == version_of():
+                    self._frames[key] = (version, time.monotonic(), value)
+            return value
+
+    def read(self, worksheet):
+        return self._fetch(worksheet, lambda: self.version(worksheet), lambda: self.backend.read(worksheet))
+
+    def read_escala(self, worksheet, escala_nome):
+        if self.backend.partitioned:
+            return self._fetch(
+                (worksheet, escala_nome),
+                lambda: self._partition_version(worksheet, escala_nome),
+                lambda: self.backend.read_escala(worksheet, escala_nome)
+            )
+
+        # Backend sem partições: lê a planilha uma vez e indexa por escala
+        def build_index():
+            df = self.read(worksheet)
+            return {escala: rows for escala, rows in df.groupby('escala_nome', sort=False)}
+
+        index = self._fetch((worksheet, "por_escala"), lambda: self.version(worksheet), build_index)
+        rows = index.get(escala_nome)
+        return rows if rows is not None else empty_frame(worksheet)
+
+    @staticmethod
+    def _escalas(df):
+        """Escalas afetadas por uma escrita de `df` (None se não for possível saber)."""
+        if df is None or 'escala_nome' not in df.columns:
+            return None
+        return set(df['escala_nome'].dropna())
+
+    def _bump(self, worksheet, escalas=None, inserted=None):
+        with self._lock:
+            targets = escalas if escalas is not None else [None]
+            old_keys = {}
+            if worksheet == "escolhas" and inserted is not None and escalas is not None:
+                for escala in escalas:
+                    old_keys[escala] = (self._partition_version("atividades", escala),
+                                        self._partition_version("escolhas", escala))
+
+            # Índice por email em dia com a planilha: recebe as linhas inseridas
+            email_key = (worksheet, "por_email")
+            email_entry = self._frames.get(email_key)
+            if email_entry is not None and (inserted is None or email_entry[0] != self.version(worksheet)):
+                email_entry = None
+
+            self._versions[worksheet] = self.version(worksheet) + 1
+            for escala in targets:
+                self._versions[(worksheet, escala)] = self._versions.get((worksheet, escala), 0) + 1
+            self._frames.pop(worksheet, None)
+
+            if email_entry is not None:
+                _, fetched_at, index = email_entry
+                self._frames[email_key] = (self.version(worksheet), fetched_at, _index_emails(index, inserted))
+
+            # Escolhas novas atualizam o índice de ocupação sem reconstruí-lo
+            for escala, old_key in old_keys.items():
+                entry = self._occupancy.get(escala)
+                if entry is None or entry[0] != old_key:
+                    continue
+                _, sources, index = entry
+                for id_atividade in inserted.loc[inserted['escala_nome'] == escala, 'id_atividade']:
+                    if id_atividade in index:
+                        ocupadas, restantes = index[id_atividade]
+                        index[id_atividade] = (ocupadas + 1, restantes - 1)
+                new_key = (self._partition_version("atividades", escala), self._partition_version("escolhas", escala))
+                self._occupancy[escala] = (new_key, sources, index)
+
+    def _escala_fetched_at(self, worksheet, escala_nome):
+        """Instante da busca da fatia da escala em cache (None se não estiver em cache)."""
+        key = (worksheet, escala_nome) if self.backend.partitioned else (worksheet, "por_escala")
+        entry = self._frames.get(key)
+        return entry[1] if entry is not None else None
+
+    def _occupancy_valid(self, escala_nome, entry, key):
+        """Indica se o índice de ocupação guardado ainda vale."""
+        if entry is None or entry[0] != key:
+            return False
+        sources = entry[1]
+        # Revalida junto com as planilhas, para captar edições feitas diretamente na planilha
+        if self.max_age is not None and time.monotonic() - min(sources) > self.max_age:
+            return False
+        # Uma fatia buscada de novo desde a construção (ex: por outra sessão) pode ter linhas novas
+        for worksheet, fetched_at in zip(("atividades", "escolhas"), sources):
+            current = self._escala_fetched_at(worksheet, escala_nome)
+            if current is not None and current > fetched_at:
+                return False
+        return True
+
+    def occupancy(self, escala_nome):
+        def versions():
+            return (self._partition_version("atividades", escala_nome),
+                    self._partition_version("escolhas", escala_nome))
+
+        if getattr(self._local, "bypass", False):
+            return compute_occupancy(self.read_escala("atividades", escala_nome), self.read_escala("escolhas", escala_nome))
+        key = versions()
+        entry = self._occupancy.get(escala_nome)
+        if self._occupancy_valid(escala_nome, entry, key):
+            return entry[2]
+        df_atividades = self.read_escala("atividades", escala_nome)
+        df_escolhas = self.read_escala("escolhas", escala_nome)
+        index = compute_occupancy(df_atividades, df_escolhas)
+        now = time.monotonic()
+        with self._lock:
+            # Só guarda se nenhuma escrita aconteceu durante a construção
+            if key == versions():
+                sources = tuple(self._escala_fetched_at(worksheet, escala_nome) or now
+                                for worksheet in ("atividades", "escolhas"))
+                self._occupancy[escala_nome] = (key, sources, index)
+        return index
+
+    def email_index(self, worksheet):
+        return self._fetch(
+            (worksheet, "por_email"), lambda: self.version(worksheet),
+            lambda: build_email_index(self.read(worksheet))
+        )
+
+    def failed_writes(self):
+        return self.backend.failed_writes()
+
+    def write(self, worksheet, df):
+        try:
+            self.backend.write(worksheet, df)
+        finally:
+            self._bump(worksheet)
+
+    def insert(self, worksheet, df):
+        try:
+            self.backend.insert(worksheet, df)
+        except Exception:
+            self._bump(worksheet, self._escalas(df))
+            raise
+        self._bump(worksheet, self._escalas(df), inserted=df)
+
+    def update_rows(self, worksheet, where, values):
+        escalas = {where['escala_nome']} if 'escala_nome' in where and 'escala_nome' not in values else None
+        try:
+            return self.backend.update_rows(worksheet, where, values)
+        finally:
+            self._bump(worksheet, escalas)
+
+    def delete_rows(self, worksheet, where):
+        escalas = {where['escala_nome']} if 'escala_nome' in where else None
+        try:
+            return self.backend.delete_rows(worksheet, where)
+        finally:
+            self._bump(worksheet, escalas)
+
+    def reserve_slot(self, escala_nome, numero_rodada, id_atividade, email, nome):
+        if not self.backend.transactional:
+            # Confere vagas e vez sobre as planilhas em cache, sob o lock da escala
+            return Storage.reserve_slot(self, escala_nome, numero_rodada, id_atividade, email, nome)
+        try:
+            result = self.backend.reserve_slot(escala_nome, numero_rodada, id_atividade, email, nome)
+        except Exception:
+            self._bump("escolhas", {escala_nome})
+            self._bump("rodadas", {escala_nome})
+            raise
+        if result == RESERVED:
+            inserted = pd.DataFrame([{"escala_nome": escala_nome, "id_atividade": id_atividade}])
+            self._bump("escolhas", {escala_nome}, inserted=inserted)
+            self._bump("rodadas", {escala_nome})
+        return result
+
+    def skip_turn(self, escala_nome, numero_rodada, email):
+        if not self.backend.transactional:
+            return Storage.skip_turn(self, escala_nome, numero_rodada, email)
+        try:
+            return self.backend.skip_turn(escala_nome, numero_rodada, email)
+        finally:
+            self._bump("rodadas", {escala_nome})
+
+    def run_locked(self, escala_nome, fn):
+        if not self.backend.transactional:
+            # Mesmo lock das reservas feitas sobre as planilhas em cache
+            return Storage.run_locked(self, escala_nome, fn)
+
+        def in_transaction():
+            # Dentro da transação as leituras vão direto ao backend: o cache pode não ter as
+            # escritas de outros processos, e a busca de outra sessão pode estar esperando a transação
+            self._local.bypass = True
+            try:
+                return fn()
+            finally:
+                self._local.bypass = False
+
+        try:
+            return self.backend.run_locked(escala_nome, in_transaction)
+        except Exception:
+            # Transação desfeita: descarta o que as escritas de fn atualizaram no cache
+            for worksheet in ("atividades", "rodadas", "escolhas"):
+                self._bump(worksheet, {escala_nome})
+            raise
+
+
+class WriteBehindStorage(Storage):
+    """Fila de escritas com gravação em segundo plano (pensada para o Google Sheets).
+
+    insert/update_rows/delete_rows/write retornam assim que a mutação está registrada no
+    journal local (com fsync); uma thread grava a fila no backend a cada
+    `flush_interval` segundos, juntando as mutações de cada planilha em uma
+    única escrita: só inserções viram um único append, e o resto vira uma
+    leitura + uma escrita da planilha. O journal é reaplicado ao reiniciar o
+    processo.
+
+    Mutações que falham continuam na fila e a planilha é tentada de novo
+    depois de `retry_delay` segundos, dobrando a espera a cada falha. Depois
+    de `max_attempts` falhas, cada mutação da planilha é gravada sozinha e as
+    que falham de novo saem da fila (para não travar as seguintes) e vão para
+    a lista de escritas não gravadas (failed_writes(), menu Diagnóstico), também
+    guardada em `journal_path`.falhas.
+
+    A gravação é "pelo menos uma vez": se o append de inserções chegar ao
+    Google Sheets mas a resposta se perder (ex: timeout), a nova tentativa
+    grava as mesmas linhas de novo.
+
+    Leituras retornam o backend com as mutações pendentes já aplicadas. A
+    última versão lida do backend (a base) fica guardada: as contagens de
+    update_rows/delete_rows e as leituras feitas antes de `max_age` segundos
+    usam a base + a fila, sem chamar o backend. Um flush em andamento não
+    bloqueia as leituras nem as escritas: a base e a fila só trocam, juntas,
+    quando a gravação de uma planilha termina.
+    """
+
+    def __init__(self, backend, flush_interval=2.0, journal_path=None, max_age=0, max_attempts=8, retry_delay=None):
+        self.backend = backend
+        self.flush_interval = flush_interval
+        self.journal_path = journal_path
+        self.max_age = max_age
+        self.max_attempts = max_attempts
+        self.retry_delay = flush_interval if retry_delay is None else retry_delay
+        self._attempts = {}  # id da mutação -> tentativas que falharam
+        self._retry_at = {}  # planilha -> instante da próxima tentativa
+        self._failed = []  # mutações descartadas depois de max_attempts falhas
+        self._pending = []  # mutações ainda não gravadas, em ordem
+        self._next_id = 0
+        self._base = {}  # planilha -> (instante da leitura, conteúdo do backend sem as mutações pendentes)
+        self._flushing = set()  # planilhas sendo gravadas pelo flush
+        self._flushes = {}  # planilha -> gravações concluídas (para detectar leituras durante um flush)
+        self._lock = threading.Lock()
+        self._flushed = threading.Condition(self._lock)
+        self._flush_lock = threading.Lock()  # um flush por vez
+        self._stop = threading.Event()
+
+        if journal_path and os.path.exists(journal_path):
+            with open(journal_path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        self._enqueue(json.loads(line), journal=False)
+
+        self._worker = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._worker.start()
+
+    def _enqueue(self, mutation, journal=True):
+        with self._lock:
+            mutation["id"] = self._next_id
+            self._next_id += 1
+            if journal and self.journal_path:
+                with open(self.journal_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(mutation, ensure_ascii=False) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+            self._pending.append(mutation)
+
+    @staticmethod
+    def _records(df):
+        return [{c: _to_python(v) for c, v in row.items()} for row in df.to_dict("records")]
+
+    @staticmethod
+    def _apply(df, mutations):
+        """Aplica mutações pendentes a um DataFrame em memória."""
+        for mutation in mutations:
+            if mutation["kind"] == "insert":
+                new_rows = pd.DataFrame(mutation["rows"])
+                df = new_rows if df.empty else pd.concat([df, new_rows], ignore_index=True)
+            elif mutation["kind"] == "write":
+                df = pd.DataFrame(mutation["rows"], columns=mutation["columns"])
+            elif mutation["kind"] == "delete":
+                df, _ = _apply_delete(df, mutation["where"])
+            else:
+                df, _ = _apply_update(df, mutation["where"], mutation["values"])
+        return df
+
+    def _pending_for(self, worksheet):
+        # Chamado com self._lock
+        return [m for m in self._pending if m["worksheet"] == worksheet]
+
+    def pending_count(self):
+        """Número de mutações ainda não gravadas no backend."""
+        with self._lock:
+            return len(self._pending)
+
+    def failed_writes(self):
+        with self._lock:
+            return list(self._failed)
+
+    def _cached_view(self, worksheet, max_age=None):
+        """Base + fila, sem chamar o backend (None se não houver base, ou se ela passou de max_age)."""
+        with self._lock:
+            entry = self._base.get(worksheet)
+            if entry is None or (max_age is not None and time.monotonic() - entry[0] > max_age):
+                return None
+            df, pending = entry[1], self._pending_for(worksheet)
+        return self._apply(df, pending) if pending else df
+
+    def read(self, worksheet):
+        view = self._cached_view(worksheet, self.max_age)
+        if view is not None:
+            return view
+        while True:
+            with self._lock:
+                flushes = self._flushes.get(worksheet, 0)
+                flushing = worksheet in self._flushing
+            df = self.backend.read(worksheet)
+            with self._lock:
+                if not flushing and worksheet not in self._flushing and self._flushes.get(worksheet, 0) == flushes:
+                    # Nenhuma gravação da planilha durante a leitura: df não contém mutações da fila
+                    self._base[worksheet] = (time.monotonic(), df)
+                    pending = self._pending_for(worksheet)
+                    break
+                entry = self._base.get(worksheet)
+                if entry is not None:
+                    # A leitura cruzou um flush; a base é mantida em dia pelo próprio flush
+                    df, pending = entry[1], self._pending_for(worksheet)
+                    break
+                # Sem base: espera a gravação terminar e lê de novo
+                while worksheet in self._flushing:
+                    self._flushed.wait()
+        return self._apply(df, pending) if pending else df
+
+    def _current_view(self, worksheet):
+        """Visão atual da planilha para contar as linhas afetadas (base + fila; lê o backend só sem base)."""
+        view = self._cached_view(worksheet)
+        return view if view is not None else self.read(worksheet)
+
+    def write(self, worksheet, df):
+        self._enqueue({"kind": "write", "worksheet": worksheet, "columns": list(df.columns), "rows": self._records(df)})
+
+    def insert(self, worksheet, df):
+        if not df.empty:
+            self._enqueue({"kind": "insert", "worksheet": worksheet, "rows": self._records(df)})
+
+    def update_rows(self, worksheet, where, values):
+        # A contagem é feita sobre a visão atual (última leitura do backend + pendentes)
+        _, count = _apply_update(self._current_view(worksheet), where, values)
+        if count:
+            self._enqueue({
+                "kind": "update",
+                "worksheet": worksheet,
+                "where": {c: _to_python(v) for c, v in where.items()},
+                "values": {c: _to_python(v) for c, v in values.items()},
+            })
+        return count
+
+    def delete_rows(self, worksheet, where):
+        _, count = _apply_delete(self._current_view(worksheet), where)
+        if count:
+            self._enqueue({
+                "kind": "delete",
+                "worksheet": worksheet,
+                "where": {c: _to_python(v) for c, v in where.items()},
+            })
+        return count
+
+    def flush(self):
+        """Grava no backend todas as mutações pendentes, uma escrita por planilha."""
+        with self._flush_lock:
+            with self._lock:
+                pending = list(self._pending)
+            if not pending:
+                return
+
+            by_worksheet = {}
+            for mutation in pending:
+                by_worksheet.setdefault(mutation["worksheet"], []).append(mutation)
+
+            now = time.monotonic()
+            for worksheet, mutations in by_worksheet.items():
+                with self._lock:
+                    if self._retry_at.get(worksheet, 0) > now:
+                        continue
+                    last_try = any(self._attempts.get(m["id"], 0) + 1 >= self.max_attempts for m in mutations)
+                # Na última tentativa cada mutação é gravada sozinha: só a que falhar de novo é descartada
+                for group in ([[m] for m in mutations] if last_try else [mutations]):
+                    if not self._flush_worksheet(worksheet, group):
+                        break
+
+    def _flush_worksheet(self, worksheet, mutations):
+        """Grava as mutações da planilha; retorna False se elas continuam na fila para nova tentativa."""
+        with self._lock:
+            self._flushing.add(worksheet)
+            base = self._base.get(worksheet)
+        done, new_base, error = set(), None, None
+        try:
+            if all(m["kind"] == "insert" for m in mutations):
+                self.backend.insert(worksheet, pd.DataFrame([row for m in mutations for row in m["rows"]]))
+                if base is not None:
+                    new_base = (base[0], self._apply(base[1], mutations))
+            else:
+                df = self._apply(self.backend.read(worksheet), mutations)
+                self.backend.write(worksheet, df)
+                new_base = (time.monotonic(), df)
+            done = {m["id"] for m in mutations}
+        except Exception as e:
+            error = e
+            logger.exception("Falha ao gravar %d mutação(ões) em %s", len(mutations), worksheet)
+        finally:
+            # Base e fila trocam juntas, então as leituras nunca veem uma mutação duas vezes
+            with self._lock:
+                if done:
+                    self._pending = [m for m in self._pending if m["id"] not in done]
+                    if new_base is not None:
+                        self._base[worksheet] = new_base
+                    else:
+                        self._base.pop(worksheet, None)
+                    for mutation_id in done:
+                        self._attempts.pop(mutation_id, None)
+                    self._retry_at.pop(worksheet, None)
+                    self._rewrite_journal()
+                elif error is not None:
+                    for m in mutations:
+                        self._attempts[m["id"]] = self._attempts.get(m["id"], 0) + 1
+                    attempts = self._attempts[mutations[0]["id"]]
+                    if attempts >= self.max_attempts:
+                        self._discard_failed(worksheet, mutations, error)
+                        error = None
+                    else:
+                        self._retry_at[worksheet] = time.monotonic() + self.retry_delay * 2 ** (attempts - 1)
+                self._flushing.discard(worksheet)
+                self._flushes[worksheet] = self._flushes.get(worksheet, 0) + 1
+                self._flushed.notify_all()
+        return error is None
+
+    def _discard_failed(self, worksheet, mutations, error):
+        # Chamado com self._lock. A base continua valendo: as mutações nunca chegaram ao backend
+        logger.error("%d mutação(ões) em %s descartadas da fila depois de %d tentativas: %s",
+                     len(mutations), worksheet, self.max_attempts, error)
+        ids = {m["id"] for m in mutations}
+        self._pending = [m for m in self._pending if m["id"] not in ids]
+        failed = [{**m, "tentativas": self._attempts.pop(m["id"]), "erro": str(error), "instante": time.time()}
+                  for m in mutations]
+        self._failed.extend(failed)
+        self._rewrite_journal()
+        if self.journal_path:
+            with open(f"{self.journal_path}.falhas", "a", encoding="utf-8") as f:
+                for mutation in failed:
+                    f.write(json.dumps(mutation, ensure_ascii=False) + "\n")
+
+    def _rewrite_journal(self):
+        if not self.journal_path:
+            return
+        tmp_path = self.journal_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for mutation in self._pending:
+                f.write(json.dumps(mutation, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.journal_path)
+
+    def close(self):
+        """Para a thread de gravação e grava o que ainda está na fila.
+
+        Mutações esperando uma nova tentativa continuam no journal.
+        """
+        self._stop.set()
+        self._worker.join()
+        self.flush()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Erro no flush das escritas pendentes")
+
+
+class InstrumentedStorage(Storage):
+    """Mede as chamadas feitas a outra camada de armazenamento.
+
+    Cada chamada é registrada em `stats` (diagnostics.StorageStats) com a
+    planilha, o tempo, as linhas e a função que a fez. Na camada "app"
+    (sobre o cache compartilhado) as leituras são marcadas como acerto ou
+    falta de cache; na camada "backend" (sobre o Google Sheets / SQLite)
+    também é medido o tamanho em memória dos DataFrames lidos e gravados.
+    """
+
+    def __init__(self, backend, stats, layer):
+        self.backend = backend
+        self.stats = stats
+        self.layer = layer
+        # O tamanho em memória só é medido no backend; acertos/faltas só fazem sentido acima do cache
+        self._on_backend = layer == LAYER_BACKEND
+        self.partitioned = backend.partitioned
+        self.transactional = backend.transactional
+
+    def __getattr__(self, name):
+        # Demais atributos da camada de baixo (ex: flush, pending_count, version)
+        return getattr(self.__dict__["backend"], name)
+
+    def _call(self, operation, worksheet, call, rows_of, written=None, cached=False):
+        before = self.stats.backend_calls()
+        start = time.perf_counter()
+        try:
+            result = call()
+        finally:
+            seconds = time.perf_counter() - start
+        frame = written if written is not None else result
+        self.stats.record(
+            self.layer, operation, worksheet, seconds,
+            rows=rows_of(result),
+            nbytes=frame_size(frame) if self._on_backend else 0,
+            cache=(CACHE_MISS if self.stats.backend_calls() > before else CACHE_HIT) if cached and not self._on_backend else None,
+        )
+        return result
+
+    def read(self, worksheet):
+        return self._call("read", worksheet, lambda: self.backend.read(worksheet), len, cached=True)
+
+    def read_escala(self, worksheet, escala_nome):
+        return self._call("read_escala", worksheet, lambda: self.backend.read_escala(worksheet, escala_nome), len, cached=True)
+
+    def occupancy(self, escala_nome):
+        return self._call("occupancy", "atividades", lambda: self.backend.occupancy(escala_nome), len, cached=True)
+
+    def email_index(self, worksheet):
+        return self._call("email_index", worksheet, lambda: self.backend.email_index(worksheet), len, cached=True)
+
+    def failed_writes(self):
+        return self.backend.failed_writes()
+
+    def write(self, worksheet, df):
+        return self._call("write", worksheet, lambda: self.backend.write(worksheet, df), lambda _: len(df), written=df)
+
+    def insert(self, worksheet, df):
+        return self._call("insert", worksheet, lambda: self.backend.insert(worksheet, df), lambda _: len(df), written=df)
+
+    def update_rows(self, worksheet, where, values):
+        return self._call("update_rows", worksheet, lambda: self.backend.update_rows(worksheet, where, values), int)
+
+    def delete_rows(self, worksheet, where):
+        return self._call("delete_rows", worksheet, lambda: self.backend.delete_rows(worksheet, where), int)
+
+    def reserve_slot(self, escala_nome, numero_rodada, id_atividade, email, nome):
+        return self._call(
+            "reserve_slot", "escolhas",
+            lambda: self.backend.reserve_slot(escala_nome, numero_rodada, id_atividade, email, nome),
+            lambda _: None
+        )
+
+    def skip_turn(self, escala_nome, numero_rodada, email):
+        return self._call("skip_turn", "rodadas", lambda: self.backend.skip_turn(escala_nome, numero_rodada, email), int)
+
+    def run_locked(self, escala_nome, fn):
+        # As chamadas feitas por fn são registradas uma a uma
+        return self.backend.run_locked(escala_nome, fn)
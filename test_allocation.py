@@ -0,0 +1,131 @@
+"""
+Tests for the ballot allocation solvers (allocation.py).
+"""
+import itertools
+import random
+import time
+
+from allocation import min_cost_assignment, serial_dictatorship
+
+
+def _cost(assignment, preferences):
+    return sum(preferences[email].index(id_atividade) for email, id_atividade in assignment)
+
+
+def _brute_force(demand, preferences, capacity):
+    """Best (count, -cost) over every way of handing out ballot entries (tiny inputs only)."""
+    pairs = [(email, a) for email in demand for a in preferences[email] if capacity.get(a, 0) > 0]
+    best = (0, 0)
+    for size in range(len(pairs) + 1):
+        for chosen in itertools.combinations(pairs, size):
+            per_email = {}
+            per_activity = {}
+            for email, a in chosen:
+                per_email[email] = per_email.get(email, 0) + 1
+                per_activity[a] = per_activity.get(a, 0) + 1
+            if all(per_email[e] <= demand[e] for e in per_email) and all(per_activity[a] <= capacity[a] for a in per_activity):
+                best = max(best, (size, -_cost(chosen, preferences)))
+    return best
+
+
+def test_serial_dictatorship_follows_order():
+    """Test that earlier turns get their best remaining choice and nobody gets a duplicate"""
+    print("\n=== Testing Serial Dictatorship ===")
+
+    preferences = {"a": ["x", "y", "z"], "b": ["x", "y"], "c": ["x"]}
+    capacity = {"x": 1, "y": 2, "z": 1}
+    assignment = serial_dictatorship(["a", "b", "c", "a"], preferences, capacity)
+    print(assignment)
+    assert assignment == [("a", "x"), ("b", "y"), ("a", "y")], "Each turn should take the best remaining ballot entry"
+
+    assignment = serial_dictatorship(["a"], preferences, capacity, taken={"a": {"x"}})
+    assert assignment == [("a", "y")], "Activities the participant already holds should be skipped"
+
+    print("✅ Serial dictatorship test passed!")
+    return True
+
+
+def test_min_cost_assignment_is_optimal():
+    """Test the optimal solver against brute force on small random ballots"""
+    print("\n=== Testing Optimal Assignment ===")
+
+    # Serial order gives "a" its first choice and leaves "b" with nothing; the optimum serves both
+    preferences = {"a": ["x", "y"], "b": ["x"]}
+    assignment = min_cost_assignment({"a": 1, "b": 1}, preferences, {"x": 1, "y": 1})
+    assert sorted(assignment) == [("a", "y"), ("b", "x")], assignment
+
+    rng = random.Random(0)
+    for _ in range(150):
+        activities = [f"a{i}" for i in range(rng.randint(1, 4))]
+        capacity = {a: rng.randint(0, 2) for a in activities}
+        demand = {f"p{i}": rng.randint(0, 2) for i in range(rng.randint(1, 3))}
+        preferences = {email: rng.sample(activities, rng.randint(0, len(activities))) for email in demand}
+
+        assignment = min_cost_assignment(demand, preferences, capacity)
+        assert len(set(assignment)) == len(assignment), "No participant should get the same activity twice"
+        for a in activities:
+            assert sum(1 for _, b in assignment if b == a) <= capacity[a], "Capacity should be respected"
+        assert (len(assignment), -_cost(assignment, preferences)) == _brute_force(demand, preferences, capacity), \
+            f"Solver should match brute force for {demand} {preferences} {capacity}"
+
+    print("✅ Optimal assignment test passed!")
+    return True
+
+
+def test_solvers_scale():
+    """Test that hundreds of participants x thousands of slots solve in seconds"""
+    print("\n=== Testing Solver Scale ===")
+
+    rng = random.Random(1)
+    activities = [f"a{i}" for i in range(300)]
+    capacity = {a: 10 for a in activities}
+    demand = {f"p{i}": 10 for i in range(300)}
+    weights = [1 / (i + 1) ** 0.7 for i in range(len(activities))]
+    preferences = {email: list(dict.fromkeys(rng.choices(activities, weights=weights, k=150)))[:60] for email in demand}
+
+    start = time.perf_counter()
+    optimal = min_cost_assignment(demand, preferences, capacity)
+    elapsed = time.perf_counter() - start
+    order = [email for _ in range(10) for email in demand]
+    serial = serial_dictatorship(order, preferences, capacity)
+    print(f"optimal: {len(optimal)} slots in {elapsed:.2f}s, cost {_cost(optimal, preferences)}; serial cost {_cost(serial, preferences)}")
+
+    assert len(optimal) >= len(serial), "The optimum should fill at least as many slots from the ballots"
+    assert _cost(optimal, preferences) <= _cost(serial, preferences) or len(optimal) > len(serial)
+    assert elapsed < 10, "300 participants x 3000 slots should solve in seconds"
+
+    print("✅ Solver scale test passed!")
+    return True
+
+
+def run_all_tests():
+    """Run all allocation tests"""
+    print("Starting allocation tests...\n")
+
+    tests = [
+        test_serial_dictatorship_follows_order,
+        test_min_cost_assignment_is_optimal,
+        test_solvers_scale
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            result = test()
+            results.append(result)
+        except Exception as e:
+            print(f"❌ Test failed with error: {e}")
+            results.append(False)
+
+    print("\n" + "="*50)
+    if all(results):
+        print("✅ All allocation tests passed successfully!")
+        return True
+    else:
+        print("❌ Some tests failed")
+        return False
+
+
+if __name__ == "__main__":
+    success = run_all_tests()
+    exit(0 if success else 1)
@@ -0,0 +1,600 @@
+"""
+Tests for the data functions (database.py).
+Runs them against an in-memory SQLite backend instead of Google Sheets.
+"""
+import io
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+import database
+from archive import EscalaArchive
+from events import EventBus, turn_channel
+from passwords import PasswordHasher, hash_rounds
+from scheduler import TurnScheduler
+from storage import CachedStorage, SQLiteStorage
+
+ADMIN_EMAIL = "admin@email.com"
+
+
+def _init_db():
+    """Point the data functions at a fresh in-memory database"""
+    db = SQLiteStorage(":memory:")
+    database.init(db, ADMIN_EMAIL)
+    return db
+
+
+def test_activity_interval_overnight():
+    """Test that overnight shifts end on the next day"""
+    print("\n=== Testing Activity Interval ===")
+
+    inicio, fim = database.activity_interval("31/12/2025", "19:00-07:00")
+    print(inicio, fim)
+    assert inicio == datetime(2025, 12, 31, 19, 0), "Start should be on the activity date"
+    assert fim == datetime(2026, 1, 1, 7, 0), "Overnight shift should end on the next day"
+
+    inicio, fim = database.activity_interval("2025-12-01", "08:00-12:00")
+    assert (inicio, fim) == (datetime(2025, 12, 1, 8, 0), datetime(2025, 12, 1, 12, 0)), "ISO dates should be accepted"
+
+    assert database.activity_interval("data inválida", "08:00-12:00") == (None, None), "Invalid dates should not raise"
+
+    print("✅ Activity interval test passed!")
+    return True
+
+
+def test_bulk_ingest_stores_sort_keys():
+    """Test that bulk ingest parses mixed date formats row by row and stores start/end"""
+    print("\n=== Testing Bulk Ingest Sort Keys ===")
+
+    db = _init_db()
+    df_new = pd.DataFrame({
+        'tipo': ['Plantão', 'Ambulatório', 'Enfermaria', 'Plantão'],
+        'data': ['15/12/2025', '2025-12-01', '10/12/2025', '01/12/2025'],
+        'horario': ['19:00-07:00', '08:00-12:00', '13:00-18:00', '07:00-19:00'],
+        'vagas': [2, 1, 1, 2],
+        'observacoes': ['', '', '', '']
+    })
+    success, message = database.add_atividades_bulk("Dez/2025", df_new)
+    assert success, message
+
+    stored = db.read("atividades")
+    print(stored[['data', 'horario', 'inicio', 'fim']])
+    assert stored['inicio'].notna().all(), "Every row should get a start time, whatever its date format"
+    assert stored.loc[stored['data'] == '15/12/2025', 'fim'].iloc[0] == '2025-12-16 07:00', \
+        "Overnight shift should end on the next day"
+
+    df_escala = database.get_escala_completa("Dez/2025")
+    print(df_escala[['Tipo', 'Data', 'Horário']])
+    assert df_escala['Data'].tolist() == ['01/12/2025', '01/12/2025', '10/12/2025', '15/12/2025'], \
+        "Dates should be formatted dd/mm/YYYY and sorted"
+    assert df_escala['Horário'].tolist()[:2] == ['07:00-19:00', '08:00-12:00'], "Same-day rows should sort by start time"
+
+    print("✅ Bulk ingest sort keys test passed!")
+    return True
+
+
+def test_archive_escala():
+    """Test that archiving moves a closed escala out of the live tables and keeps it queryable"""
+    print("\n=== Testing Escala Archive ===")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = CachedStorage(SQLiteStorage(":memory:"))
+        database.init(db, ADMIN_EMAIL, EscalaArchive(tmp))
+        for escala in ["Nov/2025", "Dez/2025"]:
+            database.add_atividades_bulk(escala, pd.DataFrame({
+                'tipo': ['Plantão'], 'data': ['01/12/2025'], 'horario': ['07:00-19:00'], 'vagas': [1], 'observacoes': ['']
+            }))
+        db.insert("usuarios", pd.DataFrame([{"nome": "Ana", "matricula": "1", "email": "a@x.com", "senha_hash": ""}]))
+        database.create_new_round("Nov/2025")
+        id_atividade = db.read_escala("atividades", "Nov/2025")['id_atividade'].iloc[0]
+
+        database.create_new_round("Dez/2025")
+        success, message = database.archive_escala("Dez/2025")
+        assert not success, "An escala with a pending turn should not be archived"
+
+        success, message = database.make_choice("Nov/2025", "a@x.com", "Ana", id_atividade)
+        assert success, message
+        before = database.get_escala_completa("Nov/2025")
+        success, message = database.archive_escala("Nov/2025")
+        print(message)
+        assert success, message
+
+        for worksheet in ["atividades", "rodadas", "escolhas"]:
+            assert db.read_escala(worksheet, "Nov/2025").empty, f"{worksheet} should no longer hold the archived escala"
+        assert len(db.read_escala("atividades", "Dez/2025")) == 1, "Other escalas should stay live"
+
+        assert database.get_archived_escalas() == ["Nov/2025"]
+        after = database.get_escala_arquivada("Nov/2025")
+        print(after)
+        assert after.equals(before), "The archived escala should read back exactly as it was shown live"
+
+        # A new live escala reusing the archived name must not overwrite the archive
+        database.add_atividades_bulk("Nov/2025", pd.DataFrame({
+            'tipo': ['Ambulatório'], 'data': ['02/11/2025'], 'horario': ['08:00-12:00'], 'vagas': [3], 'observacoes': ['']
+        }))
+        success, message = database.archive_escala("Nov/2025")
+        print(message)
+        assert not success, "An escala name already in the archive should be refused"
+        assert len(db.read_escala("atividades", "Nov/2025")) == 1, "The refused escala should stay live"
+        assert database.get_escala_arquivada("Nov/2025").equals(before), "The existing archive should be untouched"
+
+    print("✅ Escala archive test passed!")
+    return True
+
+
+def test_turn_changes_are_published():
+    """Test that new rounds and picks publish a turn change for their escala"""
+    print("\n=== Testing Turn Events ===")
+
+    bus = EventBus()
+    database.init(SQLiteStorage(":memory:"), ADMIN_EMAIL, events=bus)
+    received = []
+    bus.subscribe(turn_channel("Dez/2025"), lambda seq, event: received.append(event))
+
+    database.add_atividades_bulk("Dez/2025", pd.DataFrame({
+        'tipo': ['Plantão'], 'data': ['01/12/2025'], 'horario': ['07:00-19:00'], 'vagas': [2], 'observacoes': ['']
+    }))
+    database._get_db().insert("usuarios", pd.DataFrame([
+        {"nome": "Ana", "matricula": "1", "email": "a@x.com", "senha_hash": ""},
+        {"nome": "Bia", "matricula": "2", "email": "b@x.com", "senha_hash": ""},
+    ]))
+    assert database.turn_sequence("Dez/2025") == 0, "Adding activities should not publish"
+
+    database.create_new_round("Dez/2025")
+    turn = database.get_current_turn("Dez/2025")
+    id_atividade = database.get_available_activities("Dez/2025")['id_atividade'].iloc[0]
+    other = "b@x.com" if turn == "a@x.com" else "a@x.com"
+    success, _ = database.make_choice("Dez/2025", other, "X", id_atividade)
+    assert not success and database.turn_sequence("Dez/2025") == 1, "A rejected pick should not publish"
+
+    success, message = database.make_choice("Dez/2025", turn, "X", id_atividade)
+    assert success, message
+    success, message = database.make_choice("Dez/2025", other, "Y", id_atividade)
+    assert success, message
+    print(received)
+    assert received == [{"escala_nome": "Dez/2025", "numero_rodada": 1}] * 3, "Round creation and each pick should publish"
+    assert database.turn_sequence("Dez/2025") == 3
+
+    print("✅ Turn events test passed!")
+    return True
+
+
+def test_expired_turns_are_skipped_or_auto_picked():
+    """Test that an expired deadline advances the turn on its own"""
+    print("\n=== Testing Turn Deadlines ===")
+
+    now = [1000.0]
+    bus = EventBus()
+    scheduler = TurnScheduler(database.expire_turn, clock=lambda: now[0])
+    database.init(CachedStorage(SQLiteStorage(":memory:")), ADMIN_EMAIL, events=bus, scheduler=scheduler)
+    bus.subscribe(None, lambda seq, event: database.schedule_turn_deadline(event["escala_nome"]))
+
+    database.add_atividades_bulk("Dez/2025", pd.DataFrame({
+        'tipo': ['Plantão', 'Ambulatório'], 'data': ['02/12/2025', '01/12/2025'],
+        'horario': ['07:00-19:00', '08:00-12:00'], 'vagas': [1, 1], 'observacoes': ['', '']
+    }))
+    database._get_db().insert("usuarios", pd.DataFrame([
+        {"nome": "Ana", "matricula": "1", "email": "a@x.com", "senha_hash": ""},
+        {"nome": "Bia", "matricula": "2", "email": "b@x.com", "senha_hash": ""},
+    ]))
+    success, message = database.set_rules("Dez/2025", prazo_minutos=10)
+    assert success, message
+    database.create_new_round("Dez/2025")
+    first = database.get_current_turn("Dez/2025")
+    assert database.get_turn_deadline("Dez/2025") == datetime.fromtimestamp(1600.0), "The first turn should get a 10 minute deadline"
+
+    now[0] += 599
+    assert scheduler.run_pending() == 0, "The turn should not expire early"
+    now[0] += 1
+    assert scheduler.run_pending() == 1
+    second = database.get_current_turn("Dez/2025")
+    assert second not in (None, first), "The idle participant should be skipped"
+    order = database.get_round_order("Dez/2025")
+    print(order)
+    assert order.loc[order['Email'] == first, 'Status'].iloc[0].startswith('⏭️'), "The skip should show in the round order"
+
+    # With the default pick, the earliest available activity is chosen for the idle participant
+    database.set_rules("Dez/2025", prazo_minutos=5, acao_prazo=database.DEADLINE_DEFAULT_PICK)
+    now[0] += 300
+    scheduler.run_pending()
+    choices = database.get_user_choices("Dez/2025", second)
+    print(choices[['email_participante', 'data']])
+    assert choices['data'].tolist() == ['01/12/2025'], "The default pick should be the earliest activity"
+    assert database.get_current_turn("Dez/2025") is None and database.get_turn_deadline("Dez/2025") is None, \
+        "No deadline should remain once everyone is done"
+
+    print("✅ Turn deadlines test passed!")
+    return True
+
+
+def test_planned_rounds_roll_over():
+    """Test that planned rounds follow the order mode and start right after the previous one"""
+    print("\n=== Testing Planned Rounds ===")
+
+    participants = ["a@x.com", "b@x.com", "c@x.com"]
+    first = database.next_round_order(participants, [], 1, database.ORDER_SNAKE)
+    assert sorted(first) == participants, "The first round should be a shuffle of everyone"
+    assert database.next_round_order(participants, first, 2, database.ORDER_SNAKE) == first[::-1], "Snake should reverse every round"
+    assert database.next_round_order(participants, first, 2, database.ORDER_REVERSE) == first[::-1], "Reverse should mirror the first round of each pair"
+    assert sorted(database.next_round_order(participants, first, 3, database.ORDER_REVERSE)) == participants
+    assert database.next_round_order(participants + ["d@x.com"], first, 2, database.ORDER_SNAKE)[:3] == first[::-1], \
+        "New participants should be appended after the continued order"
+
+    _init_db()
+    database.add_atividades_bulk("Dez/2025", pd.DataFrame({
+        'tipo': ['Plantão'], 'data': ['01/12/2025'], 'horario': ['07:00-19:00'], 'vagas': [10], 'observacoes': ['']
+    }))
+    database._get_db().insert("usuarios", pd.DataFrame([
+        {"nome": email, "matricula": str(i), "email": email, "senha_hash": ""} for i, email in enumerate(participants)
+    ]))
+    database.set_rules("Dez/2025", total_rodadas=3, modo_ordem=database.ORDER_SNAKE)
+    success, message = database.create_new_round("Dez/2025")
+    print(message)
+    assert success and "1 a 3" in message, message
+    id_atividade = database.get_available_activities("Dez/2025")['id_atividade'].iloc[0]
+
+    picks = []
+    while database.get_current_turn("Dez/2025") is not None:
+        turn = database.get_current_turn("Dez/2025")
+        picks.append((int(database.get_current_round("Dez/2025")['numero_rodada']), turn))
+        success, message = database.make_choice("Dez/2025", turn, turn, id_atividade)
+        assert success, message
+    print(picks)
+    order = [email for _, email in picks]
+    assert [n for n, _ in picks] == [1] * 3 + [2] * 3 + [3] * 3, "Each round should start as soon as the previous one ends"
+    assert order[3:6] == order[:3][::-1] and order[6:] == order[:3], "Snake order should alternate between rounds"
+    assert int(database.get_current_round("Dez/2025")['numero_rodada']) == 3, "After the last round, the current round is the last one"
+
+    print("✅ Planned rounds test passed!")
+    return True
+
+
+def test_ballot_distribution():
+    """Test that ballots fill every pending turn in one pass, falling back to chronological order"""
+    print("\n=== Testing Ballot Distribution ===")
+
+    participants = ["a@x.com", "b@x.com"]
+    _init_db()
+    database.add_atividades_bulk("Dez/2025", pd.DataFrame({
+        'tipo': ['Plantão', 'Plantão', 'Plantão'],
+        'data': ['03/12/2025', '01/12/2025', '02/12/2025'],
+        'horario': ['07:00-19:00'] * 3,
+        'vagas': [1, 1, 1],
+        'observacoes': [''] * 3
+    }))
+    database._get_db().insert("usuarios", pd.DataFrame([
+        {"nome": email, "matricula": str(i), "email": email, "senha_hash": ""} for i, email in enumerate(participants)
+    ]))
+    ids = database._get_db().read_escala("atividades", "Dez/2025").set_index('data')['id_atividade'].to_dict()
+    database.set_rules("Dez/2025", modo_escolha=database.CHOICE_BALLOT, total_rodadas=2)
+    success, message = database.create_new_round("Dez/2025")
+    assert success, message
+
+    # Both want 03/12; only "a" lists a second option, "b" must be filled from the calendar
+    database.save_preferences("Dez/2025", "a@x.com", [ids['03/12/2025'], ids['02/12/2025'], "inexistente"])
+    database.save_preferences("Dez/2025", "b@x.com", [ids['03/12/2025']])
+    assert database.get_user_preferences("Dez/2025", "a@x.com") == [ids['03/12/2025'], ids['02/12/2025']], \
+        "Unknown activities should be dropped from the ballot"
+    assert database.count_ballots("Dez/2025") == 2
+
+    success, message = database.run_ballot("Dez/2025", database.BALLOT_OPTIMAL)
+    print(message)
+    assert success, message
+
+    df_escolhas = database._get_db().read_escala("escolhas", "Dez/2025")
+    received = df_escolhas.groupby('email_participante')['id_atividade'].apply(set).to_dict()
+    print(received)
+    assert len(df_escolhas) == 3, "Three vagas for four turns: every vaga should be handed out"
+    assert df_escolhas['id_atividade'].is_unique, "No activity should exceed its vagas"
+    assert all(len(ids_) == len(df_escolhas[df_escolhas['email_participante'] == email]) for email, ids_ in received.items()), \
+        "Nobody should receive the same activity twice"
+    assert ids['03/12/2025'] in received['b@x.com'] or ids['02/12/2025'] in received['a@x.com'], \
+        "The optimum should serve both first choices it can"
+    assert database.get_current_turn("Dez/2025") is None, "Every pending turn should be closed"
+    df_rounds = database._get_db().read_escala("rodadas", "Dez/2025")
+    assert int(df_rounds['pulado'].sum()) == 1, "The turn left without vagas should be marked as skipped"
+
+    print("✅ Ballot distribution test passed!")
+    return True
+
+
+class SlowRoundsStorage(SQLiteStorage):
+    """SQLite backend that takes a while to read the turns, so concurrent callers overlap"""
+
+    def read_escala(self, worksheet, escala_nome):
+        if worksheet == "rodadas":
+            time.sleep(0.2)
+        return super().read_escala(worksheet, escala_nome)
+
+
+class SlowRoundsLockStorage(SlowRoundsStorage):
+    """Same backend without its own transaction, so the cache falls back to the process lock"""
+    transactional = False
+
+
+def test_concurrent_ballots_do_not_overbook():
+    """Test that two ballot runs at the same time do not hand out the same vagas twice"""
+    print("\n=== Testing Concurrent Ballots ===")
+
+    for db in [SlowRoundsStorage(":memory:"), CachedStorage(SlowRoundsStorage(":memory:")),
+               CachedStorage(SlowRoundsLockStorage(":memory:"))]:
+        database.init(db, ADMIN_EMAIL)
+        database.add_atividades_bulk("Dez/2025", pd.DataFrame({
+            'tipo': ['Plantão'] * 3, 'data': ['01/12/2025', '02/12/2025', '03/12/2025'],
+            'horario': ['07:00-19:00'] * 3, 'vagas': [1, 1, 1], 'observacoes': [''] * 3
+        }))
+        db.insert("usuarios", pd.DataFrame([
+            {"nome": email, "matricula": str(i), "email": email, "senha_hash": ""} for i, email in enumerate(["a@x.com", "b@x.com"])
+        ]))
+        database.set_rules("Dez/2025", modo_escolha=database.CHOICE_BALLOT, total_rodadas=2)
+        assert database.create_new_round("Dez/2025")[0]
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(database.run_ballot("Dez/2025"))) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        print(type(db).__name__, results)
+
+        assert sorted(success for success, _ in results) == [False, True], "Only one run should find the pending turns"
+        df_escolhas = db.read_escala("escolhas", "Dez/2025")
+        assert len(df_escolhas) == 3 and df_escolhas['id_atividade'].is_unique, "No activity should exceed its vagas"
+        assert database.get_current_turn("Dez/2025") is None
+
+    print("✅ Concurrent ballots test passed!")
+    return True
+
+
+def test_participant_schedules():
+    """Test that every participant's personal schedule comes from one join, in chronological order"""
+    print("\n=== Testing Participant Schedules ===")
+
+    _init_db()
+    assert database.get_participant_schedules("Dez/2025").empty
+    database.add_atividades_bulk("Dez/2025", pd.DataFrame({
+        'tipo': ['Plantão', 'Ambulatório'], 'data': ['02/12/2025', '01/12/2025'],
+        'horario': ['07:00-19:00', '08:00-12:00'], 'vagas': [2, 2], 'observacoes': ['', 'Sala 3']
+    }))
+    ids = database._get_db().read_escala("atividades", "Dez/2025").set_index('data')['id_atividade'].to_dict()
+    database._get_db().insert("escolhas", pd.DataFrame([
+        {"escala_nome": "Dez/2025", "id_atividade": ids['02/12/2025'], "email_participante": "b@x.com", "nome_participante": "Bruna"},
+        {"escala_nome": "Dez/2025", "id_atividade": ids['02/12/2025'], "email_participante": "a@x.com", "nome_participante": "Ana"},
+        {"escala_nome": "Dez/2025", "id_atividade": ids['01/12/2025'], "email_participante": "a@x.com", "nome_participante": "Ana"},
+    ]))
+
+    df = database.get_participant_schedules("Dez/2025")
+    print(df)
+    assert list(df.columns) == ['email_participante', 'nome_participante', 'Tipo', 'Data', 'Horário', 'Observações']
+    assert list(df['nome_participante']) == ['Ana', 'Ana', 'Bruna'], "Participants should be grouped by name"
+    assert list(df[df['email_participante'] == 'a@x.com']['Data']) == ['01/12/2025', '02/12/2025'], "Each schedule should be chronological"
+    assert database.format_personal_schedule(database.get_user_choices("Dez/2025", "a@x.com")).columns.tolist() == \
+        ['Tipo', 'Data', 'Horário', 'Observações'], "Minha Escala should show the same columns"
+
+    print("✅ Participant schedules test passed!")
+    return True
+
+
+def test_workbook_sheets_cover_live_and_archived_escalas():
+    """Test that the multi-escala export yields one sheet per escala or per participant"""
+    print("\n=== Testing Workbook Sheets ===")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = CachedStorage(SQLiteStorage(":memory:"))
+        database.init(db, ADMIN_EMAIL, EscalaArchive(tmp))
+        for escala, data in [("Nov/2025", "01/11/2025"), ("Dez/2025", "01/12/2025")]:
+            database.add_atividades_bulk(escala, pd.DataFrame({
+                'tipo': ['Plantão'], 'data': [data], 'horario': ['07:00-19:00'], 'vagas': [2], 'observacoes': ['']
+            }))
+            id_atividade = db.read_escala("atividades", escala)['id_atividade'].iloc[0]
+            db.insert("escolhas", pd.DataFrame([
+                {"escala_nome": escala, "id_atividade": id_atividade, "email_participante": email, "nome_participante": nome}
+                for email, nome in [("b@x.com", "Bruna"), ("a@x.com", "Ana")]
+            ]))
+        success, message = database.archive_escala("Nov/2025")
+        assert success, message
+        assert database.get_escalas() == ["Dez/2025"], "Archived escalas are no longer live"
+
+        sheets = list(database.iter_workbook_sheets(["Nov/2025", "Dez/2025"]))
+        print([(nome, info) for nome, _, info in sheets])
+        assert [nome for nome, _, _ in sheets] == ["Nov/2025", "Dez/2025"], "Archived escalas should be exported too"
+        assert sheets[0][2]["Escolhas"] == 2 and sheets[0][2]["Participantes"] == 2
+        assert list(sheets[0][1].columns) == database.ESCALA_COLUMNS
+
+        sheets = list(database.iter_workbook_sheets(["Nov/2025", "Dez/2025"], por=database.WORKBOOK_BY_PARTICIPANT))
+        print([(nome, df.to_dict('records')) for nome, df, _ in sheets])
+        assert [nome for nome, _, _ in sheets] == ["Ana", "Bruna"], "One sheet per participant, ordered by name"
+        assert list(sheets[0][1]['Escala']) == ["Nov/2025", "Dez/2025"]
+        assert sheets[0][2] == {"Participante": "Ana", "Email": "a@x.com", "Escalas": 2}
+
+        # Batches smaller than the participant count produce the same sheets
+        batch, database.WORKBOOK_PARTICIPANT_BATCH = database.WORKBOOK_PARTICIPANT_BATCH, 1
+        try:
+            batched = list(database.iter_workbook_sheets(["Nov/2025", "Dez/2025"], por=database.WORKBOOK_BY_PARTICIPANT))
+        finally:
+            database.WORKBOOK_PARTICIPANT_BATCH = batch
+        assert [(nome, info) for nome, _, info in batched] == [(nome, info) for nome, _, info in sheets]
+        assert all(a.equals(b) for (_, a, _), (_, b, _) in zip(batched, sheets)), "Batching should not change the sheets"
+
+    print("✅ Workbook sheets test passed!")
+    return True
+
+
+def test_user_lookup_and_whitelist_ignore_case():
+    """Test that login, registration and whitelist checks match emails regardless of case and spaces"""
+    print("\n=== Testing User Lookup ===")
+
+    db = CachedStorage(SQLiteStorage(":memory:"))
+    database.init(db, ADMIN_EMAIL)
+    assert database.add_allowed_email("Ana@X.com")[0]
+    assert not database.add_allowed_email("ana@x.com ")[0], "Whitelist duplicates should be detected after normalizing"
+    assert database.is_email_allowed(" ANA@x.com") and not database.is_email_allowed("bruno@x.com")
+
+    success, message = database.register_user("Ana", "1", " Ana@X.com", "senha")
+    assert success, message
+    assert not database.register_user("Ana", "1", "ANA@x.com", "senha")[0], "The same email in another case is already taken"
+    assert not database.register_user("Bruno", "2", "bruno@x.com", "senha")[0], "Emails outside the whitelist are refused"
+
+    user = database.get_user_data(" Ana@X.com ")
+    print(user)
+    assert user['nome'] == "Ana" and user['email'] == "ana@x.com"
+    assert database.get_user_data("bruno@x.com") is None
+
+    # Emails are stored normalized, so exact comparisons agree with the index
+    assert database.register_user_oauth("Carla", "Carla@X.com")[0] is False, "OAuth registration also checks the whitelist"
+    assert database.register_user("Admin", "0", " Admin@Email.com", "senha")[0], "The admin email is recognized in any case"
+    assert sorted(db.read("usuarios")['email']) == ["admin@email.com", "ana@x.com"], "New users should be stored normalized"
+    assert sorted(db.read("emails_permitidos")['email']) == ["ana@x.com"]
+    success, message = database.create_new_round("Dez/2025")
+    assert success, message
+    assert list(db.read_escala("rodadas", "Dez/2025")['email_participante']) == ["ana@x.com"], "The admin is not a participant"
+
+    print("✅ User lookup test passed!")
+    return True
+
+
+class WriteCountingStorage(SQLiteStorage):
+    """In-memory SQLite backend that counts the writes sent to each worksheet"""
+
+    def __init__(self):
+        super().__init__(":memory:")
+        self.writes = []
+
+    def insert(self, worksheet, df):
+        self.writes.append(("insert", worksheet, len(df)))
+        super().insert(worksheet, df)
+
+    def write(self, worksheet, df):
+        self.writes.append(("write", worksheet, len(df)))
+        super().write(worksheet, df)
+
+
+def test_bulk_whitelist_import_and_removal():
+    """Test that a pasted/CSV whitelist is normalized, deduplicated and stored in one write"""
+    print("\n=== Testing Bulk Whitelist ===")
+
+    db = WriteCountingStorage()
+    database.init(CachedStorage(db), ADMIN_EMAIL)
+    database.add_allowed_email("ana@x.com")
+
+    emails, invalid = database.extract_emails(
+        "nome,email\nAna,Ana@X.com\nBruno,bruno@x.com\n\"Carla\";<carla@x.com>\nDani,dani@\nbruno@x.com"
+    )
+    print(emails, invalid)
+    assert emails == ["ana@x.com", "bruno@x.com", "carla@x.com"], "Headers and names are ignored, duplicates dropped"
+    assert invalid == ["dani@"]
+
+    db.writes.clear()
+    success, message = database.add_allowed_emails_bulk(emails)
+    print(message)
+    assert success and db.writes == [("insert", "emails_permitidos", 2)], "Only new emails, in a single insert"
+    assert database.get_allowed_emails() == ["ana@x.com", "bruno@x.com", "carla@x.com"]
+    assert not database.add_allowed_emails_bulk(["BRUNO@x.com"])[0], "Existing emails are not added again"
+
+    db.writes.clear()
+    success, message = database.remove_allowed_emails(["Ana@x.com", "carla@x.com", "zeca@x.com"])
+    print(message)
+    assert success and db.writes == [("write", "emails_permitidos", 1)], "Removal should rewrite the sheet once"
+    assert database.get_allowed_emails() == ["bruno@x.com"]
+    assert not database.is_email_allowed("carla@x.com")
+    assert not database.remove_allowed_emails(["zeca@x.com"])[0]
+
+    print("✅ Bulk whitelist test passed!")
+    return True
+
+
+def test_roster_provisioning():
+    """Test that a roster file whitelists and creates accounts in one write each"""
+    print("\n=== Testing Roster Provisioning ===")
+
+    db = WriteCountingStorage()
+    database.init(CachedStorage(db), ADMIN_EMAIL, hasher=PasswordHasher(rounds=5))
+    database.add_allowed_email("ana@x.com")
+    assert database.register_user("Ana", "1", "ana@x.com", "senha")[0]
+
+    csv = "Nome Completo;Matrícula;E-mail\nAna;1;ana@x.com\nBruno;2; Bruno@X.com\nCarla;3;carla@x.com\nSem Email;4;\nBruno;2;bruno@x.com\n"
+    df_roster = database.read_roster(csv.encode("utf-8"), "turma.csv")
+    assert list(df_roster.columns) == database.ROSTER_COLUMNS, "Accented and alternative headers should be recognized"
+
+    excel = io.BytesIO()
+    df_roster.rename(columns={'matricula': 'Matrícula', 'nome': 'Nome', 'email': 'Email'}).to_excel(excel, index=False)
+    assert database.read_roster(excel.getvalue(), "turma.xlsx").equals(df_roster), "Excel rosters should read the same"
+    try:
+        database.read_roster(b"nome,email\nAna,ana@x.com\n", "turma.csv")
+        assert False, "A roster without matricula should be rejected"
+    except ValueError as e:
+        print(e)
+
+    db.writes.clear()
+    initial_rounds = database.INITIAL_PASSWORD_ROUNDS
+    database.INITIAL_PASSWORD_ROUNDS = 4
+    try:
+        success, message, credentials = database.provision_users(df_roster)
+    finally:
+        database.INITIAL_PASSWORD_ROUNDS = initial_rounds
+    print(message)
+    print(credentials)
+    assert success
+    assert db.writes == [("insert", "emails_permitidos", 2), ("insert", "usuarios", 2)], "One batch write per sheet"
+    assert list(credentials['email']) == ["bruno@x.com", "carla@x.com"], "Existing users, blanks and repeats are skipped"
+    assert list(credentials.columns) == database.CREDENTIAL_COLUMNS
+
+    user = database.get_user_data("bruno@x.com")
+    assert user['nome'] == "Bruno" and user['matricula'] == "2"
+    assert hash_rounds(user['senha_hash']) == 4, "Initial passwords use the cheaper cost"
+    assert database.check_user_password("bruno@x.com", credentials.iloc[0]['senha_inicial'], user['senha_hash']), \
+        "The initial password should log in"
+    assert hash_rounds(database.get_user_data("bruno@x.com")['senha_hash']) == 5, "The first login upgrades the cost"
+    assert database.is_email_allowed("carla@x.com")
+
+    success, message, credentials = database.provision_users(df_roster)
+    assert not success and credentials.empty, "Importing the same roster again changes nothing"
+
+    print("✅ Roster provisioning test passed!")
+    return True
+
+
+def run_all_tests():
+    """Run all database tests"""
+    print("Starting database tests...\n")
+
+    tests = [
+        test_activity_interval_overnight,
+        test_bulk_ingest_stores_sort_keys,
+        test_archive_escala,
+        test_turn_changes_are_published,
+        test_expired_turns_are_skipped_or_auto_picked,
+        test_planned_rounds_roll_over,
+        test_ballot_distribution,
+        test_concurrent_ballots_do_not_overbook,
+        test_participant_schedules,
+        test_workbook_sheets_cover_live_and_archived_escalas,
+        test_user_lookup_and_whitelist_ignore_case,
+        test_bulk_whitelist_import_and_removal,
+        test_roster_provisioning
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            result = test()
+            results.append(result)
+        except Exception as e:
+            print(f"❌ Test failed with error: {e}")
+            results.append(False)
+
+    print("\n" + "="*50)
+    if all(results):
+        print("✅ All database tests passed successfully!")
+        return True
+    else:
+        print("❌ Some tests failed")
+        return False
+
+
+if __name__ == "__main__":
+    success = run_all_tests()
+    exit(0 if success else 1)
@@ -0,0 +1,80 @@
+"""
+Tests for the in-process event channel (events.py).
+"""
+import threading
+
+from events import EventBus, turn_channel
+
+
+def test_publish_notifies_subscribers():
+    """Test that subscribers receive events in order and can unsubscribe"""
+    print("\n=== Testing Event Publish/Subscribe ===")
+
+    bus = EventBus()
+    received = []
+    unsubscribe = bus.subscribe(turn_channel("Dez/2025"), lambda seq, event: received.append((seq, event)))
+    bus.subscribe(turn_channel("Dez/2025"), lambda seq, event: 1 / 0)  # a failing subscriber must not block others
+
+    bus.publish(turn_channel("Dez/2025"), {"numero_rodada": 1})
+    bus.publish(turn_channel("Nov/2025"), {"numero_rodada": 3})
+    bus.publish(turn_channel("Dez/2025"), {"numero_rodada": 2})
+    print(received)
+    assert received == [(1, {"numero_rodada": 1}), (2, {"numero_rodada": 2})], "Only events of the subscribed channel should arrive"
+    assert bus.sequence(turn_channel("Nov/2025")) == 1, "Channels should be counted separately"
+    assert bus.last(turn_channel("Dez/2025")) == {"numero_rodada": 2}
+
+    unsubscribe()
+    bus.publish(turn_channel("Dez/2025"), {"numero_rodada": 3})
+    assert len(received) == 2, "Unsubscribed callbacks should not be called"
+
+    print("✅ Event publish/subscribe test passed!")
+    return True
+
+
+def test_wait_returns_on_publish():
+    """Test that a waiter wakes up as soon as an event is published"""
+    print("\n=== Testing Event Wait ===")
+
+    bus = EventBus()
+    channel = turn_channel("Dez/2025")
+    assert bus.wait(channel, 0, timeout=0.01) == 0, "Wait should time out when nothing is published"
+
+    timer = threading.Timer(0.05, bus.publish, args=(channel, {}))
+    timer.start()
+    assert bus.wait(channel, 0, timeout=5) == 1, "Wait should return the new sequence"
+    timer.join()
+
+    print("✅ Event wait test passed!")
+    return True
+
+
+def run_all_tests():
+    """Run all event tests"""
+    print("Starting event tests...\n")
+
+    tests = [
+        test_publish_notifies_subscribers,
+        test_wait_returns_on_publish
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            result = test()
+            results.append(result)
+        except Exception as e:
+            print(f"❌ Test failed with error: {e}")
+            results.append(False)
+
+    print("\n" + "="*50)
+    if all(results):
+        print("✅ All event tests passed successfully!")
+        return True
+    else:
+        print("❌ Some tests failed")
+        return False
+
+
+if __name__ == "__main__":
+    success = run_all_tests()
+    exit(0 if success else 1)
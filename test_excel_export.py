@@ -0,0 +1,125 @@
+"""
+Test script for Excel export functionality (exports.py)
+Tests the single-sheet export and the streamed multi-sheet workbook
+"""
+import io
+import time
+
+import openpyxl
+import pandas as pd
+
+from exports import dataframe_to_excel, workbook_excel
+
+
+def test_excel_export_single_sheet():
+    """Test that a table exports to one 'Escala' sheet, with empty cells for missing values"""
+    print("\n=== Testing Single-Sheet Excel Export ===")
+
+    df = pd.DataFrame({
+        'Tipo': ['Plantão', 'Ambulatório'],
+        'Data': ['01/12/2025', '02/12/2025'],
+        'Vagas': [2, None],
+        'Participantes': ['User1, User2', None]
+    })
+    data = dataframe_to_excel(df)
+    assert isinstance(data, bytes), "Excel data should be bytes for st.download_button"
+
+    workbook = openpyxl.load_workbook(io.BytesIO(data))
+    assert workbook.sheetnames == ['Escala']
+    rows = list(workbook['Escala'].values)
+    print(rows)
+    assert rows[0] == ('Tipo', 'Data', 'Vagas', 'Participantes')
+    assert rows[1] == ('Plantão', '01/12/2025', 2, 'User1, User2')
+    assert rows[2][2] is None and rows[2][3] is None, "Missing values should be empty cells"
+
+    print("✅ Single-sheet Excel export test passed!")
+    return True
+
+
+def test_workbook_streams_sheets_with_summary():
+    """Test that sheets are consumed one at a time and summarized on the first sheet"""
+    print("\n=== Testing Multi-Sheet Workbook ===")
+
+    consumed = []
+
+    def sheets():
+        for nome in ['Dez/2025', 'Jan/2026', 'Nome de escala muito comprido para uma aba do Excel', 'dez/2025']:
+            consumed.append(nome)
+            yield nome, pd.DataFrame({'Tipo': ['Plantão'] * 3, 'Data': ['01/12/2025'] * 3}), {"Escala": nome}
+
+    data = workbook_excel(sheets())
+    assert len(consumed) == 4
+
+    workbook = openpyxl.load_workbook(io.BytesIO(data))
+    print(workbook.sheetnames)
+    assert workbook.sheetnames[0] == 'Resumo', "The summary should be the first sheet"
+    assert workbook.sheetnames[1:] == ['Dez_2025', 'Jan_2026', 'Nome de escala muito comprido p', 'dez_2025 (2)'], \
+        "Sheet names should be valid, at most 31 characters and unique"
+    summary = list(workbook['Resumo'].values)
+    print(summary)
+    assert summary[0] == ('Aba', 'Escala', 'Linhas')
+    assert summary[1] == ('Dez_2025', 'Dez/2025', 3)
+    assert len(list(workbook['Jan_2026'].values)) == 4, "Each sheet should have a header and its rows"
+
+    print("✅ Multi-sheet workbook test passed!")
+    return True
+
+
+def test_workbook_large_export():
+    """Test that tens of thousands of rows export in a few seconds"""
+    print("\n=== Testing Large Workbook Export ===")
+
+    def sheets():
+        for m in range(12):
+            yield f"Escala {m + 1}", pd.DataFrame({
+                'Tipo': ['Plantão'] * 5000,
+                'Data': [f"{d % 28 + 1:02d}/{m + 1:02d}/2025" for d in range(5000)],
+                'Horário': ['07:00-19:00'] * 5000,
+                'Vagas': [3] * 5000,
+                'Participantes': ['Participante A, Participante B'] * 5000
+            }), None
+
+    start = time.perf_counter()
+    data = workbook_excel(sheets())
+    elapsed = time.perf_counter() - start
+    print(f"60,000 rows: {elapsed:.2f}s, {len(data)} bytes")
+    assert data[:2] == b'PK', "The workbook should be a valid xlsx (zip) file"
+    assert elapsed < 15
+
+    print("✅ Large workbook export test passed!")
+    return True
+
+
+def run_all_tests():
+    """Run all Excel export tests"""
+    print("Starting Excel export tests...\n")
+
+    tests = [
+        test_excel_export_single_sheet,
+        test_workbook_streams_sheets_with_summary,
+        test_workbook_large_export
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            result = test()
+            results.append(result)
+        except Exception as e:
+            print(f"❌ Test failed with error: {e}")
+            import traceback
+            traceback.print_exc()
+            results.append(False)
+
+    print("\n" + "="*60)
+    if all(results):
+        print("✅ All Excel export tests passed successfully!")
+        return True
+    else:
+        print("❌ Some tests failed")
+        return False
+
+
+if __name__ == "__main__":
+    success = run_all_tests()
+    exit(0 if success else 1)
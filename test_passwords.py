@@ -0,0 +1,141 @@
+"""
+Tests for password hashing (passwords.py) and the rehash on login (database.py).
+"""
+import threading
+import time
+
+import pandas as pd
+
+import database
+import passwords
+from passwords import PasswordHasher, hash_rounds
+from storage import SQLiteStorage
+
+ADMIN_EMAIL = "admin@email.com"
+
+
+def test_hash_and_verify():
+    """Test that hashes use the configured cost and invalid hashes are rejected"""
+    print("\n=== Testing Hash and Verify ===")
+
+    hasher = PasswordHasher(rounds=4, max_workers=2)
+    hashed = hasher.hash("segredo")
+    print(hashed)
+    assert hash_rounds(hashed) == 4
+    assert hasher.verify("segredo", hashed)
+    assert not hasher.verify("errada", hashed)
+    assert not hasher.verify("segredo", "OAUTH_USER"), "Non-bcrypt markers should not raise"
+    assert hash_rounds("OAUTH_USER") is None
+
+    hashes = hasher.hash_many(["a", "b", "c"])
+    assert [hasher.verify(p, h) for p, h in zip(["a", "b", "c"], hashes)] == [True, True, True], "Order should be kept"
+
+    inline = PasswordHasher(rounds=4, max_workers=0)
+    assert inline.verify("segredo", hashed), "Hashes are portable between pools"
+    try:
+        PasswordHasher(rounds=3)
+        assert False, "Costs below the bcrypt minimum should be rejected"
+    except ValueError:
+        pass
+    hasher.shutdown()
+
+    print("✅ Hash and verify test passed!")
+    return True
+
+
+def test_pool_bounds_concurrency():
+    """Test that no more than max_workers hashes run at the same time"""
+    print("\n=== Testing Pool Bounds ===")
+
+    running = 0
+    peak = 0
+    lock = threading.Lock()
+    original = passwords._check
+
+    def slow_check(password, hashed):
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        time.sleep(0.02)
+        with lock:
+            running -= 1
+        return original(password, hashed)
+
+    hasher = PasswordHasher(rounds=4, max_workers=2)
+    hashed = hasher.hash("segredo")
+    passwords._check = slow_check
+    try:
+        threads = [threading.Thread(target=hasher.verify, args=("segredo", hashed)) for _ in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        passwords._check = original
+        hasher.shutdown()
+    print(f"Peak concurrent checks: {peak}")
+    assert peak == 2, "Ten simultaneous logins should share the two workers"
+
+    print("✅ Pool bounds test passed!")
+    return True
+
+
+def test_login_rehashes_old_cost():
+    """Test that logging in with a hash of another cost stores a new hash transparently"""
+    print("\n=== Testing Rehash on Login ===")
+
+    db = SQLiteStorage(":memory:")
+    database.init(db, ADMIN_EMAIL, hasher=PasswordHasher(rounds=5))
+    old_hash = PasswordHasher(rounds=4).hash("segredo")
+    db.insert("usuarios", pd.DataFrame([{"nome": "Ana", "matricula": "1", "email": "a@x.com", "senha_hash": old_hash}]))
+
+    assert not database.check_user_password("a@x.com", "errada", old_hash)
+    assert database.get_user_data("a@x.com")['senha_hash'] == old_hash, "Wrong passwords should not touch the hash"
+
+    assert database.check_user_password("a@x.com", "segredo", old_hash)
+    new_hash = database.get_user_data("a@x.com")['senha_hash']
+    print(new_hash)
+    assert hash_rounds(new_hash) == 5, "The hash should be redone with the configured cost"
+    assert database.check_user_password("a@x.com", "segredo", new_hash)
+    assert database.get_user_data("a@x.com")['senha_hash'] == new_hash, "Current-cost hashes are kept"
+
+    success, message = database.register_user("Admin", "0", ADMIN_EMAIL, "admin123")
+    assert success, message
+    assert hash_rounds(database.get_user_data(ADMIN_EMAIL)['senha_hash']) == 5, "New accounts use the configured cost"
+
+    print("✅ Rehash on login test passed!")
+    return True
+
+
+def run_all_tests():
+    """Run all password tests"""
+    print("Starting password tests...\n")
+
+    tests = [
+        test_hash_and_verify,
+        test_pool_bounds_concurrency,
+        test_login_rehashes_old_cost
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            result = test()
+            results.append(result)
+        except Exception as e:
+            print(f"❌ Test failed with error: {e}")
+            results.append(False)
+
+    print("\n" + "="*50)
+    if all(results):
+        print("✅ All password tests passed successfully!")
+        return True
+    else:
+        print("❌ Some tests failed")
+        return False
+
+
+if __name__ == "__main__":
+    success = run_all_tests()
+    exit(0 if success else 1)
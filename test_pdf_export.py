@@ -1,41 +1,15 @@
 """
-Test script for PDF export functionality
+Test script for PDF export functionality (exports.py)
 Tests that the PDF export returns bytes (not bytearray) for Streamlit compatibility
+and that large tables are laid out across pages
 """
-import pandas as pd
-from fpdf import FPDF
 import io
+import time
+import zipfile
 
+import pandas as pd
 
-def dataframe_to_pdf(df):
-    """Copy of the fixed function from app.py"""
-    pdf = FPDF()
-    pdf.add_page()
-    pdf.set_font("Arial", size=10)
-    
-    # Cabeçalhos - ajusta larguras dinamicamente baseado no número de colunas
-    num_cols = len(df.columns)
-    if num_cols == 6:
-        # Com Observações: Tipo, Data, Horário, Vagas, Participantes, Observações
-        col_widths = [25, 20, 25, 12, 60, 38]
-    else:
-        # Sem Observações
-        col_widths = [30, 25, 30, 15, 80]
-    
-    for i, col in enumerate(df.columns):
-        if i < len(col_widths):
-            pdf.cell(col_widths[i], 10, col, 1, 0, 'C')
-    pdf.ln()
-    
-    # Dados
-    for index, row in df.iterrows():
-        for i, item in enumerate(row):
-            if i < len(col_widths):
-                pdf.multi_cell(col_widths[i], 10, str(item), 1, 'L')
-        pdf.ln()
-    
-    # fpdf2 returns bytearray, convert to bytes for streamlit compatibility
-    return bytes(pdf.output())
+from exports import ExportCache, dataframe_to_pdf, participant_pdfs_zip, render_table_pdf
 
 
 def test_pdf_export_returns_bytes():
@@ -125,6 +99,109 @@ def test_streamlit_download_button_compatibility():
     return True
 
 
+def _large_escala(rows):
+    return pd.DataFrame({
+        'Tipo': ['Plantão', 'Ambulatório de Clínica Médica'] * (rows // 2),
+        'Data': [f"{i % 28 + 1:02d}/12/2025" for i in range(rows)],
+        'Horário': ['07:00-19:00', '08:00-12:00'] * (rows // 2),
+        'Vagas': [3] * rows,
+        'Participantes': [', '.join(f"Participante {j}" for j in range(i % 7)) for i in range(rows)],
+        'Observações': ['', 'Supervisão — sala 3'] * (rows // 2)
+    })
+
+
+def test_pdf_export_repeats_header_on_every_page():
+    """Test that long tables span pages, with the header on each one and rows of equal height"""
+    print("\n=== Testing Multi-Page PDF Layout ===")
+
+    pdf = render_table_pdf(_large_escala(200), title="Escala Dez/2025")
+    print(f"Pages: {pdf.pages_count}, column widths: {[round(w, 1) for w in pdf.widths]}")
+    assert pdf.pages_count > 1, "200 rows should not fit on one page"
+    assert abs(sum(pdf.widths) - pdf.epw) < 0.01, "Columns should fill the page width"
+    assert pdf.widths[4] == max(pdf.widths), "The participants column has the longest text and should be the widest"
+
+    pdf.compress = False
+    content = bytes(pdf.output()).decode('latin-1')
+    assert content.count('(Observações) Tj') == pdf.pages_count, "The header should be repeated on every page"
+    assert content.count('(Escala Dez/2025) Tj') == pdf.pages_count, "The title should be repeated on every page"
+    assert '(Supervisão - sala 3) Tj' in content, "Typographic dashes should be kept readable"
+
+    print("✅ Multi-page PDF layout test passed!")
+    return True
+
+
+def test_pdf_export_large_escala_is_fast():
+    """Test that a 2,000-row escala exports in about a second"""
+    print("\n=== Testing Large PDF Export ===")
+
+    df = _large_escala(2000)
+    start = time.perf_counter()
+    pdf_data = dataframe_to_pdf(df)
+    elapsed = time.perf_counter() - start
+    print(f"2,000 rows: {elapsed:.2f}s, {len(pdf_data)} bytes")
+
+    assert pdf_data[:4] == b'%PDF'
+    assert elapsed < 2, "A 2,000-row escala should export in about a second"
+
+    print("✅ Large PDF export test passed!")
+    return True
+
+
+def test_export_cache_reuses_unchanged_escalas():
+    """Test that exports are generated once per escala content and format"""
+    print("\n=== Testing Export Cache ===")
+
+    cache = ExportCache(max_entries=2)
+    df = _large_escala(20)
+    first = cache.pdf(df, "Escala Dez/2025")
+    assert cache.pdf(df.copy(), "Escala Dez/2025") is first, "An unchanged escala should not be rendered again"
+    assert cache.builds == 1
+
+    cache.excel(df)
+    assert cache.builds == 2, "Each format is generated separately"
+
+    changed = df.copy()
+    changed.loc[0, 'Participantes'] = 'Outra Pessoa'
+    assert cache.pdf(changed, "Escala Dez/2025") is not first, "A changed escala should be rendered again"
+    assert cache.builds == 3
+
+    cache.pdf(df, "Escala Dez/2025")
+    assert cache.builds == 4, "The least recently used file should have been evicted"
+    print(f"Builds: {cache.builds}")
+
+    print("✅ Export cache test passed!")
+    return True
+
+
+def test_participant_pdfs_zip():
+    """Test that the batch export has one PDF per participant, rendered in worker processes"""
+    print("\n=== Testing Per-Participant PDFs ===")
+
+    rows = []
+    for p in range(20):
+        nome = "José da Silva" if p < 2 else f"Participante {p}"
+        for d in range(3):
+            rows.append({
+                'email_participante': f"p{p}@x.com", 'nome_participante': nome,
+                'Tipo': 'Plantão', 'Data': f"{d + 1:02d}/12/2025", 'Horário': '07:00-19:00', 'Observações': ''
+            })
+    df_schedules = pd.DataFrame(rows)
+
+    start = time.perf_counter()
+    data = participant_pdfs_zip(df_schedules, "Dez/2025", max_workers=2)
+    print(f"20 PDFs with 2 workers: {time.perf_counter() - start:.2f}s")
+
+    archive = zipfile.ZipFile(io.BytesIO(data))
+    names = archive.namelist()
+    print(names[:3])
+    assert len(names) == 20, "There should be one PDF per participant"
+    assert "Jose_da_Silva.pdf" in names and "Jose_da_Silva_p1.pdf" in names, "Homonyms should get distinct file names"
+    assert all(archive.read(name)[:4] == b'%PDF' for name in names)
+
+    print("✅ Per-participant PDFs test passed!")
+    return True
+
+
 def run_all_tests():
     """Run all PDF export tests"""
     print("Starting PDF export tests...\n")
@@ -132,7 +209,11 @@ def run_all_tests():
     tests = [
         test_pdf_export_returns_bytes,
         test_pdf_export_with_observacoes,
-        test_streamlit_download_button_compatibility
+        test_streamlit_download_button_compatibility,
+        test_pdf_export_repeats_header_on_every_page,
+        test_pdf_export_large_escala_is_fast,
+        test_export_cache_reuses_unchanged_escalas,
+        test_participant_pdfs_zip
     ]
     
     results = []
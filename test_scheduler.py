@@ -0,0 +1,84 @@
+"""
+Tests for the turn deadline queue (scheduler.py).
+Uses a fake clock, so no test waits for a real deadline.
+"""
+from scheduler import TurnScheduler
+from testing_utils import FakeClock
+
+
+def test_expired_deadlines_fire_in_order():
+    """Test that only expired deadlines fire, earliest first"""
+    print("\n=== Testing Deadline Order ===")
+
+    clock = FakeClock()
+    fired = []
+    scheduler = TurnScheduler(lambda *args: fired.append(args), clock=clock)
+    scheduler.set_deadline("Dez/2025", 1, "a@x.com", clock.now + 60)
+    scheduler.set_deadline("Nov/2025", 2, "b@x.com", clock.now + 30)
+    scheduler.set_deadline("Jan/2026", 1, "c@x.com", clock.now + 300)
+
+    assert scheduler.run_pending() == 0, "Nothing should fire before the deadline"
+    clock.now += 90
+    assert scheduler.run_pending() == 2
+    print(fired)
+    assert fired == [("Nov/2025", 2, "b@x.com"), ("Dez/2025", 1, "a@x.com")], "Deadlines should fire earliest first"
+    assert scheduler.deadline("Jan/2026") == (1300.0, 1, "c@x.com"), "Pending deadlines should stay queued"
+    assert scheduler.run_pending() == 0, "A deadline should fire only once"
+
+    print("✅ Deadline order test passed!")
+    return True
+
+
+def test_replaced_deadlines_are_ignored():
+    """Test that a new turn replaces the previous deadline and clear() cancels it"""
+    print("\n=== Testing Deadline Replacement ===")
+
+    clock = FakeClock()
+    fired = []
+    scheduler = TurnScheduler(lambda *args: fired.append(args), clock=clock)
+    scheduler.set_deadline("Dez/2025", 1, "a@x.com", clock.now + 60)
+    scheduler.set_deadline("Dez/2025", 1, "b@x.com", clock.now + 120)  # a@x.com picked in time
+    scheduler.set_deadline("Nov/2025", 1, "c@x.com", clock.now + 60)
+    scheduler.clear("Nov/2025")
+
+    clock.now += 90
+    assert scheduler.run_pending() == 0, "Replaced and cleared deadlines should not fire"
+    clock.now += 60
+    scheduler.run_pending()
+    print(fired)
+    assert fired == [("Dez/2025", 1, "b@x.com")], "Only the current turn's deadline should fire"
+
+    print("✅ Deadline replacement test passed!")
+    return True
+
+
+def run_all_tests():
+    """Run all scheduler tests"""
+    print("Starting scheduler tests...\n")
+
+    tests = [
+        test_expired_deadlines_fire_in_order,
+        test_replaced_deadlines_are_ignored
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            result = test()
+            results.append(result)
+        except Exception as e:
+            print(f"❌ Test failed with error: {e}")
+            results.append(False)
+
+    print("\n" + "="*50)
+    if all(results):
+        print("✅ All scheduler tests passed successfully!")
+        return True
+    else:
+        print("❌ Some tests failed")
+        return False
+
+
+if __name__ == "__main__":
+    success = run_all_tests()
+    exit(0 if success else 1)
@@ -0,0 +1,99 @@
+"""
+Tests for the signed session tokens (sessions.py).
+"""
+import os
+import tempfile
+
+from sessions import SessionTokens
+from testing_utils import FakeClock
+
+
+def test_tokens_restore_and_expire():
+    """Test that a token restores the user until it expires and rejects tampering"""
+    print("\n=== Testing Session Tokens ===")
+
+    clock = FakeClock()
+    tokens = SessionTokens("chave", max_age=3600, clock=clock)
+    token = tokens.issue("ana@x.com", "Ana Souza")
+    print(token)
+    claims = tokens.verify(token)
+    assert claims["email"] == "ana@x.com" and claims["nome"] == "Ana Souza"
+
+    payload, signature = token.split(".")
+    forged = SessionTokens("outra chave").issue("admin@email.com", "Admin").split(".")[0]
+    assert tokens.verify(f"{forged}.{signature}") is None, "A payload with someone else's signature should be rejected"
+    assert tokens.verify(payload) is None and tokens.verify("") is None and tokens.verify(None) is None
+    assert SessionTokens("outra chave", clock=clock).verify(token) is None, "Tokens are bound to the secret"
+    assert SessionTokens("chave", clock=clock).verify(token) is not None, "The same secret accepts the token after a restart"
+
+    short = tokens.issue("admin@email.com", "Admin", max_age=600)
+    clock.now += 600
+    assert tokens.verify(short) is None and tokens.verify(token) is not None, "A token can get a shorter lifetime"
+
+    clock.now += 3000
+    assert tokens.verify(token) is None, "Expired tokens should be rejected"
+
+    print("✅ Session tokens test passed!")
+    return True
+
+
+def test_revocation_list():
+    """Test that revoked tokens stay rejected, survive a restart and leave the list when they expire"""
+    print("\n=== Testing Session Revocation ===")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessoes_revogadas.json")
+        clock = FakeClock()
+        tokens = SessionTokens("chave", max_age=3600, revocations_path=path, clock=clock)
+        first = tokens.issue("ana@x.com", "Ana")
+        second = tokens.issue("ana@x.com", "Ana")
+
+        tokens.revoke(first)
+        assert tokens.verify(first) is None, "Revoked tokens should be rejected"
+        assert tokens.verify(second) is not None, "Other sessions of the same user stay valid"
+        tokens.revoke("lixo")
+        assert tokens.revoked_count() == 1
+
+        restarted = SessionTokens("chave", max_age=3600, revocations_path=path, clock=clock)
+        assert restarted.verify(first) is None, "Revocations should survive a restart"
+
+        clock.now += 1800
+        third = restarted.issue("bruno@x.com", "Bruno")
+        clock.now += 1800
+        restarted.revoke(third)
+        assert restarted.revoked_count() == 1, "Expired revocations should be dropped"
+
+    print("✅ Session revocation test passed!")
+    return True
+
+
+def run_all_tests():
+    """Run all session token tests"""
+    print("Starting session token tests...\n")
+
+    tests = [
+        test_tokens_restore_and_expire,
+        test_revocation_list
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            result = test()
+            results.append(result)
+        except Exception as e:
+            print(f"❌ Test failed with error: {e}")
+            results.append(False)
+
+    print("\n" + "="*50)
+    if all(results):
+        print("✅ All session token tests passed successfully!")
+        return True
+    else:
+        print("❌ Some tests failed")
+        return False
+
+
+if __name__ == "__main__":
+    success = run_all_tests()
+    exit(0 if success else 1)
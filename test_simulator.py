@@ -0,0 +1,96 @@
+"""
+Tests for the draft simulator (simulator.py).
+"""
+import threading
+
+import pandas as pd
+
+from simulator import FakeGSheetsConnection, format_login_report, format_report, simulate_draft, simulate_logins
+from storage import GSheetsStorage
+
+
+def test_fake_connection_counts_calls():
+    """Test that the fake connection round-trips data and counts calls and bytes"""
+    print("\n=== Testing Fake Sheets Connection ===")
+
+    conn = FakeGSheetsConnection()
+    storage = GSheetsStorage(conn)
+    storage.insert("rodadas", pd.DataFrame([
+        {"escala_nome": "Dez/2025", "numero_rodada": 1, "posicao": 1, "email_participante": "a@x.com", "ja_escolheu": False, "pulado": False}
+    ]))
+    df = storage.read("rodadas")
+    print(df)
+    print(dict(conn.calls))
+    assert len(df) == 1 and df['numero_rodada'].iloc[0] == 1 and df['ja_escolheu'].iloc[0] == False, "Values should round-trip"
+    assert conn.calls["append_rows"] == 1 and conn.calls["read"] == 1
+    assert conn.bytes_read > 0 and conn.bytes_written > 0, "Bytes should be measured"
+
+    print("✅ Fake connection test passed!")
+    return True
+
+
+def test_simulated_draft():
+    """Test that a full draft runs to completion and the shared cache saves reads"""
+    print("\n=== Testing Simulated Draft ===")
+
+    flush_threads = sum(t.name == "write-behind" for t in threading.enumerate())
+    cached = simulate_draft(participantes=6, atividades=10, rodadas=2)
+    print(format_report(cached))
+    assert cached["escolhas"] == 12, "Every participant should pick once per round"
+    assert cached["escritas_por_escolha"] > 0 and cached["bytes_gravados"] > 0
+
+    uncached = simulate_draft(participantes=6, atividades=10, rodadas=2, cached=False)
+    print(format_report(uncached))
+    assert uncached["escolhas"] == 12
+    assert cached["leituras"] < uncached["leituras"], "The shared cache should save reads"
+    assert sum(t.name == "write-behind" for t in threading.enumerate()) == flush_threads, "Each run should stop its flush thread"
+
+    print("✅ Simulated draft test passed!")
+    return True
+
+
+def test_simulated_logins():
+    """Test that simultaneous logins all succeed and old-cost hashes are redone"""
+    print("\n=== Testing Simulated Logins ===")
+
+    report = simulate_logins(usuarios=8, rounds=5, workers=2, old_rounds=4)
+    print(format_login_report(report))
+    assert report["logins"] == 8 and report["workers"] == 2
+    assert report["logins_por_segundo"] > 0
+    assert report["hashes_no_custo_atual"] == 8, "Every login should store a hash with the current cost"
+
+    print("✅ Simulated logins test passed!")
+    return True
+
+
+def run_all_tests():
+    """Run all simulator tests"""
+    print("Starting simulator tests...\n")
+
+    tests = [
+        test_fake_connection_counts_calls,
+        test_simulated_draft,
+        test_simulated_logins
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            result = test()
+            results.append(result)
+        except Exception as e:
+            print(f"❌ Test failed with error: {e}")
+            results.append(False)
+
+    print("\n" + "="*50)
+    if all(results):
+        print("✅ All simulator tests passed successfully!")
+        return True
+    else:
+        print("❌ Some tests failed")
+        return False
+
+
+if __name__ == "__main__":
+    success = run_all_tests()
+    exit(0 if success else 1)
@@ -0,0 +1,759 @@
+"""
+Tests for the storage backends (storage.py).
+Uses an in-memory SQLite database and a fake gspread worksheet,
+so no Google Sheets connection is required.
+"""
+import os
+import tempfile
+import threading
+import time
+
+import pandas as pd
+
+from diagnostics import LAYER_APP, LAYER_BACKEND, StorageStats
+from simulator import FakeGSheetsConnection
+from storage import (
+    CachedStorage, GSheetsStorage, InstrumentedStorage, SQLiteStorage, SnapshotStorage, Storage, WriteBehindStorage,
+    WORKSHEETS, RESERVED, NOT_YOUR_TURN, NO_SLOTS
+)
+
+
+class FakeWorksheet:
+    """Minimal stand-in for a gspread Worksheet that records appended rows."""
+
+    def __init__(self, header):
+        self.header = header
+        self.appended = []
+
+    def row_values(self, row):
+        return list(self.header)
+
+    def update(self, range_name=None, values=None):
+        self.header = values[0]
+
+    def append_rows(self, values, **kwargs):
+        self.appended.extend(values)
+
+
+class FakeClient:
+    def __init__(self, worksheets):
+        self.worksheets = worksheets
+
+    def _select_worksheet(self, worksheet=None):
+        return self.worksheets[worksheet]
+
+
+class FakeConnection:
+    """Connection whose read/update must not be used by inserts."""
+
+    def __init__(self, worksheets):
+        self.client = FakeClient(worksheets)
+
+    def read(self, **kwargs):
+        raise AssertionError("insert() should not read the whole worksheet")
+
+    def update(self, **kwargs):
+        raise AssertionError("insert() should not rewrite the whole worksheet")
+
+
+def test_sqlite_creates_all_worksheets():
+    """Test that every worksheet exists and starts empty with the expected columns"""
+    print("\n=== Testing SQLite Schema ===")
+
+    db = SQLiteStorage(":memory:")
+    for worksheet, columns in WORKSHEETS.items():
+        df = db.read(worksheet)
+        assert df.empty, f"{worksheet} should start empty"
+        assert list(df.columns) == columns, f"{worksheet} columns should match the schema"
+
+    print("✅ SQLite schema test passed!")
+    return True
+
+
+def test_sqlite_insert_and_update_rows():
+    """Test row-level inserts and updates"""
+    print("\n=== Testing SQLite Insert/Update ===")
+
+    db = SQLiteStorage(":memory:")
+    db.insert("rodadas", pd.DataFrame([
+        {"escala_nome": "Dez/2025", "numero_rodada": 1, "posicao": 1, "email_participante": "a@x.com", "ja_escolheu": False},
+        {"escala_nome": "Dez/2025", "numero_rodada": 1, "posicao": 2, "email_participante": "b@x.com", "ja_escolheu": False},
+    ]))
+    db.insert("rodadas", pd.DataFrame([
+        {"escala_nome": "Dez/2025", "numero_rodada": 1, "posicao": 3, "email_participante": "c@x.com", "ja_escolheu": False},
+    ]))
+
+    updated = db.update_rows(
+        "rodadas",
+        {"escala_nome": "Dez/2025", "numero_rodada": 1, "email_participante": "b@x.com"},
+        {"ja_escolheu": True}
+    )
+    df = db.read("rodadas")
+    print(df)
+
+    assert updated == 1, "Exactly one row should be updated"
+    assert len(df) == 3, "Inserts should append rows"
+    assert df['ja_escolheu'].tolist() == [False, True, False], "Only b@x.com should be marked"
+    assert df['posicao'].tolist() == [1, 2, 3], "Insertion order should be preserved"
+
+    print("✅ SQLite insert/update test passed!")
+    return True
+
+
+def test_sqlite_write_replaces_contents():
+    """Test that write() replaces the whole worksheet"""
+    print("\n=== Testing SQLite Write ===")
+
+    db = SQLiteStorage(":memory:")
+    db.insert("emails_permitidos", pd.DataFrame({"email": ["a@x.com", "b@x.com"]}))
+    db.write("emails_permitidos", pd.DataFrame({"email": ["c@x.com"]}))
+
+    assert db.read("emails_permitidos")['email'].tolist() == ["c@x.com"], "write() should replace all rows"
+
+    print("✅ SQLite write test passed!")
+    return True
+
+
+def test_gsheets_insert_appends_only_new_rows():
+    """Test that the Sheets backend appends rows instead of rewriting the worksheet"""
+    print("\n=== Testing Sheets Append ===")
+
+    ws = FakeWorksheet(["escala_nome", "tipo", "data", "horario", "vagas", "id_atividade"])
+    db = GSheetsStorage(FakeConnection({"atividades": ws}))
+    db.insert("atividades", pd.DataFrame([{
+        "escala_nome": "Dez/2025", "tipo": "Plantão", "data": "01/12/2025",
+        "horario": "07:00-19:00", "vagas": 2, "id_atividade": "act1", "observacoes": float("nan")
+    }]))
+    print(ws.header)
+    print(ws.appended)
+
+    assert ws.header[-1] == "observacoes", "New columns should be added to the header"
+    assert ws.appended == [["Dez/2025", "Plantão", "01/12/2025", "07:00-19:00", 2, "act1", ""]], \
+        "Only the new row should be sent, in header order"
+
+    print("✅ Sheets append test passed!")
+    return True
+
+
+class CountingStorage(SQLiteStorage):
+    """SQLite backend that counts reads and writes per worksheet."""
+
+    def __init__(self):
+        super().__init__(":memory:")
+        self.reads = {}
+        self.writes = []
+
+    def read(self, worksheet):
+        self.reads[worksheet] = self.reads.get(worksheet, 0) + 1
+        return super().read(worksheet)
+
+    def read_escala(self, worksheet, escala_nome):
+        key = (worksheet, escala_nome)
+        self.reads[key] = self.reads.get(key, 0) + 1
+        return super().read_escala(worksheet, escala_nome)
+
+    def write(self, worksheet, df):
+        self.writes.append(("write", worksheet, len(df)))
+        super().write(worksheet, df)
+
+    def insert(self, worksheet, df):
+        self.writes.append(("insert", worksheet, len(df)))
+        super().insert(worksheet, df)
+
+
+def test_snapshot_reads_each_worksheet_once():
+    """Test that a snapshot reads each worksheet at most once until it is written"""
+    print("\n=== Testing Snapshot Reads ===")
+
+    backend = CountingStorage()
+    snapshot = SnapshotStorage(backend)
+    for _ in range(4):
+        snapshot.read("rodadas")
+    snapshot.read("usuarios")
+    snapshot.read("usuarios")
+    print(backend.reads)
+    assert backend.reads == {"rodadas": 1, "usuarios": 1}, "Repeated reads should be served from the snapshot"
+
+    snapshot.insert("rodadas", pd.DataFrame([
+        {"escala_nome": "Dez/2025", "numero_rodada": 1, "posicao": 1, "email_participante": "a@x.com", "ja_escolheu": False}
+    ]))
+    assert len(snapshot.read("rodadas")) == 1, "A write should refresh the snapshot of that worksheet"
+    assert backend.reads["rodadas"] == 2, "Only the written worksheet should be re-read"
+
+    print("✅ Snapshot reads test passed!")
+    return True
+
+
+def test_shared_cache_invalidated_by_writes():
+    """Test that sessions share one fetch and see writes immediately"""
+    print("\n=== Testing Shared Cache ===")
+
+    backend = CountingStorage()
+    cache = CachedStorage(backend)
+
+    # Two sessions, each with its own per-run snapshot over the shared cache
+    session_a = SnapshotStorage(cache)
+    session_b = SnapshotStorage(cache)
+    session_a.read("escolhas")
+    session_b.read("escolhas")
+    assert backend.reads["escolhas"] == 1, "Sessions should share a single fetch"
+
+    version = cache.version("escolhas")
+    session_a.insert("escolhas", pd.DataFrame([
+        {"escala_nome": "Dez/2025", "id_atividade": "act1", "email_participante": "a@x.com", "nome_participante": "A"}
+    ]))
+    assert cache.version("escolhas") == version + 1, "Writes should bump the version"
+
+    # A new run of session B sees the pick without waiting for a TTL
+    session_b = SnapshotStorage(cache)
+    assert len(session_b.read("escolhas")) == 1, "Other sessions should see the write immediately"
+    assert backend.reads["escolhas"] == 2, "Only one re-fetch after the write"
+
+    print("✅ Shared cache test passed!")
+    return True
+
+
+class LockedStorage(SQLiteStorage):
+    """SQLite backend forced to use the generic (lock-based) reservation."""
+    transactional = False
+
+    def reserve_slot(self, *args):
+        return Storage.reserve_slot(self, *args)
+
+
+def _setup_draft(db):
+    db.insert("atividades", pd.DataFrame([
+        {"escala_nome": "Dez/2025", "tipo": "Plantão", "data": "01/12/2025", "horario": "07:00-19:00", "vagas": 1, "id_atividade": "act1"},
+    ]))
+    db.insert("rodadas", pd.DataFrame([
+        {"escala_nome": "Dez/2025", "numero_rodada": 1, "posicao": 1, "email_participante": "a@x.com", "ja_escolheu": False},
+        {"escala_nome": "Dez/2025", "numero_rodada": 1, "posicao": 2, "email_participante": "b@x.com", "ja_escolheu": False},
+    ]))
+
+
+def test_reserve_slot_is_atomic():
+    """Test that concurrent reservations never overbook and advance the turn once"""
+    print("\n=== Testing Slot Reservation ===")
+
+    for db in [SQLiteStorage(":memory:"), CachedStorage(LockedStorage(":memory:"))]:
+        _setup_draft(db)
+
+        # The same participant submits twice at the same time (e.g. double click)
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(db.reserve_slot("Dez/2025", 1, "act1", "a@x.com", "A")))
+            for _ in range(8)
+        ]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        print(type(db).__name__, sorted(results))
+
+        assert results.count(RESERVED) == 1, "Only one reservation should succeed"
+        assert set(results) - {RESERVED} <= {NOT_YOUR_TURN}, "Other attempts should be turn conflicts"
+        assert len(db.read("escolhas")) == 1, "Only one choice should be recorded"
+
+        # The only slot is taken, so the next participant gets a conflict result
+        assert db.reserve_slot("Dez/2025", 1, "act1", "b@x.com", "B") == NO_SLOTS, "Full activity should be rejected"
+        rounds = db.read("rodadas")
+        assert rounds['ja_escolheu'].tolist() == [True, False], "Turn should advance only for a@x.com"
+
+    print("✅ Slot reservation test passed!")
+    return True
+
+
+def test_run_locked_rolls_back_on_error():
+    """Test that a failed locked operation leaves no partial writes on a transactional backend"""
+    print("\n=== Testing Locked Operations ===")
+
+    for db in [SQLiteStorage(":memory:"), CachedStorage(SQLiteStorage(":memory:"))]:
+        _setup_draft(db)
+        assert db.occupancy("Dez/2025") == {"act1": (0, 1)}
+
+        def fail():
+            db.insert("escolhas", _choice("a@x.com"))
+            assert len(db.read_escala("escolhas", "Dez/2025")) == 1, "Reads inside the lock should see its own writes"
+            raise RuntimeError("falha no meio")
+
+        try:
+            db.run_locked("Dez/2025", fail)
+            assert False, "The error should reach the caller"
+        except RuntimeError:
+            pass
+        print(type(db).__name__, db.occupancy("Dez/2025"))
+        assert db.read_escala("escolhas", "Dez/2025").empty, "The insert should be rolled back"
+        assert db.occupancy("Dez/2025") == {"act1": (0, 1)}, "The cached occupancy should not keep the rolled back pick"
+
+        assert db.run_locked("Dez/2025", lambda: db.insert("escolhas", _choice("a@x.com")) or "ok") == "ok"
+        assert db.occupancy("Dez/2025") == {"act1": (1, 0)}, "A successful locked operation should be committed"
+
+    print("✅ Locked operations test passed!")
+    return True
+
+
+def _choice(email):
+    return pd.DataFrame([{"escala_nome": "Dez/2025", "id_atividade": "act1", "email_participante": email, "nome_participante": email}])
+
+
+def test_write_behind_coalesces_writes():
+    """Test that queued mutations are merged into one write per worksheet"""
+    print("\n=== Testing Write-Behind Coalescing ===")
+
+    backend = CountingStorage()
+    _setup_draft(backend)
+    backend.writes.clear()
+    queue = WriteBehindStorage(backend, flush_interval=3600)
+
+    queue.insert("escolhas", _choice("a@x.com"))
+    queue.update_rows("rodadas", {"escala_nome": "Dez/2025", "numero_rodada": 1, "email_participante": "a@x.com"}, {"ja_escolheu": True})
+    queue.insert("escolhas", _choice("b@x.com"))
+    queue.update_rows("rodadas", {"escala_nome": "Dez/2025", "numero_rodada": 1, "email_participante": "b@x.com"}, {"ja_escolheu": True})
+
+    assert backend.writes == [], "Nothing should reach the backend before the flush"
+    assert len(queue.read("escolhas")) == 2, "Reads should include pending inserts"
+    assert queue.read("rodadas")['ja_escolheu'].all(), "Reads should include pending updates"
+
+    queue.flush()
+    print(backend.writes)
+    assert backend.writes == [("insert", "escolhas", 2), ("write", "rodadas", 2)], \
+        "Each worksheet should get a single batched write"
+    assert queue.pending_count() == 0, "Queue should be empty after the flush"
+    assert len(backend.read("escolhas")) == 2, "Choices should be stored"
+
+    print("✅ Write-behind coalescing test passed!")
+    return True
+
+
+class BlockingWriteStorage(CountingStorage):
+    """Counting backend whose full-sheet writes wait until `release` is set."""
+
+    def __init__(self):
+        super().__init__()
+        self.writing = threading.Event()
+        self.release = threading.Event()
+
+    def write(self, worksheet, df):
+        self.writing.set()
+        assert self.release.wait(5), "Write was never released"
+        super().write(worksheet, df)
+
+
+def test_write_behind_does_not_wait_for_backend():
+    """Test that queued updates neither read the backend nor wait for a flush in progress"""
+    print("\n=== Testing Write-Behind Without Backend Waits ===")
+
+    backend = BlockingWriteStorage()
+    _setup_draft(backend)
+    round_key = {"escala_nome": "Dez/2025", "numero_rodada": 1}
+    queue = WriteBehindStorage(backend, flush_interval=3600)
+    queue.read("rodadas")
+    reads = backend.reads["rodadas"]
+
+    assert queue.update_rows("rodadas", {**round_key, "email_participante": "a@x.com"}, {"ja_escolheu": True}) == 1
+    assert backend.reads["rodadas"] == reads, "Counting the affected rows should not read the backend"
+
+    flusher = threading.Thread(target=queue.flush)
+    flusher.start()
+    assert backend.writing.wait(5), "Flush should be writing"
+
+    # The flush is stuck in the backend: the next pick must not wait for it
+    done = threading.Event()
+    result = {}
+
+    def pick():
+        result["count"] = queue.update_rows("rodadas", {**round_key, "email_participante": "b@x.com"}, {"ja_escolheu": True})
+        result["view"] = queue.read("rodadas")
+        done.set()
+
+    threading.Thread(target=pick).start()
+    blocked = not done.wait(2)
+    backend.release.set()
+    flusher.join()
+    assert not blocked, "Updates and reads should not wait for the flush"
+    assert result["count"] == 1
+    assert result["view"]['ja_escolheu'].all(), "Reads during the flush should see both updates exactly once"
+
+    assert queue.pending_count() == 1, "Only the update queued before the flush is written"
+    queue.flush()
+    assert backend.read("rodadas")['ja_escolheu'].all()
+    assert queue.read("rodadas")['ja_escolheu'].all()
+
+    print("✅ Write-behind without backend waits test passed!")
+    return True
+
+
+def test_write_behind_journal_survives_restart():
+    """Test that queued mutations are replayed from the journal after a restart"""
+    print("\n=== Testing Write-Behind Journal ===")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = os.path.join(tmp, "pending.jsonl")
+        backend = SQLiteStorage(":memory:")
+
+        WriteBehindStorage(backend, flush_interval=3600, journal_path=journal).insert("escolhas", _choice("a@x.com"))
+
+        # A new instance (e.g. after the app restarts) picks up the queued insert
+        restarted = WriteBehindStorage(backend, flush_interval=3600, journal_path=journal)
+        assert restarted.pending_count() == 1, "Pending mutation should be restored from the journal"
+        restarted.flush()
+
+        assert len(backend.read("escolhas")) == 1, "Restored mutation should be written"
+        assert os.path.getsize(journal) == 0, "Journal should be empty after the flush"
+
+    print("✅ Write-behind journal test passed!")
+    return True
+
+
+def test_write_behind_close_flushes_and_stops():
+    """Test that close() writes the queue and stops the flush thread without waiting for the interval"""
+    print("\n=== Testing Write-Behind Close ===")
+
+    backend = SQLiteStorage(":memory:")
+    queue = WriteBehindStorage(backend, flush_interval=3600)
+    queue.insert("escolhas", _choice("a@x.com"))
+
+    start = time.perf_counter()
+    queue.close()
+    assert time.perf_counter() - start < 5, "close() should not wait for the flush interval"
+    assert not queue._worker.is_alive(), "The flush thread should stop"
+    assert queue.pending_count() == 0 and len(backend.read("escolhas")) == 1, "Pending writes should be flushed"
+
+    print("✅ Write-behind close test passed!")
+    return True
+
+
+class RejectingStorage(CountingStorage):
+    """Counting backend that always refuses inserts containing the given participant."""
+
+    def __init__(self, rejected):
+        super().__init__()
+        self.rejected = rejected
+
+    def insert(self, worksheet, df):
+        if "email_participante" in df.columns and (df["email_participante"] == self.rejected).any():
+            self.writes.append(("rejected", worksheet, len(df)))
+            raise ValueError("linha recusada")
+        super().insert(worksheet, df)
+
+
+def test_write_behind_gives_up_on_failing_mutation():
+    """Test that a mutation the backend always refuses stops being retried and no longer blocks the queue"""
+    print("\n=== Testing Write-Behind Retries ===")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        journal = os.path.join(tmp, "pending.jsonl")
+        backend = RejectingStorage("bad@x.com")
+        queue = WriteBehindStorage(backend, flush_interval=3600, journal_path=journal, max_attempts=3, retry_delay=60)
+        queue.insert("escolhas", _choice("a@x.com"))
+        queue.insert("escolhas", _choice("bad@x.com"))
+        queue.insert("escolhas", _choice("c@x.com"))
+
+        queue.flush()
+        queue.flush()
+        assert backend.writes == [("rejected", "escolhas", 3)], "A failed worksheet should wait before the next attempt"
+
+        queue.retry_delay = 0
+        queue._retry_at.clear()
+        queue.flush()
+        queue.flush()
+        print(backend.writes)
+        assert backend.writes[-3:] == [("insert", "escolhas", 1), ("rejected", "escolhas", 1), ("insert", "escolhas", 1)], \
+            "The last attempt should write each mutation on its own"
+        assert list(backend.read("escolhas")["email_participante"]) == ["a@x.com", "c@x.com"]
+        assert queue.pending_count() == 0, "The refused mutation should leave the queue"
+        assert list(queue.read("escolhas")["email_participante"]) == ["a@x.com", "c@x.com"], \
+            "Reads should no longer show the refused mutation as saved"
+
+        failed = queue.failed_writes()
+        assert len(failed) == 1 and failed[0]["rows"][0]["email_participante"] == "bad@x.com"
+        assert failed[0]["tentativas"] == 3 and failed[0]["erro"] == "linha recusada"
+        with open(journal + ".falhas", encoding="utf-8") as f:
+            assert len(f.readlines()) == 1, "Refused mutations should be kept on disk"
+        assert CachedStorage(queue).failed_writes() == failed, "Upper layers should expose the refused writes"
+
+    print("✅ Write-behind retries test passed!")
+    return True
+
+
+def test_occupancy_index_updated_incrementally():
+    """Test that the occupancy index follows new choices without re-reading escolhas"""
+    print("\n=== Testing Occupancy Index ===")
+
+    backend = CountingStorage()
+    _setup_draft(backend)
+    backend.insert("atividades", pd.DataFrame([
+        {"escala_nome": "Dez/2025", "tipo": "Ambulatório", "data": "02/12/2025", "horario": "08:00-12:00", "vagas": 3, "id_atividade": "act2"},
+    ]))
+    cache = CachedStorage(backend)
+
+    assert cache.occupancy("Dez/2025") == {"act1": (0, 1), "act2": (0, 3)}, "Index should start from the stored choices"
+    reads = dict(backend.reads)
+
+    assert cache.reserve_slot("Dez/2025", 1, "act2", "a@x.com", "A") == RESERVED
+    cache.insert("escolhas", _choice("b@x.com"))  # act1
+    index = cache.occupancy("Dez/2025")
+    print(index)
+
+    assert index == {"act1": (1, 0), "act2": (1, 2)}, "Index should count the new choices"
+    assert backend.reads.get(("escolhas", "Dez/2025")) == reads.get(("escolhas", "Dez/2025")), \
+        "Index should be updated without re-reading escolhas"
+    assert index == SnapshotStorage(backend).occupancy("Dez/2025"), "Index should match a full recount"
+
+    print("✅ Occupancy index test passed!")
+    return True
+
+
+def test_email_index_updated_incrementally():
+    """Test that the email index finds users by normalized email and follows inserts without re-reading"""
+    print("\n=== Testing Email Index ===")
+
+    backend = CountingStorage()
+    backend.insert("usuarios", pd.DataFrame([
+        {"nome": "Ana", "matricula": "1", "email": "Ana@X.com", "senha_hash": "h1"},
+        {"nome": "Ana (duplicada)", "matricula": "9", "email": "ana@x.com", "senha_hash": "h9"},
+    ]))
+    cache = CachedStorage(backend)
+
+    index = cache.email_index("usuarios")
+    assert index["ana@x.com"]["nome"] == "Ana", "The first row of each email should win"
+    assert cache.email_index("usuarios") is index, "The index should be cached"
+    reads = backend.reads["usuarios"]
+
+    cache.insert("usuarios", pd.DataFrame([{"nome": "Bruno", "matricula": "2", "email": " bruno@x.com ", "senha_hash": "h2"}]))
+    index = cache.email_index("usuarios")
+    print(sorted(index))
+    assert index["bruno@x.com"]["nome"] == "Bruno", "Inserted users should be indexed"
+    assert backend.reads["usuarios"] == reads, "Inserts should not rebuild the index"
+    assert index == Storage.email_index(backend, "usuarios"), "Index should match a full rebuild"
+    reads = backend.reads["usuarios"]
+
+    cache.update_rows("usuarios", {"email": "Ana@X.com"}, {"senha_hash": "novo"})
+    assert cache.email_index("usuarios")["ana@x.com"]["senha_hash"] == "novo", "Other writes should rebuild the index"
+    assert backend.reads["usuarios"] == reads + 1
+
+    print("✅ Email index test passed!")
+    return True
+
+
+def test_occupancy_index_revalidated_after_external_edit():
+    """Test that the occupancy index picks up activities added directly to the sheet once the cache expires"""
+    print("\n=== Testing Occupancy Index Revalidation ===")
+
+    conn = FakeGSheetsConnection()
+    cache = CachedStorage(GSheetsStorage(conn), max_age=0.05)
+    _setup_draft(cache)
+    assert cache.occupancy("Dez/2025") == {"act1": (0, 1)}
+
+    # Activity typed straight into the spreadsheet, outside the app
+    external = {"escala_nome": "Dez/2025", "tipo": "Ambulatório", "data": "02/12/2025", "horario": "08:00-12:00", "vagas": "2", "id_atividade": "act2"}
+    conn.sheets["atividades"].append([external.get(column, "") for column in conn.sheets["atividades"][0]])
+    time.sleep(0.1)
+
+    assert len(cache.read_escala("atividades", "Dez/2025")) == 2, "The expired cache should re-read the sheet"
+    index = cache.occupancy("Dez/2025")
+    print(index)
+    assert index == {"act1": (0, 1), "act2": (0, 2)}, "The occupancy index should be rebuilt with the new activity"
+    assert cache.reserve_slot("Dez/2025", 1, "act2", "a@x.com", "A") == RESERVED, "The new activity should be bookable"
+
+    print("✅ Occupancy index revalidation test passed!")
+    return True
+
+
+def test_partitioned_reads_skip_other_escalas():
+    """Test that activity in one escala does not re-read or invalidate another"""
+    print("\n=== Testing Partitioned Reads ===")
+
+    backend = CountingStorage()
+    _setup_draft(backend)
+    backend.insert("atividades", pd.DataFrame([
+        {"escala_nome": "Nov/2025", "tipo": "Plantão", "data": "01/11/2025", "horario": "07:00-19:00", "vagas": 2, "id_atividade": "old1"},
+    ]))
+    backend.insert("escolhas", pd.DataFrame([
+        {"escala_nome": "Nov/2025", "id_atividade": "old1", "email_participante": "a@x.com", "nome_participante": "A"},
+    ]))
+    cache = CachedStorage(backend)
+
+    assert list(cache.read_escala("atividades", "Dez/2025")['id_atividade']) == ["act1"], "Only Dez/2025 rows should be returned"
+    assert cache.occupancy("Nov/2025") == {"old1": (1, 1)}
+    cache.read_escala("rodadas", "Nov/2025")
+    reads = dict(backend.reads)
+
+    # A pick in Dez/2025 leaves the Nov/2025 partitions cached
+    assert cache.reserve_slot("Dez/2025", 1, "act1", "a@x.com", "A") == RESERVED
+    assert cache.occupancy("Nov/2025") == {"old1": (1, 1)}
+    cache.read_escala("escolhas", "Nov/2025")
+    cache.read_escala("rodadas", "Nov/2025")
+    print(backend.reads)
+    assert backend.reads == reads, "Nov/2025 should not be re-read"
+    assert not any(key in backend.reads for key in WORKSHEETS), "No worksheet should be read in full"
+
+    # Without partitions in the backend the cache groups one full read by escala
+    unpartitioned = LockedStorage(":memory:")
+    unpartitioned.partitioned = False
+    cache = CachedStorage(unpartitioned)
+    _setup_draft(cache)
+    assert list(cache.read_escala("rodadas", "Dez/2025")['posicao']) == [1, 2]
+    assert cache.read_escala("rodadas", "Nov/2025").empty, "Unknown escalas should read as empty"
+
+    print("✅ Partitioned reads test passed!")
+    return True
+
+
+def test_delete_rows():
+    """Test that every backend layer removes only the matching rows"""
+    print("\n=== Testing Delete Rows ===")
+
+    for db in [SQLiteStorage(":memory:"), CachedStorage(SQLiteStorage(":memory:")),
+               WriteBehindStorage(SQLiteStorage(":memory:"), flush_interval=3600)]:
+        _setup_draft(db)
+        db.insert("rodadas", pd.DataFrame([
+            {"escala_nome": "Nov/2025", "numero_rodada": 1, "posicao": 1, "email_participante": "a@x.com", "ja_escolheu": True},
+        ]))
+        if isinstance(db, CachedStorage):
+            db.read_escala("rodadas", "Dez/2025")
+
+        assert db.delete_rows("rodadas", {"escala_nome": "Dez/2025"}) == 2, "Both Dez/2025 rows should be removed"
+        assert db.delete_rows("rodadas", {"escala_nome": "Dez/2025"}) == 0
+        assert db.read_escala("rodadas", "Dez/2025").empty, "Cached partitions should be invalidated"
+        if isinstance(db, WriteBehindStorage):
+            db.flush()
+            db = db.backend
+        assert list(db.read("rodadas")['escala_nome']) == ["Nov/2025"], "Other escalas should be kept"
+
+    print("✅ Delete rows test passed!")
+    return True
+
+
+def test_instrumented_storage_records_calls():
+    """Test that instrumented layers record cache hits/misses, backend calls and renders"""
+    print("\n=== Testing Storage Instrumentation ===")
+
+    stats = StorageStats()
+    db = InstrumentedStorage(
+        CachedStorage(InstrumentedStorage(SQLiteStorage(":memory:"), stats, LAYER_BACKEND)), stats, LAYER_APP
+    )
+    assert db.backend.backend.partitioned, "Backend capabilities should be passed through"
+
+    stats.begin_render("sessao-1", "Admin: Criar/Ver Escala")
+    _setup_draft(db)
+    db.read_escala("rodadas", "Dez/2025")
+    db.read_escala("rodadas", "Dez/2025")
+    stats.end_render()
+
+    df = stats.calls()
+    print(df[["camada", "operacao", "planilha", "cache", "funcao"]])
+    reads = df[(df["camada"] == LAYER_APP) & (df["operacao"] == "read_escala")]
+    assert list(reads["cache"]) == ["falta", "acerto"], "The first read should miss the cache and the second hit it"
+    backend_reads = df[(df["camada"] == LAYER_BACKEND) & (df["operacao"] == "read_escala")]
+    assert len(backend_reads) == 1 and backend_reads["bytes"].iloc[0] > 0, "Only the miss should reach the backend"
+    assert backend_reads["cache"].isna().all(), "Backend calls are not cache lookups"
+    # Run directly, this module is __main__ and is reported as "app"
+    assert {funcao.split(".")[-1] for funcao in df["funcao"]} >= {"_setup_draft", "test_instrumented_storage_records_calls"}, \
+        "Calls should be attributed to the function outside the storage layers"
+
+    latency = stats.latency_by_worksheet()
+    assert set(latency["Planilha"]) == {"atividades", "rodadas"}
+    renders = stats.slowest_renders()
+    print(renders)
+    assert len(renders) == 1 and renders["Tela"].iloc[0] == "Admin: Criar/Ver Escala"
+    assert renders["Acertos"].iloc[0] == 1 and renders["Chamadas ao Backend"].iloc[0] == len(df[df["camada"] == LAYER_BACKEND])
+
+    # A render interrupted by st.rerun is closed when the session starts the next one
+    stats.begin_render("sessao-1", "Login")
+    stats.begin_render("sessao-1", "Login")
+    assert len(stats.slowest_renders()) == 2
+    assert stats.sessions()["Execuções"].iloc[0] == 3
+
+    print("✅ Storage instrumentation test passed!")
+    return True
+
+
+def test_fragment_renders_are_nested():
+    """Test that fragment renders do not close the enclosing render and survive a stats reset"""
+    print("\n=== Testing Fragment Renders ===")
+
+    stats = StorageStats()
+    db = InstrumentedStorage(SQLiteStorage(":memory:"), stats, LAYER_BACKEND)
+
+    # A fragment called inline during a full render is counted apart, inside it
+    stats.begin_render("sessao-1", "Participante: Fazer Escolha")
+    db.read("atividades")
+    stats.begin_fragment("sessao-1", "Participante: Aguardando vez")
+    db.read("rodadas")
+    db.read("escolhas")
+    stats.end_fragment()
+    db.read("usuarios")
+    stats.end_render()
+
+    renders = stats.slowest_renders().set_index("Tela")
+    print(renders)
+    assert renders.loc["Participante: Fazer Escolha", "Chamadas ao Backend"] == 4, "The full render should include the fragment calls"
+    assert renders.loc["Participante: Aguardando vez", "Chamadas ao Backend"] == 2
+    assert list(stats.calls()["tela"]) == ["Participante: Fazer Escolha", "Participante: Aguardando vez",
+                                           "Participante: Aguardando vez", "Participante: Fazer Escolha"]
+    assert stats.sessions()["Execuções"].iloc[0] == 1, "An inline fragment is part of the same execution"
+
+    # A fragment-only rerun is its own execution and leaves the session's open render alone
+    stats.begin_render("sessao-1", "Participante: Fazer Escolha")
+    stats.end_render()
+    stats._local.render = None
+    stats.begin_fragment("sessao-1", "Participante: Aguardando vez")
+    stats.clear()
+    db.read("rodadas")  # a reset between the start of the fragment and the call must not fail
+    stats.end_fragment()
+    renders = stats.slowest_renders()
+    assert list(renders["Tela"]) == ["Participante: Aguardando vez"] and renders["Chamadas ao Backend"].iloc[0] == 1
+    assert stats.sessions()["Chamadas ao Backend"].iloc[0] == 1
+
+    print("✅ Fragment renders test passed!")
+    return True
+
+def run_all_tests():
+    """Run all storage tests"""
+    print("Starting storage tests...\n")
+
+    tests = [
+        test_sqlite_creates_all_worksheets,
+        test_sqlite_insert_and_update_rows,
+        test_sqlite_write_replaces_contents,
+        test_gsheets_insert_appends_only_new_rows,
+        test_snapshot_reads_each_worksheet_once,
+        test_shared_cache_invalidated_by_writes,
+        test_reserve_slot_is_atomic,
+        test_run_locked_rolls_back_on_error,
+        test_write_behind_coalesces_writes,
+        test_write_behind_does_not_wait_for_backend,
+        test_write_behind_journal_survives_restart,
+        test_write_behind_close_flushes_and_stops,
+        test_write_behind_gives_up_on_failing_mutation,
+        test_occupancy_index_updated_incrementally,
+        test_occupancy_index_revalidated_after_external_edit,
+        test_email_index_updated_incrementally,
+        test_partitioned_reads_skip_other_escalas,
+        test_delete_rows,
+        test_instrumented_storage_records_calls,
+        test_fragment_renders_are_nested
+    ]
+
+    results = []
+    for test in tests:
+        try:
+            result = test()
+            results.append(result)
+        except Exception as e:
+            print(f"❌ Test failed with error: {e}")
+            results.append(False)
+
+    print("\n" + "="*50)
+    if all(results):
+        print("✅ All storage tests passed successfully!")
+        return True
+    else:
+        print("❌ Some tests failed")
+        return False
+
+
+if __name__ == "__main__":
+    success = run_all_tests()
+    exit(0 if success else 1)
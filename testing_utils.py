@@ -0,0 +1,13 @@
+"""
+Helpers shared by the test files.
+"""
+
+
+class FakeClock:
+    """Clock for the time-dependent tests: returns self.now until the test advances it."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now